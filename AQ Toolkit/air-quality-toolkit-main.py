@@ -5,11 +5,12 @@ from src.functions.File_Utilties import (
     _read_large_dataset,
     _export_csv,
     gooey_tqdm,
-    separate_header_data,
-    prepend_header_dataframe
 )
+from src.functions.Profiling import start_run, phase
+from src.functions.Kernels import set_backend
 from src.version_check import check_if_latest
 import os
+import multiprocessing
 
 
 # New actions can be created by:
@@ -19,301 +20,440 @@ import os
 
 # User inputs calls to create the GUI for user input and returns a NameSpace object, this can be converted to a dictionary using vars() otherwise access attributes just like any class
 
-# Check for latest available version
-updates_path = "\\\\AUNTL1FP001\\Groups\\!ENV\\Team_AQ\\Modelling\\+Support_Data\\+Models & Software\\Air Quality Toolkit"
-
-# If updates folder is available check, otherwise must be latest :P
-if os.path.isdir(updates_path):
-    latest_version = check_if_latest(updates_path)
-else:
-    latest_version = True
-
-if not latest_version:
-    import ctypes  # An included library with Python install.
-
-    ctypes.windll.user32.MessageBoxW(
-        0,
-        f"Check for New Updates in {updates_path}. Ensure only the latest version is in this folder.",
-        "New Update Available",
-        1,
-    )
-
-
 if __name__ == "__main__":
-    # Load GUI
-    user_inputs = GUI_Scaffold.gui_inputs()
-
-    if user_inputs.command == "batch_sum":
-        from src.functions.Stitcher import stitcher
-
-        # Read configuration
-        config_df = _read_large_dataset(user_inputs.path)
-
-        # Read first data set
-        output_df = _read_large_dataset(config_df.loc[0, user_inputs.path_col_name])
-
-        # Separate header data out and scale first data set
-
-        first_columns_to_exclude = config_df.loc[
-            0, user_inputs.columns_to_exclude_col_name
-        ]
-        output_df_header, output_df = separate_header_data(
-            output_df, first_columns_to_exclude
-        )
-        output_df = output_df.multiply(config_df.loc[0, user_inputs.scale_col_name])
-
-        # Loop over remaining datasets adding as you go
-        for index, row in gooey_tqdm(
-                config_df.iloc[1:].iterrows(), total=config_df.shape[0] - 1
-        ):
-            data_df = _read_large_dataset(row[user_inputs.path_col_name])
-
-            data_df = data_df.multiply(row[user_inputs.scale_col_name])
-
-            output_df = stitcher(
-                output_df, data_df, 0, row[user_inputs.columns_to_exclude_col_name]
-            )
-
-        # Recombine the header data
-        output_df = prepend_header_dataframe(output_df, output_df_header)
-
-        _export_excel(output_df, user_inputs.output_path)
-
-    elif user_inputs.command == "config_gen":
-        from src.functions.File_Utilties import generate_config
-
-        print(f"Searching in {user_inputs.path}...")
-
-        if user_inputs.file_types:
-            file_extensions = [x.strip() for x in user_inputs.file_types.split(",")]
-        else:
-            file_extensions = None
-        # Build DataFrame of files
-        df = generate_config(
-            user_inputs.path,
-            config_type=user_inputs.config_type,
-            file_extensions=file_extensions,
-            recursive=user_inputs.recursive,
-        )
-
-        print(f"Found {len(df.index)} files")
-
-        # Export DataFrame to spreadsheet
-        _export_excel(df, user_inputs.output_path)
-
-    elif user_inputs.command == "statistics":
-        from src.functions.Statistics import statstics_generator
-
-        print(f"Computing statistics for {user_inputs.path}")
-        statistics_settings: typing.Dict = vars(user_inputs)
-
-        df = statstics_generator(statistics_settings)
-
-        print(f"Statistics calculated!")
-
-        _export_excel(df, user_inputs.output_path)
-
-    elif user_inputs.command == "contemporaneous":
-        from src.functions.Contemporaneous import contemporaneous
-
-        print(f"Computing contemporaneous values for {user_inputs.path}")
-
-        contemporaneous(
-            user_inputs.header_length,
-            user_inputs.path,
-            user_inputs.background_path,
-            user_inputs.background_col_name,
-            user_inputs.number_of_rows,
-            user_inputs.output_path,
-            user_inputs.ascending,
+    # Required for process pools (eg batch_statistics) once frozen into an executable
+    multiprocessing.freeze_support()
+
+    # Check for latest available version
+    updates_path = "\\\\AUNTL1FP001\\Groups\\!ENV\\Team_AQ\\Modelling\\+Support_Data\\+Models & Software\\Air Quality Toolkit"
+
+    # If updates folder is available check, otherwise must be latest :P
+    if os.path.isdir(updates_path):
+        latest_version = check_if_latest(updates_path)
+    else:
+        latest_version = True
+
+    if not latest_version:
+        import ctypes  # An included library with Python install.
+
+        ctypes.windll.user32.MessageBoxW(
+            0,
+            f"Check for New Updates in {updates_path}. Ensure only the latest version is in this folder.",
+            "New Update Available",
+            1,
         )
 
-        print(f"Comtemporaneous calculated!")
-
-    elif user_inputs.command == "factorizer":
-        from src.functions.Factorizer import factorizer
-
-        # from functions.File_Utilties import _read_large_dataset
-
-        config_df = _read_large_dataset(user_inputs.path, 2000)
-
-        for index, row in gooey_tqdm(config_df.iterrows(), total=config_df.shape[0]):
-
-            # Read datasets
-            data_df = _read_large_dataset(row[user_inputs.path_col_name])
-
-            factor_df = _read_large_dataset(row[user_inputs.factor_col_name])
-
-            factorised_df = factorizer(user_inputs.header_length, data_df, factor_df,)
+    # Load GUI
+    user_inputs = GUI_Scaffold.gui_inputs()
 
-            _export_csv(factorised_df, row[user_inputs.output_col_name])
+    # Time the phases of the command (and profile if requested)
+    run_profiler = start_run(vars(user_inputs))
+
+    try:
+        # Compiled kernels where requested (and installed), worker processes pick up the same backend
+        set_backend(user_inputs.kernel_backend)
+
+        if user_inputs.command == "batch_sum":
+            from src.functions.Stitcher import batch_sum
+
+            # Read configuration
+            config_df = _read_large_dataset(user_inputs.path)
+
+            with phase("compute"):
+                if user_inputs.incremental:
+                    from src.functions.Incremental_Sum import incremental_batch_sum
+
+                    incremental_batch_sum(
+                        config_df,
+                        user_inputs.output_path,
+                        user_inputs.path_col_name,
+                        user_inputs.scale_col_name,
+                        user_inputs.columns_to_exclude_col_name,
+                        user_inputs.state_path,
+                        user_inputs.rebuild,
+                    )
+                else:
+                    batch_sum(
+                        config_df,
+                        user_inputs.path_col_name,
+                        user_inputs.scale_col_name,
+                        user_inputs.columns_to_exclude_col_name,
+                        user_inputs.workers,
+                        user_inputs.output_path,
+                        checkpoint_interval=user_inputs.checkpoint_interval,
+                        checkpoint_path=user_inputs.checkpoint_path,
+                        resume=user_inputs.resume,
+                        apportion_hours=user_inputs.apportion_hours,
+                        apportion_path=user_inputs.apportion_path,
+                        dominant_path=user_inputs.dominant_path,
+                    )
+
+        elif user_inputs.command == "config_gen":
+            from src.functions.File_Utilties import generate_config
+
+            print(f"Searching in {user_inputs.path}...")
+
+            if user_inputs.file_types:
+                file_extensions = [x.strip() for x in user_inputs.file_types.split(",")]
+            else:
+                file_extensions = None
+            # Build DataFrame of files
+            with phase("compute"):
+                df = generate_config(
+                    user_inputs.path,
+                    config_type=user_inputs.config_type,
+                    file_extensions=file_extensions,
+                    recursive=user_inputs.recursive,
+                )
+
+            print(f"Found {len(df.index)} files")
+
+            # Export DataFrame to spreadsheet
+            _export_excel(df, user_inputs.output_path)
+
+        elif user_inputs.command == "statistics":
+            from src.functions.Statistics import statstics_generator
+            from src.functions.Receptor_Selection import selected_receptors
+
+            print(f"Computing statistics for {user_inputs.path}")
+            statistics_settings: typing.Dict = vars(user_inputs)
+            statistics_settings["receptors"] = selected_receptors(statistics_settings)
+
+            with phase("compute"):
+                df = statstics_generator(statistics_settings)
+
+            print(f"Statistics calculated!")
+
+            _export_excel(df, user_inputs.output_path)
+
+        elif user_inputs.command == "batch_statistics":
+            from src.functions.Statistics import batch_statistics
+            from src.functions.File_Utilties import _resolve_input_files, _export_parquet
+            from src.functions.Receptor_Selection import selected_receptors
+
+            file_list = _resolve_input_files(user_inputs.path, user_inputs.path_col_name)
+
+            print(f"Computing statistics for {len(file_list)} files")
+
+            statistics_settings: typing.Dict = vars(user_inputs)
+            statistics_settings["receptors"] = selected_receptors(statistics_settings)
+
+            with phase("compute"):
+                df = batch_statistics(file_list, statistics_settings, user_inputs.workers)
+
+            print(f"Statistics calculated!")
+
+            _export_parquet(df, user_inputs.output_path)
+
+        elif user_inputs.command == "contemporaneous":
+            from src.functions.Contemporaneous import contemporaneous
+            from src.functions.Receptor_Selection import selected_receptors
+
+            print(f"Computing contemporaneous values for {user_inputs.path}")
+
+            with phase("compute"):
+                contemporaneous(
+                    user_inputs.header_length,
+                    user_inputs.path,
+                    user_inputs.background_path,
+                    user_inputs.background_col_name,
+                    user_inputs.number_of_rows,
+                    user_inputs.output_path,
+                    user_inputs.ascending,
+                    selected_receptors(vars(user_inputs)),
+                    user_inputs.receptor_regex,
+                    workers=user_inputs.workers,
+                )
+
+            print(f"Comtemporaneous calculated!")
+
+        elif user_inputs.command == "exceedances":
+            from src.functions.Exceedances import exceedances
+            from src.functions.File_Utilties import _export_csv
+            from src.functions.Receptor_Selection import selected_receptors
+
+            print(f"Finding exceedances of {user_inputs.criterion} in {user_inputs.path}")
+
+            with phase("compute"):
+                df = exceedances(
+                    user_inputs.header_length,
+                    user_inputs.path,
+                    user_inputs.criterion,
+                    user_inputs.background_path,
+                    user_inputs.background_col_name,
+                    user_inputs.min_duration,
+                    selected_receptors(vars(user_inputs)),
+                    user_inputs.receptor_regex,
+                )
 
-    elif user_inputs.command == "batch_dat_to_csv":
-        from src.functions.dat_to_csv_formatter import csvformatter
+            _export_csv(df, user_inputs.output_path)
 
-        config_df = _read_large_dataset(user_inputs.path)
+        elif user_inputs.command == "factorizer":
+            from src.functions.Factorizer import batch_factorizer
 
-        for index, row in gooey_tqdm(config_df.iterrows(), total=config_df.shape[0]):
-            csvformatter(
-                row[user_inputs.path_col_name],
-                row[user_inputs.calpuff_col_name],
-                row[user_inputs.output_col_name],
+            # from functions.File_Utilties import _read_large_dataset
+
+            config_df = _read_large_dataset(user_inputs.path, 2000)
+
+            batch_factorizer(
+                config_df,
+                user_inputs.header_length,
+                user_inputs.path_col_name,
+                user_inputs.factor_col_name,
+                user_inputs.output_col_name,
+                user_inputs.checkpoint_interval,
+                user_inputs.checkpoint_path,
+                user_inputs.resume,
             )
 
-    elif user_inputs.command == "dat_to_csv":
-        from src.functions.dat_to_csv_formatter import csvformatter
-        from src.functions.File_Utilties import _convert_path
-
-        output_file_path = _convert_path(user_inputs.path)
-
-        output_file_path = output_file_path.with_suffix(".csv")
-
-        csvformatter(
-            user_inputs.path, user_inputs.calpuff_format, output_file_path,
-        )
-
-    elif user_inputs.command == "no2_processor":
-        from src.functions.no2_processor import process
-
-        (
-            olm_data_with_background,
-            olm_data_without_background,
-            outdf,
-            no_bg_outdf,
-        ) = process(
-            int(user_inputs.header_length),
-            float(user_inputs.initial),
-            float(user_inputs.exceedance),
-            user_inputs.background_path,
-            user_inputs.path,
-            user_inputs.ozone_col_name,
-            float(user_inputs.fill_invalid_value),
-            user_inputs.calc_without_background,
-            user_inputs.bg_col_name,
-            float(user_inputs.ozone_scale),
-            float(user_inputs.percentile),
-            int(user_inputs.rolling_window),
-            user_inputs.top_header_length
-        )
-
-        if user_inputs.export_data:
-            _export_excel(olm_data_with_background, user_inputs.export_data)
-
-        if user_inputs.export_data_without:
-            _export_excel(olm_data_without_background, user_inputs.export_data_without)
-
-        if user_inputs.calc_without_background:
-            from src.functions.File_Utilties import append_to_file_path
-
-            _export_excel(
-                no_bg_outdf,
-                append_to_file_path(
-                    user_inputs.output_path, "_Without_Background_Stats"
-                ),
+        elif user_inputs.command == "batch_dat_to_csv":
+            from src.functions.dat_to_csv_formatter import csvformatter
+
+            config_df = _read_large_dataset(user_inputs.path)
+
+            for index, row in gooey_tqdm(config_df.iterrows(), total=config_df.shape[0]):
+                with phase("compute"):
+                    csvformatter(
+                        row[user_inputs.path_col_name],
+                        row[user_inputs.calpuff_col_name],
+                        row[user_inputs.output_col_name],
+                    )
+
+        elif user_inputs.command == "dat_to_csv":
+            from src.functions.dat_to_csv_formatter import csvformatter
+            from src.functions.File_Utilties import _convert_path
+
+            output_file_path = _convert_path(user_inputs.path)
+
+            output_file_path = output_file_path.with_suffix(".csv")
+
+            with phase("compute"):
+                csvformatter(
+                    user_inputs.path, user_inputs.calpuff_format, output_file_path,
+                )
+
+        elif user_inputs.command == "no2_processor":
+            from src.functions.no2_processor import process, _method_parameters
+            from src.functions.Receptor_Selection import selected_receptors
+
+            with phase("compute"):
+                (
+                    olm_data_with_background,
+                    olm_data_without_background,
+                    outdf,
+                    no_bg_outdf,
+                ) = process(
+                    int(user_inputs.header_length),
+                    float(user_inputs.initial),
+                    float(user_inputs.exceedance),
+                    user_inputs.background_path,
+                    user_inputs.path,
+                    user_inputs.ozone_col_name,
+                    float(user_inputs.fill_invalid_value),
+                    user_inputs.calc_without_background,
+                    user_inputs.bg_col_name,
+                    float(user_inputs.ozone_scale),
+                    float(user_inputs.percentile),
+                    int(user_inputs.rolling_window),
+                    user_inputs.top_header_length,
+                    selected_receptors(vars(user_inputs)),
+                    user_inputs.receptor_regex,
+                    user_inputs.method,
+                    _method_parameters(vars(user_inputs)),
+                    user_inputs.gap_fill,
+                )
+
+            if user_inputs.export_data:
+                _export_excel(olm_data_with_background, user_inputs.export_data)
+
+            if user_inputs.export_data_without:
+                _export_excel(olm_data_without_background, user_inputs.export_data_without)
+
+            if user_inputs.calc_without_background:
+                from src.functions.File_Utilties import append_to_file_path
+
+                _export_excel(
+                    no_bg_outdf,
+                    append_to_file_path(
+                        user_inputs.output_path, "_Without_Background_Stats"
+                    ),
+                )
+
+            _export_excel(outdf, user_inputs.output_path)
+
+        elif user_inputs.command == "batch_no2_processor":
+            from src.functions.no2_processor import batch_process
+            from src.functions.File_Utilties import _resolve_input_files
+            from src.functions.Receptor_Selection import selected_receptors
+
+            scenario_files = _resolve_input_files(user_inputs.path, user_inputs.path_col_name)
+            initials = [float(initial) for initial in user_inputs.initials.split(",")]
+            methods = [method.strip() for method in user_inputs.methods.split(",")]
+
+            no2_settings: typing.Dict = vars(user_inputs)
+            no2_settings["receptors"] = selected_receptors(no2_settings)
+
+            with phase("compute"):
+                df = batch_process(
+                    scenario_files,
+                    initials,
+                    user_inputs.background_path,
+                    no2_settings,
+                    user_inputs.workers,
+                    methods,
+                )
+
+            _export_excel(df, user_inputs.output_path)
+
+        elif user_inputs.command == "overlap":
+            from src.functions.Overlap_Sum import overlap_sum
+
+            print(
+                f"Running Overlap tool, run list {user_inputs.path}, output {user_inputs.output_path}"
             )
 
-        _export_excel(outdf, user_inputs.output_path)
-
-    elif user_inputs.command == "overlap":
-        from src.functions.Overlap_Sum import overlap_sum
-
-        print(
-            f"Running Overlap tool, run list {user_inputs.path}, output {user_inputs.output_path}"
-        )
-
-        config_df = _read_large_dataset(user_inputs.path)
-
-        from pathlib import Path
+            config_df = _read_large_dataset(user_inputs.path)
 
-        config_df["Path"] = config_df["Path"].apply(Path)
+            from pathlib import Path
 
-        id_df = config_df.copy()
+            config_df["Path"] = config_df["Path"].apply(Path)
 
-        id_df.index = id_df["Path"].apply(lambda x: x.stem)
+            id_df = config_df.copy()
 
-        # id_df = _read_large_dataset(user_inputs.input_id_file)
+            id_df.index = id_df["Path"].apply(lambda x: x.stem)
 
-        # id_df.index = id_df.iloc[:, 0].apply(Path).apply(lambda x: x.stem)
+            # id_df = _read_large_dataset(user_inputs.input_id_file)
 
-        id_df = id_df.drop(["Path"], axis=1)
+            # id_df.index = id_df.iloc[:, 0].apply(Path).apply(lambda x: x.stem)
 
-        output_df = overlap_sum(
-            config_df["Path"].to_list(),
-            id_df,
-            user_inputs.header_length,
-            float(user_inputs.fill_invalid_value),
-        )
+            id_df = id_df.drop(["Path"], axis=1)
 
-        _export_csv(output_df, user_inputs.output_path)
+            with phase("compute"):
+                output_df = overlap_sum(
+                    config_df["Path"].to_list(),
+                    id_df,
+                    user_inputs.header_length,
+                    float(user_inputs.fill_invalid_value),
+                )
 
-    elif user_inputs.command == "marb_generator":
+            _export_csv(output_df, user_inputs.output_path)
 
-        from src.functions.volemarb_generator import marb_generator
+        elif user_inputs.command == "marb_generator":
 
-        print(f"Generating {user_inputs.template_type} from {user_inputs.path}...")
+            from src.functions.volemarb_generator import marb_generator
 
-        volemarb_data = _read_large_dataset(user_inputs.path, header=None, dtype=str)
+            print(f"Generating {user_inputs.template_type} from {user_inputs.path}...")
 
-        pollutants = [x.strip() for x in user_inputs.pollutants.split(",")]
-        pollutant_weights = [
-            x.strip() for x in user_inputs.pollutant_weights.split(",")
-        ]
+            volemarb_data = _read_large_dataset(user_inputs.path, header=None, dtype=str)
 
-        marb_generator(
-            volemarb_data,
-            user_inputs.ignore_columns,
-            user_inputs.number_of_sources,
-            user_inputs.output_path,
-            user_inputs.template_type,
-            pollutants,
-            pollutant_weights,
-            vars(user_inputs),
-        )
+            pollutants = [x.strip() for x in user_inputs.pollutants.split(",")]
+            pollutant_weights = [
+                x.strip() for x in user_inputs.pollutant_weights.split(",")
+            ]
 
-        if user_inputs.template_type == "ptemarb":
-            import ctypes  # An included library with Python install.
+            with phase("compute"):
+                marb_generator(
+                    volemarb_data,
+                    user_inputs.ignore_columns,
+                    user_inputs.number_of_sources,
+                    user_inputs.output_path,
+                    user_inputs.template_type,
+                    pollutants,
+                    pollutant_weights,
+                    vars(user_inputs),
+                )
 
-            ctypes.windll.user32.MessageBoxW(
-                0,
-                f"Ensure to enter building information data from BPIP into the header manually!",
-                "Ptemarb Building Data",
-                1,
-            )
+            if user_inputs.template_type == "ptemarb":
+                import ctypes  # An included library with Python install.
 
-    elif user_inputs.command == "GRAL_timeseries_factorizer":
-        import pandas as pd
+                ctypes.windll.user32.MessageBoxW(
+                    0,
+                    f"Ensure to enter building information data from BPIP into the header manually!",
+                    "Ptemarb Building Data",
+                    1,
+                )
 
-        print("\n\n********** Running GRAL Timeseries Factorizer ********** \n")
+        elif user_inputs.command == "GRAL_timeseries_factorizer":
+            import pandas as pd
 
-        try:
-            config_df = pd.read_excel(user_inputs.path, engine='openpyxl')
-        except ValueError:
-            config_df = pd.read_csv(user_inputs.path)
+            print("\n\n********** Running GRAL Timeseries Factorizer ********** \n")
 
-        if user_inputs.diurnal_factors is None:
-            diurnal_df = pd.DataFrame(None)
-        else:
             try:
-                diurnal_df = pd.read_excel(user_inputs.diurnal_factors, engine='openpyxl')
+                config_df = pd.read_excel(user_inputs.path, engine='openpyxl')
             except ValueError:
-                diurnal_df = pd.read_csv(user_inputs.diurnal_factors)
-
-        from src.functions.factorise_GRAL_timeseries import factorise_gral_timeseries
-
-        factorise_gral_timeseries(config_df,
-                                  output_file=user_inputs.output_path,
-                                  cols_to_skip=user_inputs.GRAL_timeseries_header_cols,
-                                  GRAL_header_rows=user_inputs.GRAL_timeseries_header_rows,
-                                  num_receptors=user_inputs.num_receptors,
-                                  diurnal_factors=diurnal_df)
-
-    elif user_inputs.command == "timeseries_difference":
-        from src.functions.timeseries_difference import  timeseries_difference
-        timeseries_difference(input_ts=user_inputs.input_timeseries,
-                              subtract_ts=user_inputs.diff_timeseries,
-                              output_file=user_inputs.output_timeseries,
-                              cols_to_skip=user_inputs.GRAL_timeseries_header_cols,
-                              GRAL_header_rows=user_inputs.GRAL_timeseries_header_rows,
-                              num_receptors=user_inputs.num_receptors)
-
-
+                config_df = pd.read_csv(user_inputs.path)
+
+            if user_inputs.diurnal_factors is None:
+                diurnal_df = pd.DataFrame(None)
+            else:
+                try:
+                    diurnal_df = pd.read_excel(user_inputs.diurnal_factors, engine='openpyxl')
+                except ValueError:
+                    diurnal_df = pd.read_csv(user_inputs.diurnal_factors)
+
+            from src.functions.factorise_GRAL_timeseries import factorise_gral_timeseries
+
+            with phase("compute"):
+                factorise_gral_timeseries(config_df,
+                                          output_file=user_inputs.output_path,
+                                          cols_to_skip=user_inputs.GRAL_timeseries_header_cols,
+                                          GRAL_header_rows=user_inputs.GRAL_timeseries_header_rows,
+                                          num_receptors=user_inputs.num_receptors,
+                                          diurnal_factors=diurnal_df,
+                                          checkpoint_interval=user_inputs.checkpoint_interval,
+                                          checkpoint_path=user_inputs.checkpoint_path,
+                                          resume=user_inputs.resume)
+
+        elif user_inputs.command == "timeseries_difference":
+            from src.functions.timeseries_difference import  timeseries_difference
+
+            weights = None
+            if user_inputs.weights:
+                weights = [float(weight) for weight in user_inputs.weights.split(",")]
+
+            with phase("compute"):
+                timeseries_difference(input_ts=user_inputs.input_timeseries,
+                                      subtract_ts=user_inputs.diff_timeseries,
+                                      output_file=user_inputs.output_timeseries,
+                                      cols_to_skip=user_inputs.GRAL_timeseries_header_cols,
+                                      GRAL_header_rows=user_inputs.GRAL_timeseries_header_rows,
+                                      num_receptors=user_inputs.num_receptors,
+                                      additional_ts=user_inputs.additional_timeseries,
+                                      weights=weights,
+                                      chunksize=user_inputs.chunksize)
+
+        elif user_inputs.command == "time_concatenation":
+            from src.functions.File_Utilties import _resolve_input_files
+            from src.functions.Linear_Combination import TimeseriesInput
+            from src.functions.Time_Concatenation import time_concatenation
+
+            file_list = _resolve_input_files(user_inputs.path, user_inputs.path_col_name)
+
+            print(f"Joining {len(file_list)} timeseries")
+
+            inputs = [
+                TimeseriesInput(
+                    file,
+                    format=user_inputs.input_format,
+                    header_length=user_inputs.header_length,
+                    header_rows=user_inputs.GRAL_timeseries_header_rows,
+                    receptors=user_inputs.num_receptors,
+                )
+                for file in file_list
+            ]
+
+            with phase("compute"):
+                time_concatenation(
+                    inputs,
+                    user_inputs.output_path,
+                    chunksize=user_inputs.chunksize,
+                    header_format=user_inputs.header_format,
+                )
+
+            print(f"\nSaved joined timeseries to {user_inputs.output_path}\n")
+    except BaseException as error:
+        # Failed runs are reported too (and the memory sampler stopped)
+        run_profiler.finish(error)
+        raise
+    else:
+        run_profiler.finish()
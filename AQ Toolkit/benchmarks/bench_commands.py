@@ -0,0 +1,429 @@
+""" Benchmarks for each toolkit command on synthetic datasets, run with pytest-benchmark (see conftest.py for dataset size options)
+"""
+
+import pandas as pd
+
+from src.functions.File_Utilties import _read_large_dataset
+
+# Few rounds as each run reads and processes whole datasets
+ROUNDS = 3
+
+
+def _run(benchmark, datasets, function, *args, **kwargs):
+    benchmark.extra_info.update(datasets.extra_info())
+    return benchmark.pedantic(function, args=args, kwargs=kwargs, rounds=ROUNDS, iterations=1)
+
+
+def _statistics_settings(path: str) -> dict:
+    return {
+        "path": path,
+        "fill_invalid_value": "0",
+        "header_length": 3,
+        "top_header_length": 0,
+        "start_hour": 0,
+        "enable_sensor_max": True,
+        "enable_sensor_mean": True,
+        "percentiles": "0.5, 0.99",
+        "rolling_mean_window": "8",
+        "custom_hrs_mean": "24",
+    }
+
+
+def _batch_sum(config_path: str, workers: int = 1) -> pd.DataFrame:
+    """ batch_sum as run from the GUI
+    """
+    from src.functions.Stitcher import batch_sum
+
+    return batch_sum(_read_large_dataset(config_path), workers=workers)
+
+
+def bench_read_large_dataset(benchmark, datasets):
+    _run(benchmark, datasets, _read_large_dataset, datasets.calpuff_csvs[0])
+
+
+def bench_batch_sum(benchmark, datasets):
+    _run(benchmark, datasets, _batch_sum, datasets.batch_sum_config)
+
+
+def bench_batch_sum_parallel(benchmark, datasets):
+    _run(benchmark, datasets, _batch_sum, datasets.batch_sum_config, workers=4)
+
+
+def bench_preflight(benchmark, datasets):
+    from src.functions.Linear_Combination import TimeseriesInput
+    from src.functions.Preflight import validate_inputs
+
+    config_df = _read_large_dataset(datasets.batch_sum_config)
+    _run(
+        benchmark,
+        datasets,
+        validate_inputs,
+        [TimeseriesInput(path) for path in config_df["Path"]],
+    )
+
+
+def bench_batch_sum_checkpointed(benchmark, datasets):
+    from src.functions.Stitcher import batch_sum
+
+    _run(
+        benchmark,
+        datasets,
+        batch_sum,
+        _read_large_dataset(datasets.batch_sum_config),
+        output_path=str(datasets.directory / "checkpointed_sum.csv"),
+        checkpoint_interval=1,
+    )
+
+
+def bench_batch_sum_apportionment(benchmark, datasets):
+    from src.functions.Stitcher import batch_sum
+
+    _run(
+        benchmark,
+        datasets,
+        batch_sum,
+        _read_large_dataset(datasets.batch_sum_config),
+        output_path=str(datasets.directory / "apportioned_sum.csv"),
+        apportion_hours=10,
+        dominant_path=str(datasets.directory / "dominant_sources.csv"),
+    )
+
+
+def bench_batch_sum_incremental(benchmark, datasets):
+    from src.functions.Incremental_Sum import incremental_batch_sum
+
+    config_df = _read_large_dataset(datasets.batch_sum_config)
+    output_path = str(datasets.directory / "incremental_sum.csv")
+    # Previous result to update, each round then only checks the inputs for changes
+    incremental_batch_sum(config_df, output_path, rebuild=True)
+    _run(benchmark, datasets, incremental_batch_sum, config_df, output_path)
+
+
+def bench_statistics(benchmark, datasets):
+    from src.functions.Statistics import statstics_generator
+
+    _run(
+        benchmark,
+        datasets,
+        statstics_generator,
+        _statistics_settings(datasets.calpuff_csvs[0]),
+    )
+
+
+def bench_statistics_float32(benchmark, datasets):
+    from src.functions.Statistics import statstics_generator
+
+    settings = _statistics_settings(datasets.calpuff_csvs[0])
+    settings["precision"] = "float32"
+    _run(benchmark, datasets, statstics_generator, settings)
+
+
+def bench_statistics_gap_fill(benchmark, datasets):
+    from src.functions.Statistics import statstics_generator
+
+    # Hours are checked from the header columns and put on an hourly grid before the statistics
+    settings = _statistics_settings(datasets.calpuff_csvs[0])
+    settings["gap_fill"] = "constant"
+    _run(benchmark, datasets, statstics_generator, settings)
+
+
+def bench_statistics_spec(benchmark, datasets):
+    from src.functions.Statistics import statstics_generator
+
+    # Same statistics as the options in _statistics_settings, computed from one plan
+    settings = _statistics_settings(datasets.calpuff_csvs[0])
+    settings["statistics_spec"] = (
+        "mean(1h); max(1h); p50(1h); p99(1h); mean(rolling(8h)); max(rolling(8h)); max(block(24h))"
+    )
+    _run(benchmark, datasets, statstics_generator, settings)
+
+
+def bench_statistics_parallel(benchmark, datasets):
+    from src.functions.Statistics import statstics_generator
+
+    settings = _statistics_settings(datasets.calpuff_csvs[0])
+    settings["workers"] = 4
+    _run(benchmark, datasets, statstics_generator, settings)
+
+
+def bench_batch_statistics(benchmark, datasets):
+    from src.functions.Statistics import batch_statistics
+
+    _run(
+        benchmark,
+        datasets,
+        batch_statistics,
+        datasets.calpuff_csvs,
+        _statistics_settings(None),
+    )
+
+
+def bench_contemporaneous(benchmark, datasets):
+    from src.functions.Contemporaneous import contemporaneous
+
+    _run(
+        benchmark,
+        datasets,
+        contemporaneous,
+        3,
+        datasets.calpuff_csvs[0],
+        datasets.background,
+        "Background NO2",
+        5,
+        str(datasets.directory / "contemporaneous.csv"),
+        False,
+    )
+
+
+def bench_contemporaneous_parallel(benchmark, datasets):
+    from src.functions.Contemporaneous import contemporaneous
+
+    _run(
+        benchmark,
+        datasets,
+        contemporaneous,
+        3,
+        datasets.calpuff_csvs[0],
+        datasets.background,
+        "Background NO2",
+        5,
+        str(datasets.directory / "contemporaneous_parallel.csv"),
+        False,
+        workers=4,
+    )
+
+
+def bench_exceedances(benchmark, datasets):
+    from src.functions.Exceedances import exceedances
+
+    _run(
+        benchmark,
+        datasets,
+        exceedances,
+        3,
+        datasets.calpuff_csvs[0],
+        30.0,
+        datasets.background,
+        "Background NO2",
+    )
+
+
+def bench_factorizer(benchmark, datasets):
+    from src.functions.Factorizer import factorizer
+
+    data_df = _read_large_dataset(datasets.calpuff_csvs[0])
+    factor_df = _read_large_dataset(datasets.factors)
+    _run(benchmark, datasets, factorizer, 3, data_df, factor_df)
+
+
+def bench_dat_to_csv(benchmark, datasets):
+    from src.functions.dat_to_csv_formatter import csvformatter
+
+    _run(
+        benchmark,
+        datasets,
+        csvformatter,
+        datasets.calpuff_dat,
+        True,
+        str(datasets.directory / "calpuff_converted.csv"),
+    )
+
+
+def bench_no2_processor(benchmark, datasets):
+    from src.functions.no2_processor import process
+
+    _run(
+        benchmark,
+        datasets,
+        process,
+        3,
+        0.1,
+        246.0,
+        datasets.background,
+        datasets.calpuff_csvs[0],
+        "Ozone",
+        0.0,
+        True,
+        "Background NO2",
+        0.9583333,
+        0.999,
+        8,
+        1,
+    )
+
+
+def bench_batch_no2_processor(benchmark, datasets):
+    from src.functions.no2_processor import batch_process
+
+    settings = {
+        "bg_col_name": "Background NO2",
+        "ozone_col_name": "Ozone",
+        "fill_invalid_value": "0",
+        "exceedance": 246,
+        "percentile": 0.999,
+        "rolling_window": 8,
+        "header_length": 3,
+        "top_header_length": 1,
+        "ozone_scale": 0.9583333,
+        "calc_without_background": True,
+    }
+    _run(
+        benchmark,
+        datasets,
+        batch_process,
+        datasets.calpuff_csvs,
+        [0.1, 0.2, 0.3],
+        datasets.background,
+        settings,
+        None,
+        ["OLM", "ARM2", "Fixed Ratio", "PVMRM"],
+    )
+
+
+def bench_overlap(benchmark, datasets):
+    from pathlib import Path
+    from src.functions.Overlap_Sum import overlap_sum
+
+    # Each file shares half of its receptors with the next file
+    paths = [Path(path) for path in datasets.calpuff_csvs]
+    offset = datasets.receptors // 2
+    id_df = pd.DataFrame(
+        [
+            [f"R{number * offset + receptor}" for receptor in range(datasets.receptors)]
+            for number in range(len(paths))
+        ],
+        index=[path.stem for path in paths],
+    )
+    _run(benchmark, datasets, overlap_sum, paths, id_df, 3, 0.0)
+
+
+def bench_marb_generator(benchmark, datasets):
+    from src.functions.volemarb_generator import marb_generator
+
+    header_data = {
+        "file_name": "BENCHMARK",
+        "utm_zone": "56S",
+        "projection": "WGS-84",
+        "nima_date": "02-21-2003",
+        "distance_units": "KM",
+        "time_zone": "UTC+1000",
+        "time_start": "2021 1 0 0",
+        "time_end": "2021 365 23 3600",
+        "number_of_sources": datasets.files,
+        "number_of_pollutants": 1,
+        "source_emission_rate": "g/s",
+    }
+
+    def run_marb_generator():
+        marb_df = _read_large_dataset(datasets.marb_input, header=None, dtype=str)
+        marb_generator(
+            marb_df,
+            0,
+            datasets.files,
+            str(datasets.directory / "volemarb.dat"),
+            "volemarb",
+            ["NOX"],
+            ["46"],
+            dict(header_data),
+        )
+
+    _run(benchmark, datasets, run_marb_generator)
+
+
+def bench_gral_timeseries_factorizer(benchmark, datasets):
+    from src.functions.factorise_GRAL_timeseries import factorise_gral_timeseries
+
+    config_df = pd.read_csv(datasets.gral_config)
+    _run(
+        benchmark,
+        datasets,
+        factorise_gral_timeseries,
+        config_df,
+        output_file=str(datasets.directory / "gral_factorised.xlsx"),
+        cols_to_skip=2,
+        GRAL_header_rows=7,
+        num_receptors=datasets.receptors,
+        diurnal_factors=pd.DataFrame(None),
+    )
+
+
+def bench_timeseries_difference(benchmark, datasets):
+    from src.functions.timeseries_difference import timeseries_difference
+
+    _run(
+        benchmark,
+        datasets,
+        timeseries_difference,
+        input_ts=datasets.gral_txts[0],
+        subtract_ts=datasets.gral_txts[-1],
+        output_file=str(datasets.directory / "difference.csv"),
+        cols_to_skip=2,
+        GRAL_header_rows=7,
+        num_receptors=datasets.receptors,
+    )
+
+
+def bench_time_concatenation(benchmark, datasets):
+    from src.functions.Linear_Combination import TimeseriesInput
+    from src.functions.Time_Concatenation import time_concatenation
+
+    # Parts are listed latest first so they have to be put in time order
+    _run(
+        benchmark,
+        datasets,
+        time_concatenation,
+        [TimeseriesInput(path) for path in reversed(datasets.calpuff_parts)],
+        str(datasets.directory / "joined.csv"),
+    )
+
+
+def _gral_sum(datasets, sparse: bool):
+    from src.functions.Linear_Combination import TimeseriesInput, linear_combination
+
+    # All columns are read, including the redundant zero columns for other source groups
+    return linear_combination(
+        [TimeseriesInput(path, 1.0, "gral", 2, 7) for path in datasets.gral_txts],
+        chunksize=500,
+        sparse=sparse,
+    )
+
+
+def bench_gral_sum_dense(benchmark, datasets):
+    _run(benchmark, datasets, _gral_sum, datasets, False)
+
+
+def bench_gral_sum_sparse(benchmark, datasets):
+    _run(benchmark, datasets, _gral_sum, datasets, True)
+
+
+def _kernel_workload(datasets, backend: str):
+    """ NO2 conversion (OLM) and a statistics spec with rolling means and percentiles, the commands using the most kernels
+    """
+    from src.functions.Kernels import use_backend
+    from src.functions.no2_processor import process
+    from src.functions.Statistics import statstics_generator
+
+    settings = _statistics_settings(datasets.calpuff_csvs[0])
+    settings["statistics_spec"] = "max(rolling(8h)); max(rolling(24h)); p99.9(1h); p50(1h)"
+    with use_backend(backend):
+        process(
+            3, 0.1, 246.0, datasets.background, datasets.calpuff_csvs[0], "Ozone", 0.0, True,
+            "Background NO2", 0.9583333, 0.999, 8, 1,
+        )
+        statstics_generator(settings)
+
+
+def bench_kernels_numpy(benchmark, datasets):
+    _run(benchmark, datasets, _kernel_workload, datasets, "numpy")
+
+
+def bench_kernels_numba(benchmark, datasets):
+    import pytest
+
+    from src.functions.Kernels import numba_available
+
+    if not numba_available():
+        pytest.skip("Numba is not installed")
+    # Kernels are compiled before timing (parity with NumPy is checked in tests/test_kernels.py)
+    _kernel_workload(datasets, "numba")
+    _run(benchmark, datasets, _kernel_workload, datasets, "numba")
@@ -0,0 +1,165 @@
+""" Benchmark configuration, dataset sizes are set from the command line as comma separated lists and every combination of hours x receptors x files is benchmarked.
+    Run from the AQ Toolkit folder (imported as src)
+
+    python -m pytest benchmarks --bench-hours=744,8760 --bench-receptors=100 --bench-files=4
+
+Results are saved as JSON under .benchmarks (pytest-benchmark autosave), compare against previous commits with --benchmark-compare
+"""
+
+import functools
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Benchmarks import the toolkit the same way as the GUI (src.functions)
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+import synthetic_data
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("aq-toolkit benchmarks")
+    group.addoption(
+        "--bench-hours",
+        default="744,8760",
+        help="Comma separated number of hours (rows) to benchmark",
+    )
+    group.addoption(
+        "--bench-receptors",
+        default="100",
+        help="Comma separated number of receptors (columns) to benchmark",
+    )
+    group.addoption(
+        "--bench-files",
+        default="4",
+        help="Comma separated number of files for multi-file commands (batch_sum, overlap, ...)",
+    )
+
+
+def _sizes(config, option):
+    return [int(value) for value in config.getoption(option).split(",") if value.strip()]
+
+
+def pytest_generate_tests(metafunc):
+    if "datasets" in metafunc.fixturenames:
+        sizes = list(
+            itertools.product(
+                _sizes(metafunc.config, "--bench-hours"),
+                _sizes(metafunc.config, "--bench-receptors"),
+                _sizes(metafunc.config, "--bench-files"),
+            )
+        )
+        metafunc.parametrize(
+            "size",
+            sizes,
+            ids=[f"{hours}h-{receptors}r-{files}f" for hours, receptors, files in sizes],
+            scope="session",
+        )
+
+
+class SyntheticDatasets:
+    """ Synthetic inputs for a dataset size, each file is only generated the first time it is used
+
+    Args:
+        directory (Path): Folder to write datasets to
+        hours (int): Number of hours (rows)
+        receptors (int): Number of receptors (columns)
+        files (int): Number of files for multi-file commands
+    """
+
+    def __init__(self, directory: Path, hours: int, receptors: int, files: int):
+        self.directory = directory
+        self.hours = hours
+        self.receptors = receptors
+        self.files = files
+
+    def extra_info(self) -> dict:
+        return {"hours": self.hours, "receptors": self.receptors, "files": self.files}
+
+    @functools.cached_property
+    def calpuff_csvs(self) -> list:
+        return [
+            synthetic_data.write_calpuff_csv(
+                self.directory / f"calpuff_{number}.csv", self.hours, self.receptors, seed=number
+            )
+            for number in range(self.files)
+        ]
+
+    @functools.cached_property
+    def calpuff_parts(self) -> list:
+        # The first timeseries split along the time axis into consecutive parts (eg monthly runs)
+        data_df = pd.read_csv(self.calpuff_csvs[0])
+        bounds = np.linspace(0, self.hours, self.files + 1).astype(int)
+        paths = []
+        for number, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            path = self.directory / f"calpuff_part_{number}.csv"
+            data_df.iloc[start:stop].to_csv(path, index=False)
+            paths.append(str(path))
+        return paths
+
+    @functools.cached_property
+    def calpuff_dat(self) -> str:
+        return synthetic_data.write_calpuff_dat(
+            self.directory / "calpuff.dat", self.hours, self.receptors
+        )
+
+    @functools.cached_property
+    def gral_txts(self) -> list:
+        return [
+            synthetic_data.write_gral_txt(
+                self.directory / f"ReceptorTimeSeries_SG{number}_NOx.txt",
+                self.hours,
+                self.receptors,
+                seed=number,
+                zero_columns=self.receptors,
+            )
+            for number in range(self.files)
+        ]
+
+    @functools.cached_property
+    def background(self) -> str:
+        return synthetic_data.write_background_csv(
+            self.directory / "background.csv", self.hours
+        )
+
+    @functools.cached_property
+    def marb_input(self) -> str:
+        return synthetic_data.write_marb_input(
+            self.directory / "marb_input.csv", self.hours, self.files
+        )
+
+    @functools.cached_property
+    def factors(self) -> str:
+        return synthetic_data.write_config(
+            self.directory / "factors.csv",
+            {"Hour": [hour % 24 for hour in range(self.hours)], "Factor": [0.5] * self.hours},
+        )
+
+    @functools.cached_property
+    def batch_sum_config(self) -> str:
+        return synthetic_data.write_config(
+            self.directory / "batch_sum_config.csv",
+            {
+                "Path": self.calpuff_csvs,
+                "Scale": [1.5] * self.files,
+                "Columns to Exclude": [3] * self.files,
+            },
+        )
+
+    @functools.cached_property
+    def gral_config(self) -> str:
+        return synthetic_data.write_config(
+            self.directory / "gral_config.csv",
+            {"Path": self.gral_txts, "NOx": [1.0] * self.files, "PM10": [0.5] * self.files},
+        )
+
+
+@pytest.fixture(scope="session")
+def datasets(size, tmp_path_factory) -> SyntheticDatasets:
+    hours, receptors, files = size
+    directory = tmp_path_factory.mktemp(f"{hours}h_{receptors}r_{files}f")
+    return SyntheticDatasets(directory, hours, receptors, files)
@@ -0,0 +1,253 @@
+""" Synthetic dataset generators in the formats read by the toolkit (CALPUFF csv & dat, GRAL txt, background and marb inputs) for benchmarking
+"""
+
+import io
+import typing
+
+import numpy as np
+import pandas as pd
+
+
+def _timestamps(hours: int, start_year: int = 2021) -> pd.DatetimeIndex:
+    """ Hour ending timestamps starting at 1am on the 1st of January
+    """
+    return pd.date_range(f"{start_year}-01-01 01:00", periods=hours, freq="h")
+
+
+def receptor_concentrations(
+    hours: int, receptors: int, seed: int = 0, zero_fraction: float = 0.3
+) -> np.ndarray:
+    """ Log-normal concentrations with a diurnal cycle, a fraction of hours are zero (eg source not affecting receptor)
+
+    Args:
+        hours (int): Number of hours (rows)
+        receptors (int): Number of receptors (columns)
+        seed (int, optional): Random seed. Defaults to 0.
+        zero_fraction (float, optional): Fraction of values set to zero. Defaults to 0.3.
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors
+    """
+    rng = np.random.default_rng(seed)
+    diurnal = 1 + 0.8 * np.sin(np.arange(hours) * 2 * np.pi / 24)[:, np.newaxis]
+    receptor_scale = rng.lognormal(0, 1, receptors)[np.newaxis, :]
+    values = rng.lognormal(0, 1, (hours, receptors)) * diurnal * receptor_scale
+    values[rng.random((hours, receptors)) < zero_fraction] = 0
+    return values
+
+
+def calpuff_header(hours: int, start_year: int = 2021) -> pd.DataFrame:
+    """ CALPUFF style YYYY/JDY/HHMM header columns (hour ending, HHMM of 2400 at midnight)
+
+    Args:
+        hours (int): Number of hours (rows)
+        start_year (int, optional): Year of the first hour. Defaults to 2021.
+
+    Returns:
+        pd.DataFrame: Header columns
+    """
+    # Hour ending 2400 belongs to the previous day
+    hour_beginning = _timestamps(hours, start_year) - pd.Timedelta(hours=1)
+    return pd.DataFrame(
+        {
+            "YYYY": hour_beginning.year,
+            "JDY": hour_beginning.dayofyear,
+            "HHMM": (hour_beginning.hour + 1) * 100,
+        }
+    )
+
+
+def write_calpuff_csv(
+    file_path: str, hours: int, receptors: int, seed: int = 0, start_year: int = 2021
+) -> str:
+    """ Timeseries csv as written by dat_to_csv (YYYY, JDY, HHMM then one column per receptor)
+
+    Args:
+        file_path (str): Location to write to
+        hours (int): Number of hours (rows)
+        receptors (int): Number of receptors (columns)
+        seed (int, optional): Random seed. Defaults to 0.
+        start_year (int, optional): Year of the first hour. Defaults to 2021.
+
+    Returns:
+        str: Path written to
+    """
+    data_df = pd.DataFrame(
+        receptor_concentrations(hours, receptors, seed),
+        columns=[str(receptor) for receptor in range(1, receptors + 1)],
+    )
+    pd.concat([calpuff_header(hours, start_year), data_df], axis=1).to_csv(
+        file_path, index=False, float_format="%.6g"
+    )
+    return str(file_path)
+
+
+def write_calpuff_dat(
+    file_path: str, hours: int, receptors: int, seed: int = 0, start_year: int = 2021
+) -> str:
+    """ CALPUFF dat timeseries with receptor count on line 4, X and Y on lines 10 and 11 and data from line 15 (as read by dat_to_csv)
+
+    Args:
+        file_path (str): Location to write to
+        hours (int): Number of hours (rows)
+        receptors (int): Number of receptors (columns)
+        seed (int, optional): Random seed. Defaults to 0.
+        start_year (int, optional): Year of the first hour. Defaults to 2021.
+
+    Returns:
+        str: Path written to
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(300, 320, receptors)
+    y = rng.uniform(6250, 6270, receptors)
+
+    header_lines = [
+        " TSERIES output (synthetic benchmark data)",
+        " CALPOST",
+        " Averaging time: 1 hour",
+        f" {receptors} receptors",
+        " Units: ug/m**3",
+        "",
+        "",
+        "",
+        " Receptor coordinates (km)",
+        " X " + " ".join(f"{value:.3f}" for value in x),
+        " Y " + " ".join(f"{value:.3f}" for value in y),
+        "",
+        "",
+        " YYYY JDY HHMM",
+    ]
+
+    data_df = pd.concat(
+        [
+            calpuff_header(hours, start_year),
+            pd.DataFrame(receptor_concentrations(hours, receptors, seed)),
+        ],
+        axis=1,
+    )
+    buffer = io.StringIO()
+    data_df.to_csv(buffer, sep=" ", header=False, index=False, float_format="%.4E")
+
+    with open(file_path, "w") as dat_file:
+        dat_file.write("\n".join(header_lines) + "\n")
+        dat_file.write(buffer.getvalue())
+    return str(file_path)
+
+
+def write_gral_txt(
+    file_path: str,
+    hours: int,
+    receptors: int,
+    seed: int = 0,
+    header_rows: int = 7,
+    zero_columns: int = 0,
+    start_year: int = 2021,
+) -> str:
+    """ UTF-16 tab delimited GRAL ReceptorTimeSeries with header rows, date/hour columns then one column per receptor
+
+    Args:
+        file_path (str): Location to write to
+        hours (int): Number of hours (rows)
+        receptors (int): Number of receptors (columns)
+        seed (int, optional): Random seed. Defaults to 0.
+        header_rows (int, optional): Number of header rows including the column names. Defaults to 7.
+        zero_columns (int, optional): Number of redundant all-zero columns (other source groups) after the receptors. Defaults to 0.
+        start_year (int, optional): Year of the first hour. Defaults to 2021.
+
+    Returns:
+        str: Path written to
+    """
+    timestamps = _timestamps(hours, start_year) - pd.Timedelta(hours=1)
+    values = receptor_concentrations(hours, receptors, seed)
+    if zero_columns:
+        values = np.hstack([values, np.zeros((hours, zero_columns))])
+    columns = values.shape[1]
+
+    lines = []
+    # Header rows have one less leading column than the data
+    labels = ["Receptor", "X", "Y", "Z", "Source group", "Pollutant"]
+    for row in range(header_rows - 1):
+        label = labels[row] if row < len(labels) else f"Header {row}"
+        lines.append("\t".join([label] + [f"{label}_{column + 1}" for column in range(columns)]))
+    lines.append("\t".join(["Date", "Time"] + [str(column + 1) for column in range(columns)]))
+
+    data_df = pd.DataFrame(values)
+    data_df.insert(0, "Time", timestamps.strftime("%H:00"))
+    data_df.insert(0, "Date", timestamps.strftime("%d.%m.%Y"))
+    buffer = io.StringIO()
+    data_df.to_csv(buffer, sep="\t", header=False, index=False, float_format="%.6g")
+
+    with open(file_path, "w", encoding="utf_16", newline="") as gral_file:
+        gral_file.write("\n".join(lines) + "\n")
+        gral_file.write(buffer.getvalue())
+    return str(file_path)
+
+
+def write_background_csv(
+    file_path: str, hours: int, seed: int = 0, start_year: int = 2021
+) -> str:
+    """ Background file with Background NO2 and Ozone columns (as read by no2_processor and contemporaneous)
+
+    Args:
+        file_path (str): Location to write to
+        hours (int): Number of hours (rows)
+        seed (int, optional): Random seed. Defaults to 0.
+        start_year (int, optional): Year of the first hour. Defaults to 2021.
+
+    Returns:
+        str: Path written to
+    """
+    rng = np.random.default_rng(seed + 1000)
+    background_df = calpuff_header(hours, start_year)
+    background_df["Background NO2"] = rng.gamma(2, 10, hours)
+    background_df["Ozone"] = rng.gamma(4, 10, hours)
+    background_df.to_csv(file_path, index=False, float_format="%.4f")
+    return str(file_path)
+
+
+def write_marb_input(
+    file_path: str, hours: int, sources: int, seed: int = 0, values_per_source: int = 8
+) -> str:
+    """ Marb generator input (no header), a date/time row (YYYY JDY HH SSSS YYYY JDY HH SSSS) followed by a row per source for every hour
+
+    Args:
+        file_path (str): Location to write to
+        hours (int): Number of hours
+        sources (int): Number of sources per hour
+        seed (int, optional): Random seed. Defaults to 0.
+        values_per_source (int, optional): Number of values after the source name. Defaults to 8.
+
+    Returns:
+        str: Path written to
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for hour in range(hours):
+        day, hour_of_day = divmod(hour, 24)
+        # Written as text so the date/time columns aren't converted to floats
+        rows.append(
+            [str(value) for value in [2021, day + 1, hour_of_day, 0, 2021, day + 1, hour_of_day, 3600]]
+        )
+        for source in range(sources):
+            rows.append(
+                [f"'SRC{source + 1}'"]
+                + [f"{value:.6f}" for value in rng.uniform(0, 10, values_per_source)]
+            )
+    pd.DataFrame(rows).to_csv(file_path, header=False, index=False)
+    return str(file_path)
+
+
+def write_config(
+    file_path: str, columns: typing.Dict[str, typing.List[typing.Any]]
+) -> str:
+    """ Configuration file (eg Path, Scale, Columns to Exclude for batch_sum)
+
+    Args:
+        file_path (str): Location to write to
+        columns (typing.Dict[str, typing.List[typing.Any]]): Column name to values
+
+    Returns:
+        str: Path written to
+    """
+    pd.DataFrame(columns).to_csv(file_path, index=False)
+    return str(file_path)
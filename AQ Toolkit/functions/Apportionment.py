@@ -0,0 +1,163 @@
+""" Source apportionment while a linear combination is streamed, each receptor keeps a bounded buffer of the highest hours of the total so far with the contribution of every source at those hours.
+    The buffers are updated a chunk of hours at a time so contribution tables come out of the same pass as the sum
+"""
+
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import _convert_path, _export_csv, _export_excel, _export_parquet
+
+
+def source_names(paths: typing.List[str]) -> typing.List[str]:
+    """ Name of each source from its file name, repeated names are numbered
+
+    Args:
+        paths (typing.List[str]): Path of each source
+
+    Returns:
+        typing.List[str]: Unique source names in order
+    """
+    names = []
+    for path in paths:
+        stem = _convert_path(path).stem
+        name, number = stem, 1
+        while name in names:
+            number += 1
+            name = f"{stem} ({number})"
+        names.append(name)
+    return names
+
+
+def dominant_sources(contributions: typing.List[np.ndarray]) -> np.ndarray:
+    """ Position of the source contributing most to each hour and receptor
+
+    Args:
+        contributions (typing.List[np.ndarray]): Hours by receptors contribution of each source
+
+    Returns:
+        np.ndarray: Hours by receptors position of the largest source, -1 where no source is above zero
+    """
+    best = contributions[0].copy()
+    dominant = np.zeros(best.shape, dtype=np.int64)
+    for position, values in enumerate(contributions[1:], start=1):
+        larger = values > best
+        best[larger] = values[larger]
+        dominant[larger] = position
+    dominant[~(best > 0)] = -1
+    return dominant
+
+
+class Apportionment:
+    """ Highest hours of a total for each receptor with each source's contribution at those hours, kept in buffers of top_hours per receptor
+
+    Args:
+        sources (typing.List[str]): Source names in the order their contributions are given
+        top_hours (int): Number of highest hours to keep for each receptor
+    """
+
+    def __init__(self, sources: typing.List[str], top_hours: int):
+        self.sources = list(sources)
+        self.top_hours = int(top_hours)
+        if self.top_hours <= 0:
+            raise ValueError(f"Number of hours to apportion must be positive, got {top_hours}")
+        self.totals = None
+        self.rows = None
+        self.contributions = None
+        self.receptors = None
+        self._headers = []
+
+    def update(
+        self,
+        start_row: int,
+        header: pd.DataFrame,
+        total: np.ndarray,
+        contributions: typing.List[np.ndarray],
+        receptors: typing.List[str],
+    ):
+        """ Merge a chunk of hours into the buffers
+
+        Args:
+            start_row (int): Data row the chunk starts from
+            header (pd.DataFrame): Header columns of the chunk
+            total (np.ndarray): Hours by receptors total of the chunk
+            contributions (typing.List[np.ndarray]): Hours by receptors weighted values of each source
+            receptors (typing.List[str]): Receptor names
+        """
+        top_hours = self.top_hours
+        if self.totals is None:
+            self.receptors = list(receptors)
+            self.totals = np.full((top_hours, total.shape[1]), -np.inf)
+            self.rows = np.full((top_hours, total.shape[1]), -1, dtype=np.int64)
+            self.contributions = np.zeros((len(self.sources), top_hours, total.shape[1]))
+        self._headers.append(header.reset_index(drop=True))
+
+        # Hours in the buffers come first, NaN totals never make the top hours
+        candidates = np.concatenate([self.totals, np.where(np.isnan(total), -np.inf, total)])
+        kept = np.argpartition(-candidates, top_hours - 1, axis=0)[:top_hours]
+        columns = np.arange(total.shape[1])[np.newaxis, :]
+
+        from_chunk = kept >= top_hours
+        buffer_rows = np.minimum(kept, top_hours - 1)
+        chunk_rows = np.maximum(kept - top_hours, 0)
+
+        self.totals = candidates[kept, columns]
+        self.rows = np.where(from_chunk, start_row + chunk_rows, self.rows[buffer_rows, columns])
+        self.contributions = np.stack(
+            [
+                np.where(from_chunk, values[chunk_rows, columns], kept_values[buffer_rows, columns])
+                for values, kept_values in zip(contributions, self.contributions)
+            ]
+        )
+
+    def table(self) -> pd.DataFrame:
+        """ Contribution table with a row for each receptor and rank (1 is the highest hour)
+
+        Returns:
+            pd.DataFrame: Receptor, Rank, Data Row, header columns, Total, contribution of each source and the Dominant Source
+        """
+        if self.totals is None:
+            return pd.DataFrame()
+
+        # Highest first for each receptor, then flattened receptor by receptor
+        order = np.argsort(-self.totals, axis=0, kind="stable")
+        columns = np.arange(self.totals.shape[1])[np.newaxis, :]
+        totals = self.totals[order, columns].ravel(order="F")
+        rows = self.rows[order, columns].ravel(order="F")
+        contributions = [values[order, columns].ravel(order="F") for values in self.contributions]
+        filled = rows >= 0
+
+        header = pd.concat(self._headers, ignore_index=True)
+        table = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "Receptor": np.repeat(self.receptors, self.top_hours)[filled],
+                        "Rank": np.tile(np.arange(1, self.top_hours + 1), len(self.receptors))[filled],
+                        "Data Row": rows[filled] + 1,
+                    }
+                ),
+                header.iloc[rows[filled]].reset_index(drop=True),
+                pd.DataFrame(
+                    {"Total": totals[filled]}
+                    | {source: values[filled] for source, values in zip(self.sources, contributions)}
+                ),
+            ],
+            axis=1,
+        )
+        dominant = dominant_sources([values[filled] for values in contributions])
+        table["Dominant Source"] = np.array(self.sources + [""], dtype=object)[dominant]
+        return table
+
+    def export(self, output_path: str):
+        """ Export the contribution table in the format of the output extension (csv, xlsx or parquet)
+
+        Raises:
+            ValueError: If the output extension is not supported
+        """
+        exporters = {".csv": _export_csv, ".xlsx": _export_excel, ".parquet": _export_parquet}
+        suffix = _convert_path(output_path).suffix
+        if suffix not in exporters:
+            raise ValueError(f"Unable to export to {output_path}, use csv, xlsx or parquet")
+        exporters[suffix](self.table(), str(output_path))
@@ -0,0 +1,207 @@
+""" Checkpoints for long configuration driven batch runs, the running total (an .npy memmap) and the number of completed configuration rows are saved at intervals so a failed run can resume rather than restart
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import _convert_path
+
+
+def default_checkpoint_path(path: str) -> str:
+    """ Checkpoint folder kept next to a file of the run (eg C:/Run/total.xlsx checkpoints to C:/Run/total_checkpoint)
+    """
+    path = _convert_path(path)
+    return str(path.with_name(path.stem + "_checkpoint"))
+
+
+def checkpoint_settings(
+    output_path: typing.Optional[str],
+    interval: int,
+    checkpoint_path: typing.Optional[str] = None,
+    resume: bool = False,
+) -> typing.Tuple[typing.Optional[str], int]:
+    """ Checkpoint folder and interval of a run from the user inputs, checkpoints are off with an interval of 0 unless resuming (which keeps checkpointing every 10 rows)
+
+    Args:
+        output_path (typing.Optional[str]): Output of the run, the checkpoint is kept next to it by default
+        interval (int): Number of rows between checkpoints
+        checkpoint_path (typing.Optional[str], optional): Folder to keep the checkpoint in. Defaults to None (next to the output).
+        resume (bool, optional): Whether the run resumes a checkpoint. Defaults to False.
+
+    Raises:
+        ValueError: If checkpoints are requested without an output or checkpoint folder
+
+    Returns:
+        typing.Tuple[typing.Optional[str], int]: Checkpoint folder (None if checkpoints are off) and interval
+    """
+    interval = int(interval or 0)
+    if interval <= 0 and not resume:
+        return None, 0
+    if checkpoint_path is None:
+        if output_path is None:
+            raise ValueError("A checkpoint folder or output path is needed to checkpoint a run")
+        checkpoint_path = default_checkpoint_path(output_path)
+    return str(checkpoint_path), interval if interval > 0 else 10
+
+
+def run_key(*items: typing.Any) -> str:
+    """ Key identifying the configuration of a run, a checkpoint is only resumed by a run with the same key
+
+    Returns:
+        str: SHA-256 of the items
+    """
+    return hashlib.sha256(json.dumps(items, default=str).encode()).hexdigest()
+
+
+class Checkpoint:
+    """ Checkpoint of a batch run in a folder (state.json with the number of completed rows, and optionally the running total as checkpoint.npy with its header).
+        The total is accumulated in a working memmap and copied to the checkpoint at intervals, so the checkpoint always matches the completed rows even if the run dies part way through a row
+
+    Args:
+        checkpoint_path (str): Folder to keep the checkpoint in
+        key (str): Key of the run configuration (see run_key)
+        interval (int, optional): Number of completed rows between checkpoints. Defaults to 10.
+    """
+
+    def __init__(self, checkpoint_path: str, key: str, interval: int = 10):
+        self.checkpoint_path = _convert_path(checkpoint_path)
+        self.key = key
+        self.interval = max(int(interval), 1)
+        self.completed_rows = 0
+        self.saved_rows = 0
+        # Set while a row is being added, the working total then matches neither the completed rows nor the saved checkpoint
+        self.adding_row = False
+        self.total = None
+        self.header = None
+        self.names = None
+
+    @property
+    def _state_path(self):
+        return self.checkpoint_path / "state.json"
+
+    def resume(self) -> int:
+        """ Load the checkpoint of a previous run with the same configuration
+
+        Returns:
+            int: Number of rows already completed (0 if there is nothing to resume)
+        """
+        if not self._state_path.is_file():
+            print(f"No checkpoint found in {self.checkpoint_path}, starting from the first row")
+            return 0
+        with open(self._state_path, "r") as state_file:
+            state = json.load(state_file)
+        if state.get("key") != self.key:
+            print(f"Checkpoint in {self.checkpoint_path} is for a different configuration, starting from the first row")
+            return 0
+
+        if state.get("has_total"):
+            # Continue from a copy so the checkpoint stays intact until the next one is saved
+            shutil.copyfile(
+                self.checkpoint_path / "checkpoint.npy", self.checkpoint_path / "working.npy"
+            )
+            self.total = np.load(self.checkpoint_path / "working.npy", mmap_mode="r+")
+            self.header = pd.read_pickle(self.checkpoint_path / "header.pkl")
+            self.names = state["names"]
+
+        self.completed_rows = self.saved_rows = int(state["completed_rows"])
+        print(f"Resuming from checkpoint after {self.completed_rows} completed rows")
+        return self.completed_rows
+
+    def accumulator(
+        self, initial: np.ndarray, header: pd.DataFrame, names: typing.List[str]
+    ) -> np.memmap:
+        """ Start the running total as a memmap in the checkpoint folder
+
+        Args:
+            initial (np.ndarray): Starting total (eg the first weighted input)
+            header (pd.DataFrame): Header columns of the total
+            names (typing.List[str]): Receptor names of the total
+
+        Returns:
+            np.memmap: Running total to add to
+        """
+        self.checkpoint_path.mkdir(parents=True, exist_ok=True)
+        self.total = np.lib.format.open_memmap(
+            self.checkpoint_path / "working.npy",
+            mode="w+",
+            dtype=np.float64,
+            shape=initial.shape,
+        )
+        self.total[...] = initial
+        self.header = header
+        self.names = [str(name) for name in names]
+        header.to_pickle(self.checkpoint_path / "header.pkl")
+        return self.total
+
+    @contextlib.contextmanager
+    def adding(self, rows: int):
+        """ Add a row to the running total within the block, the row is only recorded as completed once the block finishes.
+            If the block fails the total holds part of the row, so the last saved checkpoint is kept rather than saving the working total
+
+        Args:
+            rows (int): Total number of rows completed once this row is added
+        """
+        self.adding_row = True
+        yield self.total
+        self.adding_row = False
+        self.completed(rows)
+
+    def completed(self, rows: int):
+        """ Record that a number of rows have been completed, saving a checkpoint every interval
+
+        Args:
+            rows (int): Total number of rows completed so far
+        """
+        self.completed_rows = int(rows)
+        if self.completed_rows - self.saved_rows >= self.interval:
+            self.save()
+
+    def save(self):
+        """ Save the running total and the completed rows, each file is written alongside then swapped in
+        """
+        self.checkpoint_path.mkdir(parents=True, exist_ok=True)
+        if self.total is not None:
+            self.total.flush()
+            temporary_path = self.checkpoint_path / "checkpoint.npy.tmp"
+            with open(temporary_path, "wb") as checkpoint_file:
+                np.save(checkpoint_file, self.total)
+            os.replace(temporary_path, self.checkpoint_path / "checkpoint.npy")
+
+        state = {
+            "key": self.key,
+            "completed_rows": self.completed_rows,
+            "has_total": self.total is not None,
+            "names": self.names,
+        }
+        temporary_path = self.checkpoint_path / "state.json.tmp"
+        with open(temporary_path, "w") as state_file:
+            json.dump(state, state_file, indent=4)
+        os.replace(temporary_path, self._state_path)
+        self.saved_rows = self.completed_rows
+
+    def finish(self):
+        """ Remove the checkpoint once the run has completed
+        """
+        self.total = None
+        shutil.rmtree(self.checkpoint_path, ignore_errors=True)
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            return
+        # Everything up to the last completed row is kept for the next run to resume from, unless the run failed part way through adding a row
+        if self.completed_rows > self.saved_rows and not self.adding_row:
+            self.save()
+        if self.saved_rows > 0:
+            print(
+                f"Checkpoint saved after {self.saved_rows} completed rows to {self.checkpoint_path}, tick Resume to continue from there"
+            )
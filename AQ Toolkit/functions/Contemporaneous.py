@@ -1,33 +1,346 @@
 """ Contemporaneous calculations on timeseries, this is for finding where peaks may lie in the background data or in receptors
 """
 
+import csv
+import io
+import os
+import numpy as np
 import pandas as pd
-from .File_Utilties import _read_large_dataset, gooey_tqdm
+import typing
+from .File_Utilties import (
+    _convert_path,
+    _count_lines,
+    _read_dataset_chunks,
+    _read_large_dataset,
+    _receptor_usecols,
+    gooey_tqdm,
+)
+from .Kernels import top_positions
+from .Profiling import phase
 
 
-def _get_receptor_slice(
-    sliced_dataframe: pd.DataFrame, current_name: str, background_column_name: str
-) -> pd.DataFrame:
-    """ From the sorted slice retrieve both the index and sum with background
+class _TopRows:
+    """ Bounded buffer of the top N rows for each column, merged with each chunk as it is read so only N rows per receptor are held
 
     Args:
-        sliced_dataframe (pd.DataFrame): Slice of sorted dataframe, should contain two columns [current receptor, background]
-        current_name (str): Name to provide in output column names
+        output_rows (int): Number of rows to keep (top N)
+        ascending (bool): Whether to keep the smallest (True) or largest (False) values
+    """
+
+    def __init__(self, output_rows: int, ascending: bool):
+        self.output_rows = output_rows
+        self.ascending = ascending
+        self.index = None
+        self.key = None
+        self.values = {}
+
+    def update(self, index: np.ndarray, key: np.ndarray, **values: np.ndarray):
+        """ Merge a chunk into the buffer
+
+        Args:
+            index (np.ndarray): Row labels of the chunk
+            key (np.ndarray): Values to rank by, 1D for a single ranking or 2D (rows by receptors) for a ranking per receptor
+            **values (np.ndarray): Other values to keep for the top rows (same number of rows as the key)
+        """
+        index = np.broadcast_to(
+            np.asarray(index).reshape((-1,) + (1,) * (key.ndim - 1)), key.shape
+        )
+        if self.index is not None:
+            index = np.concatenate([self.index, index])
+            key = np.concatenate([self.key, key])
+            values = {
+                name: np.concatenate([self.values[name], value])
+                for name, value in values.items()
+            }
+
+        # Stable sort so ties keep the earliest row, missing values are placed last as with sort_values
+        if key.ndim == 1:
+            positions = np.argsort(
+                key if self.ascending else -key, kind="stable"
+            )[: self.output_rows]
+        else:
+            positions = top_positions(key if self.ascending else -key, self.output_rows)
+
+        if key.ndim == 1:
+            take = lambda array: array[positions]
+        else:
+            take = lambda array: np.take_along_axis(array, positions, axis=0)
+
+        self.index = take(index)
+        self.key = take(key)
+        self.values = {name: take(value) for name, value in values.items()}
+
+
+def _stack_columns(values: np.ndarray, dtypes: typing.List[np.dtype]) -> np.ndarray:
+    """ Stack a rows by receptors array into a single column (receptor by receptor) keeping each receptor's data type for writing
+
+    Args:
+        values (np.ndarray): 2D array of rows by receptors
+        dtypes (typing.List[np.dtype]): Data type of each receptor
+
+    Returns:
+        np.ndarray: 1D array of every receptor's rows in turn
+    """
+    unique_dtypes = set(dtypes)
+    if len(unique_dtypes) == 1:
+        return values.T.astype(unique_dtypes.pop()).ravel()
+
+    # Mix of integer and float receptors (eg all zero columns)
+    stacked = np.empty(values.shape[::-1], dtype=object)
+    for position, dtype in enumerate(dtypes):
+        stacked[position] = values[:, position].astype(dtype)
+    return stacked.ravel()
+
+
+def _contemporaneous_blocks(
+    receptor_top: _TopRows,
+    background_top: _TopRows,
+    sum_top: _TopRows,
+    background_values: np.ndarray,
+    integer_receptors: np.ndarray,
+    background_column_name: str,
+) -> typing.List[typing.Tuple[typing.Optional[str], np.ndarray, typing.List[np.dtype]]]:
+    """ Output columns for each receptor from the receptor, background and sum rankings
+
+    Args:
+        receptor_top (_TopRows): Top rows ranked by each receptor
+        background_top (_TopRows): Top rows ranked by background (with the receptor values of those rows)
+        sum_top (_TopRows): Top rows ranked by each receptor plus background (with the receptor values of those rows)
+        background_values (np.ndarray): Background for every row of the data (in the data type read)
+        integer_receptors (np.ndarray): Whether each receptor was read as integers
+        background_column_name (str): Column name containing background data
 
     Returns:
-        pd.DataFrame: Sliced dataframe with index and sum with background
+        typing.List[typing.Tuple[typing.Optional[str], np.ndarray, typing.List[np.dtype]]]: Column name (None for the receptor name), rows by receptors values and data type of each receptor
     """
+    background_dtype = background_values.dtype
+    receptor_count = len(integer_receptors)
 
-    # This is done as passing a kwarg to avoid the settingwithoutcopy warning
-    # https://stackoverflow.com/questions/12555323/adding-new-column-to-existing-dataframe-in-python-pandas
-    # https://stackoverflow.com/questions/39767718/pandas-assign-with-new-column-name-as-string
-    new_columns = {
-        f"{current_name}_Index": sliced_dataframe.index,
-        f"{current_name}_Background_Sum": sliced_dataframe.iloc[:, 0]
-        + sliced_dataframe[background_column_name],
-        f"{current_name}_Empty_Space": "",
+    receptor_dtypes = [
+        np.dtype(np.int64) if integer else np.dtype(np.float64)
+        for integer in integer_receptors
+    ]
+    sum_dtypes = [np.result_type(dtype, background_dtype) for dtype in receptor_dtypes]
+
+    def _per_receptor(values: np.ndarray) -> np.ndarray:
+        return np.broadcast_to(
+            values[:, np.newaxis], (len(values), receptor_count)
+        )
+
+    background_at_receptor = background_values[receptor_top.index]
+    background_at_sum = background_values[sum_top.index]
+    background_index = _per_receptor(background_top.index)
+    background_ranked = _per_receptor(background_values[background_top.index])
+
+    output_rows = len(receptor_top.index)
+    background_dtypes = [background_dtype] * receptor_count
+    index_dtypes = [np.dtype(np.int64)] * receptor_count
+    empty = np.full((output_rows, receptor_count), "", dtype=object)
+    empty_dtypes = [np.dtype(object)] * receptor_count
+
+    # In the order written by the original per receptor slices
+    return [
+        (None, receptor_top.key, receptor_dtypes),
+        (background_column_name, background_at_receptor, background_dtypes),
+        ("Receptor_Index", receptor_top.index, index_dtypes),
+        ("Receptor_Background_Sum", receptor_top.key + background_at_receptor, sum_dtypes),
+        ("Receptor_Empty_Space", empty, empty_dtypes),
+        (background_column_name, background_ranked, background_dtypes),
+        (None, background_top.values["receptors"], receptor_dtypes),
+        (f"{background_column_name}_Index", background_index, index_dtypes),
+        (
+            f"{background_column_name}_Background_Sum",
+            background_ranked + background_ranked,
+            background_dtypes,
+        ),
+        (f"{background_column_name}_Empty_Space", empty, empty_dtypes),
+        ("Sum", sum_top.key, sum_dtypes),
+        (background_column_name, background_at_sum, background_dtypes),
+        (None, sum_top.values["receptors"], receptor_dtypes),
+        ("Sum_Index", sum_top.index, index_dtypes),
+        ("Sum_Background_Sum", sum_top.key + background_at_sum, sum_dtypes),
+        ("Sum_Empty_Space", empty, empty_dtypes),
+    ]
+
+
+def _contemporaneous_text(
+    receptor_names: typing.List[str],
+    blocks: typing.List[typing.Tuple[typing.Optional[str], np.ndarray, typing.List[np.dtype]]],
+) -> str:
+    """ CSV text with a block of rows for each receptor (column names, then the receptor, background and sum rankings)
+
+    Args:
+        receptor_names (typing.List[str]): Receptor column names
+        blocks (typing.List[typing.Tuple[typing.Optional[str], np.ndarray, typing.List[np.dtype]]]): Output columns from _contemporaneous_blocks
+
+    Returns:
+        str: CSV text for every receptor in order
+    """
+    output_rows = len(blocks[0][1])
+    columns = {
+        position: _stack_columns(values, dtypes)
+        for position, (_, values, dtypes) in enumerate(blocks)
     }
-    return sliced_dataframe.assign(**new_columns)
+    rows_df = pd.DataFrame(
+        columns, index=np.tile(np.arange(output_rows), len(receptor_names))
+    )
+    row_lines = rows_df.to_csv(header=False).split(os.linesep)
+
+    text = io.StringIO()
+    header_writer = csv.writer(text, lineterminator=os.linesep)
+    for position, receptor_name in enumerate(receptor_names):
+        header_writer.writerow(
+            [""] + [receptor_name if name is None else name for name, _, _ in blocks]
+        )
+        lines = row_lines[position * output_rows : (position + 1) * output_rows]
+        if lines:
+            text.write(os.linesep.join(lines) + os.linesep)
+    return text.getvalue()
+
+
+def _contemporaneous_shard(
+    data_spec: typing.Dict[str, typing.Any],
+    background_spec: typing.Tuple,
+    start: int,
+    stop: int,
+    receptor_names: typing.List[str],
+    integer_receptors: np.ndarray,
+    background_column_name: str,
+    output_rows: int,
+    ascending: bool,
+) -> str:
+    """ Contemporaneous CSV text for a shard of receptors, run in a worker attached to the shared data and background
+
+    Args:
+        data_spec (typing.Dict[str, typing.Any]): Spec of the shared timeseries of rows by receptors
+        background_spec (typing.Tuple): Spec of the shared background for every row
+        start (int): Position of the first receptor in the shard
+        stop (int): Position after the last receptor in the shard
+        receptor_names (typing.List[str]): Names of the receptors in the shard
+        integer_receptors (np.ndarray): Whether each receptor in the shard was read as integers
+        background_column_name (str): Column name containing background data
+        output_rows (int): Number of rows (top N scores)
+        ascending (bool): Whether to sort ascending (True) or descending (False)
+
+    Returns:
+        str: CSV text for the receptors in the shard
+    """
+    from .Shared_Arrays import SharedArray, SharedTimeseries
+
+    with SharedTimeseries.attach(data_spec) as data, SharedArray.attach(
+        background_spec
+    ) as background:
+        values = data.values[:, start:stop]
+        background_values = background.array
+        index = np.arange(len(values))
+        background_float = background_values.astype(float)
+
+        receptor_top = _TopRows(output_rows, ascending)
+        background_top = _TopRows(output_rows, ascending)
+        sum_top = _TopRows(output_rows, ascending)
+        receptor_top.update(index, values)
+        background_top.update(index, background_float, receptors=values)
+        sum_top.update(index, values + background_float[:, np.newaxis], receptors=values)
+
+        blocks = _contemporaneous_blocks(
+            receptor_top,
+            background_top,
+            sum_top,
+            background_values,
+            integer_receptors,
+            background_column_name,
+        )
+        return _contemporaneous_text(receptor_names, blocks)
+
+
+def _parallel_contemporaneous(
+    chunks: typing.Iterator[pd.DataFrame],
+    capacity: typing.Optional[int],
+    header_length: int,
+    background: pd.Series,
+    background_column_name: str,
+    output_rows: int,
+    output_filename: str,
+    ascending: bool,
+    workers: int,
+):
+    """ Read the data into shared memory and compute shards of receptors across a pool of processes, shards are written in receptor order so the output matches the serial run
+
+    Args:
+        chunks (typing.Iterator[pd.DataFrame]): Chunks of the input data
+        capacity (typing.Optional[int]): Upper bound on the number of rows (eg lines in the file), None to size from the first chunk
+        header_length (int): Number of columns to ignore
+        background (pd.Series): Background column
+        background_column_name (str): Column name containing background data
+        output_rows (int): Number of rows (top N scores)
+        output_filename (str): Path to file name to write CSV to
+        ascending (bool): Whether to sort ascending (True) or descending (False)
+        workers (int): Number of processes to use
+
+    Raises:
+        ValueError: If there is no data or more rows than expected
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from .Shared_Arrays import SharedArray, SharedTimeseries, receptor_shards
+
+    data = None
+    shared_background = None
+    try:
+        rows = 0
+        for chunk in chunks:
+            chunk = chunk.iloc[:, header_length:]
+            if data is None:
+                receptor_names = [str(column) for column in chunk.columns]
+                integer_receptors = np.ones(chunk.shape[1], dtype=bool)
+                data = SharedTimeseries.allocate(capacity or len(chunk), receptor_names)
+            if rows + len(chunk) > data.shape[0]:
+                raise ValueError(f"More rows than expected in data set, unable to fit {rows + len(chunk)} rows")
+            # Receptors are only written as integers if every chunk was read as integers
+            integer_receptors &= np.array(
+                [dtype.kind in "iu" for dtype in chunk.dtypes], dtype=bool
+            )
+            data.values[rows : rows + len(chunk)] = chunk.to_numpy(dtype=float)
+            rows += len(chunk)
+
+        if data is None or rows == 0:
+            raise ValueError("No data found to compute contemporaneous values")
+
+        if rows < data.shape[0]:
+            # Fewer rows than lines (eg blank lines), copy into shared memory of the exact size
+            trimmed = SharedTimeseries.publish(data.values[:rows], columns=receptor_names)
+            data.close()
+            data = trimmed
+
+        # Background for every row of the data (as if added as a column)
+        shared_background = SharedArray.copy_of(
+            background.reindex(pd.RangeIndex(rows)).to_numpy()
+        )
+
+        shards = receptor_shards(len(receptor_names), workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            texts = executor.map(
+                _contemporaneous_shard,
+                [data.spec] * len(shards),
+                [shared_background.spec] * len(shards),
+                [start for start, _ in shards],
+                [stop for _, stop in shards],
+                [receptor_names[start:stop] for start, stop in shards],
+                [integer_receptors[start:stop] for start, stop in shards],
+                [background_column_name] * len(shards),
+                [output_rows] * len(shards),
+                [ascending] * len(shards),
+            )
+            # Results come back in shard order
+            with phase("export"), open(
+                output_filename, "w", newline="", buffering=1024 * 1024
+            ) as f:
+                for text in gooey_tqdm(texts, total=len(shards)):
+                    f.write(text)
+    finally:
+        for shared in [data, shared_background]:
+            if shared is not None:
+                shared.close()
 
 
 def contemporaneous(
@@ -38,8 +351,14 @@ def contemporaneous(
     output_rows: int,
     output_filename: str,
     ascending: bool,
-) -> pd.DataFrame:
-    """ Contemporaneous calculations for timeseries (this sorts the values by data to get the top N scores)
+    receptors: typing.Optional[typing.List[str]] = None,
+    receptor_pattern: typing.Optional[str] = None,
+    chunksize: int = 2000,
+    workers: int = 1,
+):
+    """ Contemporaneous calculations for timeseries (this sorts the values by data to get the top N scores).
+        With a single worker the data is read in chunks of hours keeping only the top N rows of each receptor for the receptor, background and sum rankings, so the full data set is never held in memory.
+        With more workers the data is read into shared memory and receptors are split across a pool of processes
 
     Args:
         header_length (int): Number of columns to ignore
@@ -49,69 +368,92 @@ def contemporaneous(
         output_rows (int): Number of rows (top N scores)
         output_filename (str): Path to file name to write CSV to
         ascending (bool): Whether to sort ascending (True) or descending (False)
-
-    Returns:
-        pd.DataFrame: [description]
+        receptors (typing.Optional[typing.List[str]], optional): Receptor IDs to limit the calculation to, only these columns are read. Defaults to None (all receptors).
+        receptor_pattern (typing.Optional[str], optional): Regular expression receptor IDs must match to be read. Defaults to None.
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+        workers (int, optional): Number of processes to compute receptors with. Defaults to 1.
     """
 
     header_length = int(header_length)
     output_rows = int(output_rows)
+    workers = int(workers or 1)
 
-    background = _read_large_dataset(input_background_path)
+    background = _read_large_dataset(input_background_path)[background_column_name]
 
-    data = _read_large_dataset(input_path)
+    read_kwargs = {}
+    if receptors is not None or receptor_pattern:
+        read_kwargs["usecols"] = _receptor_usecols(
+            input_path, header_length, receptors, receptor_pattern
+        )
 
-    # Disregard any information (essentially an index)
-    data = data.iloc[:, header_length:]
+    chunks = _read_dataset_chunks(input_path, chunksize, **read_kwargs)
 
-    # Read in background pollutant levels a column in the data
-    data[background_column_name] = background[background_column_name]
+    if workers > 1:
+        # Lines in the file less the column names is an upper bound on the number of rows
+        capacity = None
+        if _convert_path(input_path).suffix == ".csv":
+            capacity = max(_count_lines(input_path) - 1, 1)
+        _parallel_contemporaneous(
+            chunks,
+            capacity,
+            header_length,
+            background,
+            background_column_name,
+            output_rows,
+            output_filename,
+            ascending,
+            workers,
+        )
+        return
 
-    # Sum first column for consistent dataframe dimensions
-    data["Sum"] = data[data.columns[0]] + data[background_column_name]
+    receptor_top = _TopRows(output_rows, ascending)
+    background_top = _TopRows(output_rows, ascending)
+    sum_top = _TopRows(output_rows, ascending)
 
-    # Write a CSV progressively (row by row)
-    f = open(output_filename, "w", newline="")
+    receptor_names = None
+    integer_receptors = None
+    rows = 0
 
-    # Loop over each column in the data set (representing a receptor)
-    # Enumerate must be the last wrapper as it doesn't have a length so the loading bar won't format properly
-    # https://github.com/tqdm/tqdm/issues/157
-    for column_number, column in enumerate(gooey_tqdm(data.columns[:-2])):
+    for chunk in chunks:
+        # Disregard any information (essentially an index)
+        chunk = chunk.iloc[:, header_length:]
 
-        # Print only every 3rd column number so the progress bar appears
-        if column_number % 3 == 0:
-            print("")
-        # Sort by current receptor
-        sorted_data = data.sort_values(by=column, ascending=ascending).head(output_rows)
+        with phase("transform"):
+            if receptor_names is None:
+                receptor_names = [str(column) for column in chunk.columns]
+                integer_receptors = np.ones(chunk.shape[1], dtype=bool)
+            # Receptors are only written as integers if every chunk was read as integers
+            integer_receptors &= np.array(
+                [dtype.kind in "iu" for dtype in chunk.dtypes], dtype=bool
+            )
 
-        receptor_slice = _get_receptor_slice(
-            sorted_data.iloc[:, [column_number, -2]], "Receptor", background_column_name
-        )
+            index = chunk.index.to_numpy()
+            values = chunk.to_numpy(dtype=float)
+            # Background pollutant levels for the same rows (matched on row labels)
+            chunk_background = background.reindex(chunk.index).to_numpy(dtype=float)
+            sums = values + chunk_background[:, np.newaxis]
 
-        # Sort by background
-        sorted_data = data.sort_values(
-            by=background_column_name, ascending=ascending
-        ).head(output_rows)
-        background_slice = _get_receptor_slice(
-            sorted_data.iloc[:, [-2, column_number]],
-            background_column_name,
-            background_column_name,
-        )
+            receptor_top.update(index, values)
+            background_top.update(index, chunk_background, receptors=values)
+            sum_top.update(index, sums, receptors=values)
+            rows += len(chunk)
 
-        # Sort by sum of current receptor + background
-        data["Sum"] = data[column] + data[background_column_name]
-        sorted_data = data.sort_values(by="Sum", ascending=ascending).head(output_rows)
-        sum_slice = _get_receptor_slice(
-            sorted_data.iloc[:, [-1, -2, column_number]], "Sum", background_column_name
-        )
+    if receptor_names is None:
+        raise ValueError(f"No data found in {input_path}")
 
-        # Remove all indexes from slices
-        receptor_slice.reset_index(drop=True, inplace=True)
-        background_slice.reset_index(drop=True, inplace=True)
-        sum_slice.reset_index(drop=True, inplace=True)
+    # Background for every row of the data (as if added as a column)
+    background_values = background.reindex(pd.RangeIndex(rows)).to_numpy()
 
-        # Wrap into a single dataframe
-        result = pd.concat([receptor_slice, background_slice, sum_slice], axis=1)
+    blocks = _contemporaneous_blocks(
+        receptor_top,
+        background_top,
+        sum_top,
+        background_values,
+        integer_receptors,
+        background_column_name,
+    )
 
-        # Write current dataframe into CSV
-        result.to_csv(f)
+    with phase("export"):
+        text = _contemporaneous_text(receptor_names, blocks)
+        with open(output_filename, "w", newline="", buffering=1024 * 1024) as f:
+            f.write(text)
@@ -0,0 +1,183 @@
+""" Exceedance episodes, finds runs of consecutive hours above a criterion for every receptor at once and reports when each started, how long it lasted, the peak and whether the background or the source drove it
+"""
+
+import numpy as np
+import pandas as pd
+import typing
+from .File_Utilties import _read_large_dataset, _receptor_usecols
+from .Profiling import phase
+from .Timeseries import Timeseries
+
+
+def _run_length_episodes(
+    mask: np.ndarray,
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Run length encode a boolean mask of hours by receptors into episodes of consecutive True values (all receptors at once)
+
+    Args:
+        mask (np.ndarray): 2D boolean array of hours by receptors
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray, np.ndarray]: Receptor position, start row and end row (exclusive) of each episode, ordered by receptor then start
+    """
+    hours, receptors = mask.shape
+    # Pad each receptor with a False hour either side so every episode has a start and an end
+    padded = np.zeros((receptors, hours + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask.T
+    changes = np.diff(padded, axis=1)
+
+    receptor_positions, starts = np.nonzero(changes == 1)
+    _, ends = np.nonzero(changes == -1)
+    return receptor_positions, starts, ends
+
+
+def episode_table(
+    totals: np.ndarray,
+    background: np.ndarray,
+    criterion: float,
+    receptor_ids: typing.Sequence,
+    header: typing.Optional[pd.DataFrame] = None,
+    min_duration: int = 1,
+) -> pd.DataFrame:
+    """ Compact table of exceedance episodes (hours where the total is above the criterion) for every receptor
+
+    Args:
+        totals (np.ndarray): 2D array of hours by receptors including background
+        background (np.ndarray): Background for each hour (zeros if the totals are source only)
+        criterion (float): Value which must be exceeded (eg 246)
+        receptor_ids (typing.Sequence): Receptor ID of each column
+        header (typing.Optional[pd.DataFrame], optional): Header columns (eg YYYY, JDY, HHMM) to report the start and peak time with. Defaults to None.
+        min_duration (int, optional): Minimum number of consecutive hours for an episode to be reported. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: Episodes with receptor, start, duration, peak, source & background at peak and driver
+    """
+    totals = np.asarray(totals, dtype=float)
+    background = np.asarray(background, dtype=float)
+    hours = totals.shape[0]
+
+    receptor_positions, starts, ends = _run_length_episodes(totals > criterion)
+    durations = ends - starts
+
+    keep = durations >= int(min_duration)
+    receptor_positions, starts, ends, durations = (
+        receptor_positions[keep],
+        starts[keep],
+        ends[keep],
+        durations[keep],
+    )
+
+    # Every hour of every episode in receptor major order, labelled with its episode
+    episode_ids = np.repeat(np.arange(len(starts)), durations)
+    offsets = np.arange(durations.sum()) - np.repeat(np.cumsum(durations) - durations, durations)
+    episode_hours = np.repeat(starts, durations) + offsets
+    episode_values = totals.T[np.repeat(receptor_positions, durations), episode_hours]
+
+    if len(starts) > 0:
+        first_hour = np.concatenate([[0], np.cumsum(durations)[:-1]])
+        peaks = np.maximum.reduceat(episode_values, first_hour)
+        # First hour in each episode matching the peak
+        at_peak = episode_values == peaks[episode_ids]
+        _, first_peak = np.unique(episode_ids[at_peak], return_index=True)
+        peak_rows = episode_hours[at_peak][first_peak]
+    else:
+        peaks = np.empty(0)
+        peak_rows = np.empty(0, dtype=np.int64)
+
+    background_at_peak = background[peak_rows]
+    source_at_peak = peaks - background_at_peak
+
+    driver = np.where(
+        background_at_peak > criterion,
+        "Background",
+        np.where(source_at_peak > criterion, "Source", "Combined"),
+    )
+
+    episodes = pd.DataFrame(
+        {
+            "Receptor": np.asarray(receptor_ids)[receptor_positions],
+            "Start Index": starts,
+            "End Index": ends - 1,
+            "Duration (hours)": durations,
+            "Peak": peaks,
+            "Peak Index": peak_rows,
+            "Source at Peak": source_at_peak,
+            "Background at Peak": background_at_peak,
+            "Driver": driver,
+        }
+    )
+
+    if header is not None and len(header.columns) > 0 and len(header) == hours:
+        # Timestamps of the start and the peak from the header columns
+        for label, rows in [("Start", starts), ("Peak", peak_rows)]:
+            position = episodes.columns.get_loc(f"{label} Index") + 1
+            for column in header.columns[::-1]:
+                episodes.insert(
+                    position, f"{label} {column}", header[column].to_numpy()[rows]
+                )
+
+    return episodes
+
+
+def exceedances(
+    header_length: int,
+    input_path: str,
+    criterion: float,
+    input_background_path: typing.Optional[str] = None,
+    background_column_name: typing.Optional[str] = None,
+    min_duration: int = 1,
+    receptors: typing.Optional[typing.List[str]] = None,
+    receptor_pattern: typing.Optional[str] = None,
+) -> pd.DataFrame:
+    """ Exceedance episodes for a timeseries, background is added hour by hour as with contemporaneous (row by row on the index)
+
+    Args:
+        header_length (int): Number of columns to ignore
+        input_path (str): Path to input source data
+        criterion (float): Value which must be exceeded (eg 246)
+        input_background_path (typing.Optional[str], optional): Path to input background data, leave as None if the source data already includes background. Defaults to None.
+        background_column_name (typing.Optional[str], optional): Column name containing background data. Defaults to None.
+        min_duration (int, optional): Minimum number of consecutive hours for an episode to be reported. Defaults to 1.
+        receptors (typing.Optional[typing.List[str]], optional): Receptor IDs to limit the calculation to, only these columns are read. Defaults to None (all receptors).
+        receptor_pattern (typing.Optional[str], optional): Regular expression receptor IDs must match to be read. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Exceedance episodes
+    """
+    header_length = int(header_length)
+
+    read_kwargs = {}
+    if receptors is not None or receptor_pattern:
+        read_kwargs["usecols"] = _receptor_usecols(
+            input_path, header_length, receptors, receptor_pattern
+        )
+
+    timeseries = Timeseries.from_frame(
+        _read_large_dataset(input_path, **read_kwargs), header_length
+    )
+
+    if input_background_path:
+        background_df = _read_large_dataset(input_background_path)
+        background = (
+            pd.to_numeric(background_df[background_column_name], errors="coerce")
+            .reindex(timeseries.index)
+            .to_numpy(dtype=float)
+        )
+    else:
+        background = np.zeros(timeseries.rows)
+
+    with phase("transform"):
+        totals = timeseries.values + background[:, np.newaxis]
+        episodes = episode_table(
+            totals,
+            background,
+            float(criterion),
+            pd.Index(timeseries.receptors).astype(str),
+            timeseries.header.reset_index(drop=True),
+            min_duration,
+        )
+
+    print(
+        f"Found {len(episodes)} exceedance episodes across {episodes['Receptor'].nunique()} of {len(timeseries.receptors)} receptors"
+    )
+    return episodes
@@ -2,11 +2,22 @@
 
 """
 
+import contextlib
 import os
 import csv
+import typing
 import pandas as pd
 
-from .File_Utilties import _read_large_dataset, prepend_header_dataframe
+from .Checkpoint import Checkpoint, checkpoint_settings, run_key
+from .File_Utilties import (
+    _export_csv,
+    _read_large_dataset,
+    gooey_tqdm,
+)
+from .Kernels import scale_rows
+from .Preflight import validate_factorizer_config
+from .Profiling import phase
+from .Timeseries import Timeseries
 
 
 def factorizer(
@@ -36,16 +47,88 @@ def factorizer(
         raise ValueError("Ensure factors and data share same length in index")
 
     # Separate header from data
-    data_header_df = data_df.iloc[:, :header_length]
-
-    data_df = data_df.iloc[:, header_length:]
+    timeseries = Timeseries.from_frame(data_df, header_length)
 
     # Multiply all rows by scalar value in factor column
-    output_df = pd.DataFrame()
-    for column in data_df.columns:
-        output_df[column] = data_df[column] * factor_df.iloc[:, -1]
+    factors = factor_df.iloc[:, -1].to_numpy(dtype=float)
+    output = timeseries.with_values(scale_rows(timeseries.values, factors))
+
+    # Header columns are joined back on once, for export
+    return output.frame()
+
+
+def batch_factorizer(
+    config_df: pd.DataFrame,
+    header_length: int,
+    path_col_name: str = "Path",
+    factor_col_name: str = "Factor",
+    output_col_name: str = "Output",
+    checkpoint_interval: int = 0,
+    checkpoint_path: typing.Optional[str] = None,
+    resume: bool = False,
+):
+    """ Run the factorizer over each row of a configuration, writing each factorised data set to its output path.
+        With checkpoints the number of completed rows is saved every few rows so a failed run can be resumed from the next row
+
+    Args:
+        config_df (pd.DataFrame): Configuration with the data set, factor and output paths
+        header_length (int): Number of columns in index to ignore (eg, 3 for year/month/day)
+        path_col_name (str, optional): Name of column containing data set paths. Defaults to "Path".
+        factor_col_name (str, optional): Name of column containing factor paths. Defaults to "Factor".
+        output_col_name (str, optional): Name of column containing output paths. Defaults to "Output".
+        checkpoint_interval (int, optional): Number of rows completed between checkpoints. Defaults to 0 (no checkpoints).
+        checkpoint_path (typing.Optional[str], optional): Folder to keep the checkpoint in. Defaults to None (next to the first output).
+        resume (bool, optional): Continue from the checkpoint of a failed run with the same configuration. Defaults to False.
+
+    Raises:
+        ValueError: If the pre-flight check finds problems with any row (missing files, mismatched hours or output folders)
+    """
+    rows = [row for _, row in config_df.iterrows()]
+
+    # Every row is checked before starting rather than failing part way through
+    validate_factorizer_config(
+        config_df, header_length, path_col_name, factor_col_name, output_col_name
+    )
+
+    checkpoint_path, checkpoint_interval = checkpoint_settings(
+        rows[0][output_col_name] if rows else None,
+        checkpoint_interval,
+        checkpoint_path,
+        resume,
+    )
+    if checkpoint_path is None:
+        checkpoint = None
+        start = 0
+    else:
+        checkpoint = Checkpoint(
+            checkpoint_path,
+            run_key(
+                [
+                    [str(row[path_col_name]), str(row[factor_col_name]), str(row[output_col_name])]
+                    for row in rows
+                ],
+                int(header_length),
+            ),
+            checkpoint_interval,
+        )
+        start = checkpoint.resume() if resume else 0
+
+    with checkpoint if checkpoint is not None else contextlib.nullcontext():
+        for position, row in gooey_tqdm(
+            list(enumerate(rows))[start:], total=len(rows) - start
+        ):
+            # Read datasets
+            data_df = _read_large_dataset(row[path_col_name])
+
+            factor_df = _read_large_dataset(row[factor_col_name])
+
+            with phase("compute"):
+                factorised_df = factorizer(header_length, data_df, factor_df,)
+
+            _export_csv(factorised_df, row[output_col_name])
 
-    # Concatenate the header columns back with the updated data
-    output_df = prepend_header_dataframe(output_df, data_header_df)
+            if checkpoint is not None:
+                checkpoint.completed(position + 1)
 
-    return output_df
+    if checkpoint is not None:
+        checkpoint.finish()
@@ -1,20 +1,19 @@
 import pathlib
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import typing
 import os
 from datetime import datetime
+from .Profiling import phase, record_data
 
 
 def prepend_header_dataframe(
     dataframe: pd.DataFrame, header_dataframe: pd.DataFrame
 ) -> pd.DataFrame:
-    # Prepend header columns
+    # Prepend header columns in a single join rather than inserting them one at a time
     if len(header_dataframe.columns) > 0:
-
-        # Insert backwards to keep original order
-        for column in header_dataframe.columns[::-1]:
-            dataframe.insert(0, column, header_dataframe[column])
+        return pd.concat([header_dataframe.reindex(dataframe.index), dataframe], axis=1)
 
     return dataframe
 
@@ -42,7 +41,8 @@ def _export_excel(df: pd.DataFrame, output_file_path: str):
     """
     print(f"Exporting data to {output_file_path}")
     try:
-        df.to_excel(output_file_path, index=False)
+        with phase("export"):
+            df.to_excel(output_file_path, index=False)
     except ValueError:
         print(f"Exporting Excel Failed, attemping CSV export")
         new_output_path = _change_extension_on_path(output_file_path, ".csv")
@@ -57,7 +57,26 @@ def _export_csv(df: pd.DataFrame, output_file_path: str):
         output_file_path (str): Location to export to
     """
     print(f"Exporting data to {output_file_path}")
-    df.to_csv(output_file_path, index=False)
+    with phase("export"):
+        df.to_csv(output_file_path, index=False)
+
+
+def _export_parquet(df: pd.DataFrame, output_file_path: str):
+    """ For exporting dataframes to provided paths to parquet (columnar) format
+
+    Args:
+        df (pd.DataFrame): DataFrame to export
+        output_file_path (str): Location to export to
+    """
+    print(f"Exporting data to {output_file_path}")
+    try:
+        with phase("export"):
+            df.to_parquet(output_file_path, index=False)
+    except ImportError:
+        # pyarrow (or fastparquet) is needed to write parquet files
+        print(f"Exporting Parquet Failed, attemping CSV export")
+        new_output_path = _change_extension_on_path(output_file_path, ".csv")
+        _export_csv(df, new_output_path)
 
 
 def error_printing(error_message: str):
@@ -156,17 +175,353 @@ def _read_large_dataset(
     """
     file_path = _convert_path(filename)
     temp_list = []
+    with phase("read"):
+        if file_path.suffix == ".xlsx":
+            dataframe = pd.read_excel(file_path, *args, **kwargs)
+        elif file_path.suffix == ".csv":
+            for chunk in pd.read_csv(file_path, chunksize=chunksize, *args, **kwargs):
+                temp_list.append(chunk)
+
+            dataframe = pd.concat(temp_list)
+        else:
+            raise ValueError(f"Unable to read data set found at {file_path}")
+
+    record_data(*dataframe.shape)
+    return dataframe
+
+
+def _count_content_lines(file: typing.BinaryIO, dtype: typing.Any) -> int:
+    """ Count the lines with something other than whitespace in an open file (read in blocks of characters)
+
+    Args:
+        file (typing.BinaryIO): File opened in binary mode at the start
+        dtype (typing.Any): Type of each character (np.uint8, or <u2 or >u2 for UTF-16)
+
+    Returns:
+        int: Number of lines with content
+    """
+    width = np.dtype(dtype).itemsize
+    lines = 0
+    # Whether the last line end or content seen was a line end (the start of the file counts as one)
+    after_line_end = True
+    for block in iter(lambda: file.read(1024 * 1024), b""):
+        characters = np.frombuffer(block[: len(block) // width * width], dtype=dtype)
+        line_ends = characters == ord("\n")
+        content = ~(line_ends | np.isin(characters, [ord(" "), ord("\t"), ord("\r"), 0xFEFF]))
+        # Line ends and content in order, a line is counted at its end if content comes before it
+        marks = line_ends[line_ends | content]
+        if len(marks):
+            lines += int(np.count_nonzero(marks[1:] & ~marks[:-1]))
+            lines += int(bool(marks[0]) and not after_line_end)
+            after_line_end = bool(marks[-1])
+    return lines + int(not after_line_end)
+
+
+def _count_lines(filename: str, skip_blank_lines: bool = False) -> int:
+    """ Count the lines in a text file without parsing it (read in blocks of bytes), UTF-16 files (eg GRAL timeseries) are recognised by their byte order mark
+
+    Args:
+        filename (str): Path to file
+        skip_blank_lines (bool, optional): Don't count empty or whitespace only lines (as pandas read_csv skips them). Defaults to False.
+
+    Returns:
+        int: Number of lines (a final line without a newline is counted)
+    """
+    lines = 0
+    last_character = None
+    with open(filename, "rb") as f:
+        byte_order_mark = f.read(2)
+        f.seek(0)
+        utf_16 = byte_order_mark in (b"\xff\xfe", b"\xfe\xff")
+        # Two bytes per character, blocks are an even size so characters never straddle them
+        dtype = "<u2" if byte_order_mark == b"\xff\xfe" else ">u2"
+        if skip_blank_lines:
+            return _count_content_lines(f, dtype if utf_16 else np.uint8)
+
+        if utf_16:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                characters = np.frombuffer(block[: len(block) // 2 * 2], dtype=dtype)
+                lines += int(np.count_nonzero(characters == ord("\n")))
+                if len(characters):
+                    last_character = int(characters[-1])
+            if last_character not in (None, ord("\n"), 0xFEFF):
+                lines += 1
+            return lines
+
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            lines += block.count(b"\n")
+            last_character = block[-1:]
+    if last_character and last_character != b"\n":
+        lines += 1
+    return lines
+
+
+def _read_dataset_chunks(
+    filename: str, chunksize: int = 2000, *args, **kwargs
+) -> typing.Iterator[pd.DataFrame]:
+    """ Read a data set a chunk of rows at a time so it never has to be held in memory at once (row labels continue across chunks as with _read_large_dataset)
+
+    Args:
+        filename (str): Path to file to read
+        chunksize (int): Number of rows in each chunk
+
+    Yields:
+        typing.Iterator[pd.DataFrame]: Chunks of the data set in order
+    """
+    file_path = _convert_path(filename)
     if file_path.suffix == ".xlsx":
-        return pd.read_excel(file_path, *args, **kwargs)
-    elif file_path.suffix == ".csv":
-        for chunk in pd.read_csv(file_path, chunksize=chunksize, *args, **kwargs):
-            temp_list.append(chunk)
+        # Excel can't be read in chunks
+        with phase("read"):
+            dataframe = pd.read_excel(file_path, *args, **kwargs)
+        record_data(*dataframe.shape)
+        yield dataframe
+        return
+    elif file_path.suffix != ".csv":
+        raise ValueError(f"Unable to read data set found at {file_path}")
+
+    reader = pd.read_csv(file_path, chunksize=chunksize, *args, **kwargs)
+    while True:
+        with phase("read"):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        record_data(*chunk.shape)
+        yield chunk
+
+
+def _resolve_input_files(path: str, path_col_name: str = "Path") -> typing.List[str]:
+    """ Get a list of input files from either a configuration file or a glob pattern (eg 'C:/Run/*.csv')
+
+    Args:
+        path (str): Path to configuration file or glob pattern
+        path_col_name (str, optional): Name of column containing file paths in the configuration file. Defaults to "Path".
+
+    Raises:
+        ValueError: If no files are found
+
+    Returns:
+        typing.List[str]: List of file paths
+    """
+    import glob
 
-        return pd.concat(temp_list)
+    if glob.has_magic(path):
+        file_list = sorted(glob.glob(path))
+    else:
+        config_df = _read_large_dataset(path)
+        file_list = config_df[path_col_name].dropna().astype(str).tolist()
+
+    if len(file_list) == 0:
+        raise ValueError(f"No input files found from {path}")
+
+    return file_list
+
+
+def _read_column_names(filename: str, *args, **kwargs) -> typing.List:
+    """ Read only the column names of a dataset (no data rows are parsed)
+
+    Args:
+        filename (str): Path to file to read
+
+    Returns:
+        typing.List: Column names in file order
+    """
+    file_path = _convert_path(filename)
+    if file_path.suffix == ".xlsx":
+        return pd.read_excel(file_path, nrows=0, *args, **kwargs).columns.tolist()
+    elif file_path.suffix == ".csv":
+        return pd.read_csv(file_path, nrows=0, *args, **kwargs).columns.tolist()
 
     raise ValueError(f"Unable to read data set found at {file_path}")
 
 
+def _receptor_usecols(
+    filename: str,
+    header_length: int,
+    receptors: typing.Optional[typing.List[str]] = None,
+    pattern: typing.Optional[str] = None,
+) -> typing.List[int]:
+    """ Column positions to read for a subset of receptors, header columns are always kept. Pass as `usecols` to only parse the needed columns
+
+    Args:
+        filename (str): Path to dataset
+        header_length (int): Number of header columns before the receptor data starts
+        receptors (typing.Optional[typing.List[str]], optional): Receptor IDs (column names) to keep. Defaults to None (all receptors).
+        pattern (typing.Optional[str], optional): Regular expression receptor IDs must match to be kept. Defaults to None.
+
+    Raises:
+        ValueError: If none of the receptors are found in the dataset
+
+    Returns:
+        typing.List[int]: Column positions to read
+    """
+    import re
+
+    header_length = int(header_length)
+    column_names = _read_column_names(filename)
+
+    receptor_positions = list(range(header_length, len(column_names)))
+
+    if receptors is not None:
+        wanted = set(str(receptor).strip() for receptor in receptors)
+        receptor_positions = [
+            position
+            for position in receptor_positions
+            if str(column_names[position]).strip() in wanted
+        ]
+        if len(receptor_positions) < len(wanted):
+            error_printing(
+                f"{len(wanted) - len(receptor_positions)} selected receptors were not found in {filename}"
+            )
+
+    if pattern:
+        regex = re.compile(pattern)
+        receptor_positions = [
+            position
+            for position in receptor_positions
+            if regex.search(str(column_names[position]).strip())
+        ]
+
+    if len(receptor_positions) == 0:
+        raise ValueError(f"None of the selected receptors were found in {filename}")
+
+    print(f"Reading {len(receptor_positions)} of {len(column_names) - header_length} receptors from {filename}")
+    return list(range(header_length)) + receptor_positions
+
+
+def _available_precisions() -> typing.List[str]:
+    return ["float64", "float32"]
+
+
+def _coerce_receptor_values(
+    receptor_df: pd.DataFrame, fill_value: typing.Optional[float] = None
+) -> np.ndarray:
+    """ Convert receptor columns to a 2D float64 array in a single pass, text that can't be converted becomes NaN (as with pd.to_numeric(errors='coerce'))
+
+    Args:
+        receptor_df (pd.DataFrame): Receptor columns as read
+        fill_value (typing.Optional[float], optional): Value to fill missing (blank) cells with before conversion. Defaults to None.
+
+    Returns:
+        np.ndarray: 2D array of rows (hours) by columns (receptors)
+    """
+    values = receptor_df.to_numpy()
+
+    if values.dtype.kind in "biuf":
+        values = values.astype(np.float64, copy=False)
+        if fill_value is not None:
+            values = np.where(np.isnan(values), fill_value, values)
+        return values
+
+    # Stray text somewhere in the receptors, convert every cell at once rather than column by column
+    if fill_value is not None:
+        values = np.where(pd.isna(values), fill_value, values)
+    return (
+        pd.to_numeric(pd.Series(values.ravel()), errors="coerce")
+        .to_numpy(dtype=np.float64)
+        .reshape(values.shape)
+    )
+
+
+def _max_relative_error(values: np.ndarray, converted: np.ndarray) -> float:
+    """ Largest relative difference between the original and converted values (zeros and missing values are skipped)
+
+    Args:
+        values (np.ndarray): Original values
+        converted (np.ndarray): Values after conversion (eg to float32)
+
+    Returns:
+        float: Maximum relative error
+    """
+    nonzero = (values != 0) & np.isfinite(values)
+    if not nonzero.any():
+        return 0.0
+    with np.errstate(over="ignore", invalid="ignore"):
+        original = values[nonzero]
+        return float(np.max(np.abs(converted[nonzero] - original) / np.abs(original)))
+
+
+def _read_timeseries(
+    filename: str,
+    header_length: int,
+    top_header_length: int = 0,
+    precision: str = "float64",
+    fill_value: typing.Optional[float] = None,
+    usecols: typing.Optional[typing.List[int]] = None,
+    chunksize: int = 2000,
+) -> "Timeseries":
+    """ Read a timeseries data set with known header columns (eg YYYY, JDY, HHMM). Header columns are kept as read, receptor columns are converted to floats
+        in one pass per chunk. With float32 precision each chunk is converted as it is read, halving the memory of the receptor data, and the maximum relative error is reported
+
+    Args:
+        filename (str): Path to file to read
+        header_length (int): Number of header columns before the receptor data starts
+        top_header_length (int, optional): Number of rows after the column names to skip before the data starts. Defaults to 0.
+        precision (str, optional): float64 or float32 for receptor values. Defaults to "float64".
+        fill_value (typing.Optional[float], optional): Value to fill missing (blank) receptor values with. Defaults to None.
+        usecols (typing.Optional[typing.List[int]], optional): Column positions to read (eg from _receptor_usecols). Defaults to None (all columns).
+        chunksize (int, optional): Number of rows to read at a time. Defaults to 2000.
+
+    Raises:
+        ValueError: If the precision is not supported or the file type can't be read
+
+    Returns:
+        Timeseries: Header columns (with a fresh index) alongside the receptor values
+    """
+    from .Timeseries import Timeseries
+
+    if precision not in _available_precisions():
+        raise ValueError(f"Precision: {precision} is not supported")
+
+    file_path = _convert_path(filename)
+    header_length = int(header_length)
+    top_header_length = int(top_header_length)
+
+    read_kwargs = {}
+    if usecols is not None:
+        read_kwargs["usecols"] = usecols
+        # Header positions are always the first of usecols (see _receptor_usecols)
+        header_length = len([position for position in usecols if position < header_length])
+    if top_header_length > 0:
+        # Rows between the column names and the data
+        read_kwargs["skiprows"] = range(1, top_header_length + 1)
+
+    header_chunks = []
+    value_chunks = []
+    max_error = 0.0
+
+    with phase("read"):
+        if file_path.suffix == ".xlsx":
+            chunks = [pd.read_excel(file_path, **read_kwargs)]
+        elif file_path.suffix == ".csv":
+            chunks = pd.read_csv(file_path, chunksize=chunksize, **read_kwargs)
+        else:
+            raise ValueError(f"Unable to read data set found at {file_path}")
+
+        receptor_columns = None
+        for chunk in chunks:
+            receptor_columns = chunk.columns[header_length:]
+            header_chunks.append(chunk.iloc[:, :header_length])
+            values = _coerce_receptor_values(chunk.iloc[:, header_length:], fill_value)
+            if precision == "float32":
+                converted = values.astype(np.float32)
+                max_error = max(max_error, _max_relative_error(values, converted))
+                values = converted
+            value_chunks.append(values)
+
+        timeseries = Timeseries(
+            pd.concat(header_chunks, ignore_index=True),
+            np.concatenate(value_chunks) if value_chunks else np.empty((0, 0)),
+            list(receptor_columns) if receptor_columns is not None else [],
+        )
+
+    record_data(*timeseries.values.shape)
+    print(f"Read {len(timeseries.receptors)} receptors by {timeseries.rows} rows as {precision} from {filename}")
+    if precision == "float32":
+        print(f"Maximum relative error from float32 precision: {max_error:.2e}")
+
+    return timeseries
+
+
 def append_to_file_path(file_path: str, suffix: str) -> pathlib.Path:
     """ Append to file name in file path with a suffix (eg 'C:/file.txt', '_Test' will return 'C:/file_Test.txt')
 
@@ -1,6 +1,12 @@
 from gooey import Gooey, GooeyParser
 from src.functions.__version__ import version
 from src.functions.volemarb_generator import _available_template_types
+from src.functions.Time_Index import _available_header_formats
+from src.functions.Profiling import _available_profilers
+from src.functions.File_Utilties import _available_precisions
+from src.functions.no2_processor import _available_no2_methods
+from src.functions.Time_Integrity import _available_gap_fills
+from src.functions.Kernels import _available_kernel_backends
 
 # Handy information on grouping arguments https://github.com/chriskiehl/Gooey/issues/288
 
@@ -34,6 +40,429 @@ def _add_input_output_arguments(
     )
 
 
+def _add_spatial_arguments(parser_or_group):
+    spatial_options = parser_or_group.add_argument_group(
+        "Spatial Subset",
+        "Limit the calculation to receptors within a radius of a point or inside a polygon, only those receptor columns will be read",
+        gooey_options={"show_border": True},
+    )
+
+    spatial_options.add_argument(
+        "--locations_file",
+        help="Receptor locations, either a CALPUFF dat file, the _Locations csv from dat_to_csv, a GRAL Receptor.dat or a table with ID, X & Y columns",
+        metavar="Receptor Locations File",
+        type=str,
+        widget="FileChooser",
+    )
+
+    spatial_options.add_argument(
+        "--centre_x",
+        help="X coordinate of the point to search around (same units as the receptor locations)",
+        metavar="Centre X",
+        type=float,
+    )
+
+    spatial_options.add_argument(
+        "--centre_y",
+        help="Y coordinate of the point to search around (same units as the receptor locations)",
+        metavar="Centre Y",
+        type=float,
+    )
+
+    spatial_options.add_argument(
+        "--radius",
+        help="Search radius around the centre point (same units as the receptor locations, eg km for CALPUFF)",
+        metavar="Radius",
+        type=float,
+    )
+
+    spatial_options.add_argument(
+        "--polygon_file",
+        help="Table of polygon vertices with X & Y columns, receptors inside the polygon will be selected (used instead of the radius if provided)",
+        metavar="Polygon File",
+        type=str,
+        widget="FileChooser",
+    )
+
+
+def _add_receptor_selection_arguments(parser_or_group):
+    receptor_options = parser_or_group.add_argument_group(
+        "Receptor Selection",
+        "Limit the calculation to a subset of receptors, only those receptor columns will be read. If more than one option is provided only receptors matching all of them are kept",
+        gooey_options={"show_border": True},
+    )
+
+    receptor_options.add_argument(
+        "--receptor_ids",
+        help="Receptor IDs (column names) separated by commas, ranges of numeric IDs can be given with a dash (eg 1, 5, 10-20)",
+        metavar="Receptor IDs",
+        type=str,
+    )
+
+    receptor_options.add_argument(
+        "--receptor_regex",
+        help="Regular expression receptor IDs must match (eg ^SR for all IDs starting with SR)",
+        metavar="Receptor ID Pattern",
+        type=str,
+    )
+
+    receptor_options.add_argument(
+        "--receptor_config",
+        help="Configuration file with a column of receptor IDs to include",
+        metavar="Receptor Configuration File",
+        type=str,
+        widget="FileChooser",
+    )
+
+    receptor_options.add_argument(
+        "--receptor_col_name",
+        help="Name of column containing receptor IDs in the receptor configuration file (defaults to the first column)",
+        metavar="Receptor Column Name",
+        type=str,
+    )
+
+    _add_spatial_arguments(parser_or_group)
+
+
+def _add_gap_fill_arguments(parser_or_group, background_help: str):
+    gap_options = parser_or_group.add_argument_group(
+        "Missing Hours",
+        "Check the timestamps in the header columns (eg YYYY, JDY, HHMM) for missing and repeated hours and put the data onto a complete hourly grid so every hour lines up",
+        gooey_options={"show_border": True},
+    )
+
+    gap_options.add_argument(
+        "--gap_fill",
+        help="How to fill missing hours: none uses the rows as they are (every row is taken as the next hour), constant fills with the Fill Invalid Value, "
+        f"nan leaves them blank so they are left out of statistics rather than counted as a value, background {background_help}. Repeated hours keep their first row",
+        metavar="Missing Hour Fill",
+        choices=_available_gap_fills(),
+        default="none",
+    )
+
+
+def _add_no2_arguments(parser_or_group):
+    parser_or_group.add_argument(
+        "--bg_col_name",
+        help="Name of column containing background pollutant data",
+        metavar="Background NO2 Column Name",
+        type=str,
+        default="Background NO2",
+    )
+
+    parser_or_group.add_argument(
+        "--ozone_col_name",
+        help="Name of column containing ozone data",
+        metavar="Ozone Column Name",
+        type=str,
+        default="Ozone",
+    )
+
+    parser_or_group.add_argument(
+        "--calc_without_background",
+        help="If ticked, calculate statistics for data without background summed as well",
+        metavar="Calculate Statistics Without Background",
+        action="store_true",
+        default=False,
+    )
+
+    parser_or_group.add_argument(
+        "--exceedance",
+        help="This should be an integer declaring how many exceedances eg compare if any are greater than 246",
+        metavar="Exceedances",
+        default=246,
+    )
+
+    parser_or_group.add_argument(
+        "--fill_invalid_value",
+        help="Value to fill invalid data points with",
+        metavar="Fill Invalid Value",
+        default="0",
+    )
+
+    parser_or_group.add_argument(
+        "--header_length",
+        help="Columns to exclude should be how many columns till the data starts (defaults to 3 for year, month, day timeseries)",
+        metavar="Columns to Exclude",
+        type=int,
+        default=3,
+    )
+
+    parser_or_group.add_argument(
+        "--top_header_length",
+        help="Rows to exclude should be how many rows till the data starts",
+        metavar="Header Rows to Exclude",
+        type=int,
+        default=1,
+    )
+
+    parser_or_group.add_argument(
+        "--ozone_scale",
+        help="Value to scale ozone data by (defaults to 46/48 or 0.9583333)",
+        metavar="Ozone Scale",
+        type=float,
+        default=0.9583333,
+    )
+
+    parser_or_group.add_argument(
+        "--percentile",
+        help="Percentile to Compute (eg, 99.9th percentile is 0.999",
+        metavar="Percentile",
+        type=float,
+        default=0.999,
+    )
+
+    parser_or_group.add_argument(
+        "--rolling_window",
+        help="Rolling window to compute (eg, 8 for 8 hour windows",
+        metavar="Rolling Window",
+        type=float,
+        default=8,
+    )
+
+    method_options = parser_or_group.add_argument_group(
+        "Method Options",
+        "Parameters for the ARM2, Fixed Ratio and PVMRM conversion methods (OLM uses the initial ratio and ozone scale)",
+        gooey_options={"show_border": True},
+    )
+
+    method_options.add_argument(
+        "--min_ratio",
+        help="Minimum NO2/NOx ratio for ARM2 (defaults to 0.5)",
+        metavar="Minimum Ratio",
+        type=float,
+        default=0.5,
+    )
+
+    method_options.add_argument(
+        "--max_ratio",
+        help="Maximum NO2/NOx ratio for ARM2 and equilibrium ratio for PVMRM (defaults to 0.9)",
+        metavar="Maximum Ratio",
+        type=float,
+        default=0.9,
+    )
+
+    method_options.add_argument(
+        "--fixed_ratio",
+        help="NO2/NOx ratio applied to every hour for the Fixed Ratio method (defaults to 0.8)",
+        metavar="Fixed Ratio",
+        type=float,
+        default=0.8,
+    )
+
+    _add_gap_fill_arguments(
+        parser_or_group,
+        "sets the source to zero so only the background is left (the background is matched to the scenario by its timestamps)",
+    )
+
+    _add_receptor_selection_arguments(parser_or_group)
+
+
+def _add_statistics_arguments(parser_or_group):
+    parser_or_group.add_argument(
+        "header_length",
+        help="Columns to exclude should be how many columns till the data starts (defaults to 3 for year, month, day timeseries)",
+        metavar="Columns to Exclude",
+        type=int,
+        default=3,
+    )
+
+    parser_or_group.add_argument(
+        "top_header_length",
+        help="Rows to exclude should be how many rows till the data starts",
+        metavar="Header Rows to Exclude",
+        type=int,
+        default=1,
+    )
+
+    parser_or_group.add_argument(
+        "start_hour",
+        help="Hour of the first row in the input data",
+        metavar="Start Hour of Data",
+        type=int,
+        default=0,
+    )
+
+    parser_or_group.add_argument(
+        "--fill_invalid_value",
+        help="Value to fill invalid data points with",
+        metavar="Fill Invalid Value",
+        default="0",
+    )
+
+    parser_or_group.add_argument(
+        "--precision",
+        help="Precision to hold receptor values in, float32 halves memory for very large data sets (the maximum relative error is reported)",
+        metavar="Precision",
+        choices=_available_precisions(),
+        default="float64",
+    )
+
+    mean_options = parser_or_group.add_argument_group(
+        "Mean Options",
+        "Customise the averaging options",
+        gooey_options={"show_border": True},
+    )
+
+    mean_options.add_argument(
+        "--enable_sensor_mean",
+        help="If ticked, output will contain averages for all input data series",
+        metavar="Average of Sensor",
+        action="store_true",
+        default=True,
+    )
+
+    mean_options.add_argument(
+        "--rolling_mean_window",
+        help="Provide a window to compute rolling mean (eg, 8), leave blank to disable",
+        metavar="Rolling Mean Window",
+    )
+
+    mean_options.add_argument(
+        "--custom_hrs_mean",
+        help="Provide a non-rolling time period for averaging (eg, 24 for 24-hour averaging), leave blank to disable",
+        metavar="Custom Hrs to Average",
+    )
+
+    mean_options.add_argument(
+        "--header_format",
+        help="Format of the header columns used to find the averaging periods (calpuff for YYYY/JDY/HHMM, gral for date/hour), auto will detect from column names and sequential assumes consecutive hours from the start hour",
+        metavar="Header Format",
+        choices=_available_header_formats(),
+        default="auto",
+    )
+
+    max_options = parser_or_group.add_argument_group(
+        "Max Options",
+        "Customise the Maximum options",
+        gooey_options={"show_border": True},
+    )
+
+    max_options.add_argument(
+        "--enable_sensor_max",
+        help="If ticked, output will contain maxes for all input data series",
+        metavar="Max of Sensor",
+        action="store_true",
+        default=True,
+    )
+
+    percentile_options = parser_or_group.add_argument_group(
+        "Percentile Options",
+        "Customise the Percentile options",
+        gooey_options={"show_border": True},
+    )
+
+    percentile_options.add_argument(
+        "--percentiles",
+        help="Input percentiles to compute separated by commas (eg, 0.25, 0.5, 0.75 will compute 25th, 50th and 75th percentiles), leave blank to disable",
+        metavar="Percentiles to Compute",
+    )
+
+    spec_options = parser_or_group.add_argument_group(
+        "Statistics Spec",
+        "Describe every statistic in one line instead of the options above, all of them are computed in a single pass over the data",
+        gooey_options={"show_border": True},
+    )
+
+    spec_options.add_argument(
+        "--statistics_spec",
+        help="Statistics separated by semicolons, eg max(rolling(8h)); p99.9(1h); mean(block(24h, start=1)); count(>246). "
+        "Aggregates are max, min, mean, median, pNN (percentile) and count(>value), taken over 1h (hourly values), rolling(Nh) (rolling means) or block(Nh, start=K) (means of N hour blocks starting at hour K). "
+        "Leave blank to use the options above",
+        metavar="Statistics Spec",
+        type=str,
+    )
+
+    _add_gap_fill_arguments(
+        parser_or_group, "sets the source to zero (as no background is added here)"
+    )
+
+    _add_receptor_selection_arguments(parser_or_group)
+
+
+def _add_profiling_arguments(parser):
+    profiling_options = parser.add_argument_group(
+        "Run Profiling",
+        "Time the read, transform, compute and export phases of this run and optionally record a full profile",
+        gooey_options={"show_border": True},
+    )
+
+    profiling_options.add_argument(
+        "--profile",
+        help="Record a full profile of the run with cProfile or pyinstrument (pyinstrument must be installed), the slowest calls are printed once the run completes",
+        metavar="Profiler",
+        choices=_available_profilers(),
+    )
+
+    profiling_options.add_argument(
+        "--profile_path",
+        help="Location to save the profile (.prof for cProfile which can be opened with snakeviz, .html for pyinstrument)",
+        metavar="Profile Output",
+        type=str,
+        widget="FileSaver",
+    )
+
+    profiling_options.add_argument(
+        "--run_report",
+        help="Location to save a JSON run report with the phase timings, peak memory, rows/columns processed and throughput",
+        metavar="Run Report",
+        type=str,
+        widget="FileSaver",
+        gooey_options={
+            "message": "Pick Output Location",
+            "wildcard": ".json (*.json)|*.json|All files (*.*)|*.*",
+        },
+    )
+
+
+def _add_kernel_arguments(parser):
+    kernel_options = parser.add_argument_group(
+        "Compiled Kernels",
+        "Run the NO2 conversions, hour of day factors, rolling means and sorts as compiled kernels across every processor (needs Numba installed)",
+        gooey_options={"show_border": True},
+    )
+
+    kernel_options.add_argument(
+        "--kernel_backend",
+        help="auto uses compiled (Numba) kernels when Numba is installed and NumPy otherwise, numpy always uses NumPy, numba fails if Numba isn't installed. Results are the same either way",
+        metavar="Kernel Backend",
+        choices=_available_kernel_backends(),
+        default="auto",
+    )
+
+
+def _add_checkpoint_arguments(parser, item_name="configuration rows"):
+    checkpoint_options = parser.add_argument_group(
+        "Checkpoints",
+        f"Save progress every few {item_name} so a long run that fails part way (eg a missing or malformed file) can be resumed rather than restarted",
+        gooey_options={"show_border": True},
+    )
+
+    checkpoint_options.add_argument(
+        "--checkpoint_interval",
+        help=f"Number of {item_name} completed between checkpoints, the running total is kept on disk (next to the output unless a checkpoint folder is given). Leave as 0 for no checkpoints",
+        metavar="Checkpoint Interval",
+        type=int,
+        default=0,
+    )
+
+    checkpoint_options.add_argument(
+        "--checkpoint_path",
+        help="Folder to keep the checkpoint in, leave blank to keep it next to the output file. It is removed once the run completes",
+        metavar="Checkpoint Folder",
+        type=str,
+        widget="DirChooser",
+    )
+
+    checkpoint_options.add_argument(
+        "--resume",
+        help="Continue from the checkpoint of a failed run with the same configuration, starts from the beginning if there is no matching checkpoint",
+        metavar="Resume",
+        action="store_true",
+        default=False,
+    )
+
+
 @Gooey(
     program_name="Air Quality Toolkit",
     menu=[
@@ -103,7 +532,7 @@ def gui_inputs():
 
     batch_sum = batch_sum_parser.add_argument_group(
         "Batch Sum",
-        "Batch Sum (aka 'Stitcher') combines data tables by summing them element-wise, Note that all tables must be the same dimensions",
+        "Batch Sum (aka 'Stitcher') combines data tables by summing them element-wise, Note that all tables must be the same dimensions and cover the same hours (every table is checked before any are summed, then hour by hour as they are read). Save as .csv to write the sum as it is calculated rather than holding it in memory",
     )
 
     _add_input_output_arguments(
@@ -136,7 +565,77 @@ def gui_inputs():
         help="Name of column containing scales to multiply datasets by",
         metavar="Scale Column Name",
         type=str,
-        default="Scale",
+        default="Scale",
+    )
+
+    batch_sum.add_argument(
+        "--workers",
+        help="Number of processes to read data sets with while they are summed, each process needs memory for one data set (shared rather than copied). Leave as 1 to read one at a time",
+        metavar="Number of Processes",
+        type=int,
+        default=1,
+    )
+
+    incremental_options = batch_sum_parser.add_argument_group(
+        "Incremental Update",
+        "Keep the summed result with a manifest of the data sets (hash, scale and shape) so a rerun only re-reads the data sets that were added, removed, rescaled or changed",
+        gooey_options={"show_border": True},
+    )
+
+    incremental_options.add_argument(
+        "--incremental",
+        help="Update the previous result rather than summing every data set again, a full rebuild is done (and flagged) if a changed data set has different headers or shape",
+        metavar="Incremental",
+        action="store_true",
+        default=False,
+    )
+
+    incremental_options.add_argument(
+        "--state_path",
+        help="Folder to keep the previous result in, it needs space for a copy of every data set. Leave blank to keep it next to the output file",
+        metavar="State Folder",
+        type=str,
+        widget="DirChooser",
+    )
+
+    incremental_options.add_argument(
+        "--rebuild",
+        help="Sum every data set from scratch and replace the previous result",
+        metavar="Full Rebuild",
+        action="store_true",
+        default=False,
+    )
+
+    _add_checkpoint_arguments(batch_sum_parser, "data sets")
+
+    apportionment_options = batch_sum_parser.add_argument_group(
+        "Source Apportionment",
+        "Find which data sets make up the highest hours of the sum at each receptor while it is being summed, rather than rerunning each data set afterwards. Only available when data sets are read one chunk of hours at a time (1 process and no checkpoints)",
+        gooey_options={"show_border": True},
+    )
+
+    apportionment_options.add_argument(
+        "--apportion_hours",
+        help="Number of highest hours of the sum to keep for each receptor with the scaled contribution of every data set and the largest contributor at each. Leave as 0 for no apportionment",
+        metavar="Hours to Apportion",
+        type=int,
+        default=0,
+    )
+
+    apportionment_options.add_argument(
+        "--apportion_path",
+        help="Location to save the apportionment table (.csv, .xlsx or .parquet), leave blank to save it next to the output file ending in _Apportionment",
+        metavar="Apportionment Output",
+        type=str,
+        widget="FileSaver",
+    )
+
+    apportionment_options.add_argument(
+        "--dominant_path",
+        help="Location to save the data set contributing most to every hour at every receptor (.csv, .xlsx or .parquet), this is as large as the sum. Leave blank to skip",
+        metavar="Dominant Source Output",
+        type=str,
+        widget="FileSaver",
     )
 
     #########################################################
@@ -152,87 +651,47 @@ def gui_inputs():
     )
 
     statistics.add_argument(
-        "header_length",
-        help="Columns to exclude should be how many columns till the data starts (defaults to 3 for year, month, day timeseries)",
-        metavar="Columns to Exclude",
-        type=int,
-        default=3,
-    )
-
-    statistics.add_argument(
-        "top_header_length",
-        help="Rows to exclude should be how many rows till the data starts",
-        metavar="Header Rows to Exclude",
+        "--workers",
+        help="Number of processes to compute statistics with, receptors are split between them and the data is shared rather than copied to each. Leave as 1 for small files",
+        metavar="Number of Processes",
         type=int,
         default=1,
     )
 
-    statistics.add_argument(
-        "start_hour",
-        help="Hour of the first row in the input data",
-        metavar="Start Hour of Data",
-        type=int,
-        default=0,
-    )
-
-    statistics.add_argument(
-        "--fill_invalid_value",
-        help="Value to fill invalid data points with",
-        metavar="Fill Invalid Value",
-        default="0",
-    )
-
-    mean_options = statistics.add_argument_group(
-        "Mean Options",
-        "Customise the averaging options",
-        gooey_options={"show_border": True},
-    )
+    _add_statistics_arguments(statistics)
 
-    mean_options.add_argument(
-        "--enable_sensor_mean",
-        help="If ticked, output will contain averages for all input data series",
-        metavar="Average of Sensor",
-        action="store_true",
-        default=True,
-    )
+    #########################################################
 
-    mean_options.add_argument(
-        "--rolling_mean_window",
-        help="Provide a window to compute rolling mean (eg, 8), leave blank to disable",
-        metavar="Rolling Mean Window",
-    )
+    batch_statistics_parser = subs.add_parser("batch_statistics")
 
-    mean_options.add_argument(
-        "--custom_hrs_mean",
-        help="Provide a non-rolling time period for averaging (eg, 24 for 24-hour averaging), leave blank to disable",
-        metavar="Custom Hrs to Average",
+    batch_statistics = batch_statistics_parser.add_argument_group(
+        "Batch Statistics Analyser",
+        "Compute statistics for every timeseries in a configuration file or folder and export a single long format table (File, Receptor, Statistic, Value)",
     )
 
-    max_options = statistics.add_argument_group(
-        "Max Options",
-        "Customise the Maximum options",
-        gooey_options={"show_border": True},
+    _add_input_output_arguments(
+        batch_statistics,
+        input_help="Provide a configuration file with the files to compute statistics upon (as generated by config_gen), or a glob pattern (eg C:/Run/*.csv)",
+        input_metavar="Configuration File or Glob",
+        output_file_type=".parquet",
     )
 
-    max_options.add_argument(
-        "--enable_sensor_max",
-        help="If ticked, output will contain maxes for all input data series",
-        metavar="Max of Sensor",
-        action="store_true",
-        default=True,
+    batch_statistics.add_argument(
+        "--path_col_name",
+        help="Name of column containing source dataset paths in config file",
+        metavar="Path Column Name",
+        type=str,
+        default="Path",
     )
 
-    percentile_options = statistics.add_argument_group(
-        "Percentile Options",
-        "Customise the Percentile options",
-        gooey_options={"show_border": True},
+    batch_statistics.add_argument(
+        "--workers",
+        help="Number of processes to compute statistics with, leave blank to use all available processors",
+        metavar="Number of Processes",
+        type=int,
     )
 
-    percentile_options.add_argument(
-        "--percentiles",
-        help="Input percentiles to compute separated by commas (eg, 0.25, 0.5, 0.75 will compute 25th, 50th and 75th percentiles), leave blank to disable",
-        metavar="Percentiles to Compute",
-    )
+    _add_statistics_arguments(batch_statistics)
 
     #########################################################
 
@@ -290,6 +749,75 @@ def gui_inputs():
         action="store_true",
     )
 
+    contemporaneous.add_argument(
+        "--workers",
+        help="Number of processes to compute receptors with, more than 1 reads the whole data set into shared memory (leave as 1 to stream data sets too large for memory)",
+        metavar="Number of Processes",
+        type=int,
+        default=1,
+    )
+
+    _add_receptor_selection_arguments(contemporaneous)
+
+    #########################################################
+
+    exceedances_parser = subs.add_parser("exceedances",)
+
+    exceedances = exceedances_parser.add_argument_group(
+        "Exceedance Episodes",
+        """Find every episode of consecutive hours above a criterion for each receptor
+        Reports the start, duration, peak, source & background at the peak and whether the background, the source or the combination drove the exceedance
+        """,
+    )
+
+    _add_input_output_arguments(
+        exceedances,
+        "Provide the source data to find exceedances in",
+        output_file_type=".csv",
+    )
+
+    exceedances.add_argument(
+        "criterion",
+        help="Value which must be exceeded (eg 246 for 1 hour NO2)",
+        metavar="Criterion",
+        type=float,
+        default=246,
+    )
+
+    exceedances.add_argument(
+        "--background_path",
+        help="Provide the data for the background pollutant levels, leave blank if the source data already includes background",
+        metavar="Background Data",
+        type=str,
+        widget="FileChooser",
+    )
+
+    exceedances.add_argument(
+        "--background_col_name",
+        help="Name of column containing background pollutant data",
+        metavar="Background Pollutant Name",
+        type=str,
+        default="Background NO2",
+    )
+
+    exceedances.add_argument(
+        "--header_length",
+        help="Columns to exclude should be how many columns till the data starts (defaults to 3 for year, month, day timeseries)",
+        metavar="Columns to Exclude",
+        type=int,
+        default=3,
+    )
+
+    exceedances.add_argument(
+        "--min_duration",
+        help="Minimum number of consecutive hours above the criterion to report as an episode",
+        metavar="Minimum Duration",
+        type=int,
+        default=1,
+    )
+
+    _add_receptor_selection_arguments(exceedances)
+
     #########################################################
 
     factorizer_parser = subs.add_parser(
@@ -343,6 +871,8 @@ def gui_inputs():
         default="Output",
     )
 
+    _add_checkpoint_arguments(factorizer_parser)
+
     #########################################################
 
     dat_to_csv_parser = subs.add_parser("dat_to_csv", help="Dat to CSV converter",)
@@ -438,30 +968,6 @@ def gui_inputs():
         widget="FileChooser",
     )
 
-    no2_processor.add_argument(
-        "--bg_col_name",
-        help="Name of column containing background pollutant data",
-        metavar="Background NO2 Column Name",
-        type=str,
-        default="Background NO2",
-    )
-
-    no2_processor.add_argument(
-        "--ozone_col_name",
-        help="Name of column containing ozone data",
-        metavar="Ozone Column Name",
-        type=str,
-        default="Ozone",
-    )
-
-    no2_processor.add_argument(
-        "--calc_without_background",
-        help="If ticked, calculate statistics for data without background summed as well",
-        metavar="Calculate Statistics Without Background",
-        action="store_true",
-        default=False,
-    )
-
     no2_processor.add_argument(
         "--export_data",
         help="Export data following the calculation (initial * sensor value) + minimum(((1 - initial) * sensor value) or 46/48 * ozone value) + background_no2",
@@ -481,59 +987,76 @@ def gui_inputs():
     )
 
     no2_processor.add_argument(
-        "--exceedance",
-        help="This should be an integer declaring how many exceedances eg compare if any are greater than 246",
-        metavar="Exceedances",
-        default=246,
+        "--method",
+        help="Method to convert NOx to NO2, OLM (ozone limiting), ARM2 (ambient ratio bounded by the minimum and maximum ratio), Fixed Ratio or PVMRM (ozone limited by the peak NOx across receptors each hour)",
+        metavar="NO2 Method",
+        choices=_available_no2_methods(),
+        default="OLM",
     )
 
-    no2_processor.add_argument(
-        "--fill_invalid_value",
-        help="Value to fill invalid data points with",
-        metavar="Fill Invalid Value",
-        default="0",
+    _add_no2_arguments(no2_processor)
+
+    #########################################################
+
+    batch_no2_processor_parser = subs.add_parser(
+        "batch_no2_processor", help="Batch NO2 Processor",
     )
 
-    no2_processor.add_argument(
-        "--header_length",
-        help="Columns to exclude should be how many columns till the data starts (defaults to 3 for year, month, day timeseries)",
-        metavar="Columns to Exclude",
-        type=int,
-        default=3,
+    batch_no2_processor = batch_no2_processor_parser.add_argument_group(
+        "Batch NO2 Processor",
+        """Apply the NO2 processor to many scenarios at several initial ratios against the same background and export a single statistics table
+            1. The background file is read and checked once and shared with each process
+            2. Each scenario is read once and processed at every initial ratio
+            3. Statistics are labelled by scenario, initial ratio and whether background is included""",
     )
 
-    no2_processor.add_argument(
-        "--top_header_length",
-        help="Rows to exclude should be how many rows till the data starts",
-        metavar="Header Rows to Exclude",
-        type=int,
-        default=1,
+    _add_input_output_arguments(
+        batch_no2_processor,
+        input_help="Provide a configuration file with the scenario files to process (as generated by config_gen), or a glob pattern (eg C:/Run/*.csv)",
+        input_metavar="Scenario Configuration File or Pattern",
     )
 
-    no2_processor.add_argument(
-        "--ozone_scale",
-        help="Value to scale ozone data by (defaults to 46/48 or 0.9583333)",
-        metavar="Ozone Scale",
-        type=float,
-        default=0.9583333,
+    batch_no2_processor.add_argument(
+        "background_path",
+        help="Background pollutant timeseries data",
+        metavar="Background Pollutant File",
+        type=str,
+        widget="FileChooser",
     )
 
-    no2_processor.add_argument(
-        "--percentile",
-        help="Percentile to Compute (eg, 99.9th percentile is 0.999",
-        metavar="Percentile",
-        type=float,
-        default=0.999,
+    batch_no2_processor.add_argument(
+        "--initials",
+        help="Initial ratios to process each scenario at separated by commas (eg 0.1, 0.2, 0.3)",
+        metavar="Initial Ratios",
+        type=str,
+        default="0.1",
     )
 
-    no2_processor.add_argument(
-        "--rolling_window",
-        help="Rolling window to compute (eg, 8 for 8 hour windows",
-        metavar="Rolling Window",
-        type=float,
-        default=8,
+    batch_no2_processor.add_argument(
+        "--methods",
+        help=f"Methods to compare separated by commas, available methods are {', '.join(_available_no2_methods())}",
+        metavar="NO2 Methods",
+        type=str,
+        default="OLM",
+    )
+
+    batch_no2_processor.add_argument(
+        "--path_col_name",
+        help="Name of column containing scenario file paths in the configuration file",
+        metavar="Path Column Name",
+        type=str,
+        default="Path",
+    )
+
+    batch_no2_processor.add_argument(
+        "--workers",
+        help="Number of processes to process scenarios with, leave blank to use all available processors",
+        metavar="Number of Processes",
+        type=int,
     )
 
+    _add_no2_arguments(batch_no2_processor)
+
     #########################################################
 
     overlap_parser = subs.add_parser("overlap")
@@ -755,6 +1278,8 @@ def gui_inputs():
                               "- Note that the Pollutant Configuration File must still be included.",
                               widget='FileChooser')
 
+    _add_checkpoint_arguments(gral_timeseries, "source groups")
+
     #########################################################
 
     timeseries_diff = subs.add_parser("timeseries_difference")
@@ -796,6 +1321,125 @@ def gui_inputs():
         type=int
     )
 
+    diff_options.add_argument(
+        "--additional_timeseries",
+        metavar="Additional Timeseries to subtract",
+        help="Further timeseries to subtract in the same pass (eg A - B - C)",
+        nargs="*",
+        widget="MultiFileChooser",
+    )
+
+    diff_options.add_argument(
+        "--weights",
+        metavar="Weights",
+        help="Weight of each timeseries separated by commas in order (Input, Timeseries to subtract then any additional timeseries) for a weighted combination instead, eg 1, -0.5, -0.5. Leave blank to subtract",
+        type=str,
+    )
+
+    diff_options.add_argument(
+        "--chunksize",
+        metavar="Hours per Chunk",
+        help="Number of hours read from every timeseries at a time, the hours of each chunk are checked to line up before the difference is written",
+        type=int,
+        default=2000,
+    )
+
+    #########################################################
+
+    time_concatenation_parser = subs.add_parser("time_concatenation")
+
+    time_concatenation = time_concatenation_parser.add_argument_group(
+        "Time Concatenation",
+        "Join timeseries split along the time axis (eg monthly parts of an annual CALPUFF or GRAL run) back into a single continuous timeseries. "
+        "The parts can be listed in any order, they are ordered by the timestamps in their header columns and every part is checked for gaps and overlapping hours before anything is written. "
+        "The joined timeseries is written as it is read so it can be used straight away with the statistics (eg 24 hour averages spanning the end of a month)",
+    )
+
+    _add_input_output_arguments(
+        time_concatenation,
+        input_help="Provide a configuration file with the timeseries to join (as generated by config_gen), or a glob pattern (eg C:/Run/Month_*.csv)",
+        input_metavar="Configuration File or Glob",
+        output_file_type=".csv",
+    )
+
+    time_concatenation.add_argument(
+        "--path_col_name",
+        help="Name of column containing timeseries paths in config file",
+        metavar="Path Column Name",
+        type=str,
+        default="Path",
+    )
+
+    time_concatenation.add_argument(
+        "--input_format",
+        help="table for csv/xlsx timeseries with a row of column names (eg CALPUFF YYYY, JDY, HHMM), gral for GRAL ReceptorTimeSeries files with header rows (written back with the header rows of the earliest part)",
+        metavar="Input Format",
+        choices=["table", "gral"],
+        default="table",
+    )
+
+    time_concatenation.add_argument(
+        "--header_length",
+        help="Number of header (date/hour) columns before the receptors start (eg 3 for YYYY, JDY, HHMM or 2 for GRAL date and hour)",
+        metavar="Header Length",
+        type=int,
+        default=3,
+    )
+
+    time_concatenation.add_argument(
+        "--header_format",
+        help="Format of the header columns the timestamps are read from (calpuff for YYYY/JDY/HHMM, gral for date/hour), auto will detect from column names",
+        metavar="Header Format",
+        choices=[header_format for header_format in _available_header_formats() if header_format != "sequential"],
+        default="auto",
+    )
+
+    time_concatenation.add_argument(
+        "--GRAL_timeseries_header_rows",
+        metavar="GRAL timeseries header rows",
+        help="Number of header rows in GRAL timeseries files (gral input only)",
+        type=int,
+        default=7,
+    )
+
+    time_concatenation.add_argument(
+        "--num_receptors",
+        metavar="Number of receptors in GRAL timeseries",
+        help="Number of receptor columns to read from GRAL timeseries so redundant columns full of zeros are ignored (gral input only), leave blank to read every column",
+        type=int,
+    )
+
+    time_concatenation.add_argument(
+        "--chunksize",
+        metavar="Hours per Chunk",
+        help="Number of hours read at a time while the timeseries are joined",
+        type=int,
+        default=2000,
+    )
+
+    #########################################################
+
+    for command_parser in [
+        config_gen_parser,
+        batch_sum_parser,
+        statistic_parser,
+        batch_statistics_parser,
+        contemporaneous_parser,
+        exceedances_parser,
+        factorizer_parser,
+        dat_to_csv_parser,
+        batch_dat_to_csv_parser,
+        no2_processor_parser,
+        batch_no2_processor_parser,
+        overlap_parser,
+        volemarb_parser,
+        gral_timeseries,
+        timeseries_diff,
+        time_concatenation_parser,
+    ]:
+        _add_profiling_arguments(command_parser)
+        _add_kernel_arguments(command_parser)
+
     #########################################################
 
     args = parser.parse_args()
@@ -0,0 +1,332 @@
+""" Incremental batch sum, keeps the summed result with a manifest of the inputs (hash, scale, shape) so a rerun only re-reads the inputs that changed.
+    The total is updated as total - old scale × old data + new scale × new data, a raw copy of each input is kept alongside so the old data can be taken away once the file has been overwritten
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import _convert_path, error_printing, gooey_tqdm
+from .Linear_Combination import (
+    TimeseriesInput,
+    _TimeseriesWriter,
+    _output_format,
+    check_alignment,
+    read_input,
+)
+from .Preflight import validate_inputs
+
+MANIFEST_VERSION = 1
+
+
+def _file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """ SHA-256 of a file's contents, read in blocks
+
+    Args:
+        file_path (str): Path to file
+        block_size (int, optional): Number of bytes to read at a time. Defaults to 1 MB.
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as hash_file:
+        for block in iter(lambda: hash_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _default_state_path(output_path: str) -> str:
+    """ State folder kept next to the output (eg C:/Run/total.xlsx keeps its state in C:/Run/total_batch_sum_state)
+    """
+    output_path = _convert_path(output_path)
+    return str(output_path.with_name(output_path.stem + "_batch_sum_state"))
+
+
+class _SumState:
+    """ Summed result of a previous run with its manifest, stored in a folder (manifest.json, total.npy, header.pkl and a raw copy of each input in inputs/)
+
+    Args:
+        state_path (str): Folder to keep the state in
+    """
+
+    def __init__(self, state_path: str):
+        self.state_path = _convert_path(state_path)
+        self.manifest = None
+        self.total = None
+        self.header = None
+
+    @property
+    def _manifest_path(self):
+        return self.state_path / "manifest.json"
+
+    def _snapshot_path(self, file_hash: str):
+        return self.state_path / "inputs" / f"{file_hash}.npy"
+
+    def load(self) -> bool:
+        """ Load the previous result
+
+        Returns:
+            bool: Whether a previous result was found
+        """
+        if not self._manifest_path.is_file():
+            return False
+        with open(self._manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return False
+        self.manifest = manifest
+        self.total = np.load(self.state_path / "total.npy")
+        self.header = pd.read_pickle(self.state_path / "header.pkl")
+        return True
+
+    def snapshot(self, file_hash: str) -> np.ndarray:
+        """ Raw (unscaled) data of an input as last summed
+        """
+        return np.load(self._snapshot_path(file_hash), mmap_mode="r")
+
+    def save_snapshot(self, file_hash: str, values: np.ndarray):
+        path = self._snapshot_path(file_hash)
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(path, values)
+
+    def save(
+        self,
+        total: np.ndarray,
+        header: pd.DataFrame,
+        manifest: typing.Dict[str, typing.Any],
+    ):
+        """ Save the result, the manifest is written last so an interrupted save leaves the previous manifest pointing at whole files.
+            Copies of inputs no longer in the manifest are removed afterwards
+        """
+        self.state_path.mkdir(parents=True, exist_ok=True)
+        for name, writer in [
+            ("total.npy", lambda state_file: np.save(state_file, total)),
+            ("header.pkl", lambda state_file: header.to_pickle(state_file)),
+            (
+                "manifest.json",
+                lambda state_file: state_file.write(
+                    json.dumps(manifest, indent=4).encode()
+                ),
+            ),
+        ]:
+            # Written alongside then swapped in so a file is never half written
+            temporary_path = self.state_path / f"{name}.tmp"
+            with open(temporary_path, "wb") as state_file:
+                writer(state_file)
+            os.replace(temporary_path, self.state_path / name)
+
+        in_use = {entry["sha256"] for entry in manifest["inputs"]}
+        snapshot_folder = self.state_path / "inputs"
+        if snapshot_folder.is_dir():
+            for snapshot in snapshot_folder.glob("*.npy"):
+                if snapshot.stem not in in_use:
+                    snapshot.unlink()
+
+        self.manifest, self.total, self.header = manifest, total, header
+
+
+def _input_record(
+    entry: TimeseriesInput,
+    previous: typing.Optional[typing.Dict[str, typing.Any]] = None,
+) -> typing.Dict[str, typing.Any]:
+    """ Manifest record of an input, the hash of the previous record is reused if the file's size and modified time haven't changed
+
+    Args:
+        entry (TimeseriesInput): Input to record
+        previous (typing.Optional[typing.Dict[str, typing.Any]], optional): Record from the previous run. Defaults to None.
+
+    Returns:
+        typing.Dict[str, typing.Any]: Path, scale, header columns, size, modified time and hash
+    """
+    stat = os.stat(entry.path)
+    record = {
+        "path": str(entry.path),
+        "scale": float(entry.weight),
+        "columns_to_exclude": int(entry.header_length),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+    if (
+        previous is not None
+        and previous["size"] == record["size"]
+        and previous["mtime"] == record["mtime"]
+    ):
+        record["sha256"] = previous["sha256"]
+    else:
+        record["sha256"] = _file_hash(entry.path)
+    return record
+
+
+def _full_sum(
+    inputs: typing.List[TimeseriesInput], state: _SumState, chunksize: int
+) -> typing.Tuple[pd.DataFrame, np.ndarray, typing.List[str], typing.List[typing.Dict[str, typing.Any]]]:
+    """ Sum every input, keeping a raw copy of each for later updates
+
+    Returns:
+        typing.Tuple[pd.DataFrame, np.ndarray, typing.List[str], typing.List[typing.Dict[str, typing.Any]]]: Header, total, receptor names and manifest records
+    """
+    total = None
+    records = []
+    for entry in gooey_tqdm(inputs, total=len(inputs)):
+        record = _input_record(entry)
+        header, values, names = read_input(entry._replace(weight=1.0), chunksize)
+        if total is None:
+            first = (header, values, names)
+            total = values * float(entry.weight)
+        else:
+            check_alignment(first, (header, values, names), entry.path, 0)
+            total += values * float(entry.weight)
+        state.save_snapshot(record["sha256"], values)
+        records.append(record)
+    return first[0], total, first[2], records
+
+
+def _delta_sum(
+    inputs: typing.List[TimeseriesInput], state: _SumState, chunksize: int
+) -> typing.Tuple[typing.Optional[np.ndarray], typing.List[typing.Dict[str, typing.Any]], str]:
+    """ Update the previous total for the inputs that were added, removed, rescaled or changed
+
+    Returns:
+        typing.Tuple[typing.Optional[np.ndarray], typing.List[typing.Dict[str, typing.Any]], str]: Updated total (None if a full rebuild is needed), manifest records and a summary (or the reason a rebuild is needed)
+    """
+    manifest = state.manifest
+    previous = {record["path"]: record for record in manifest["inputs"]}
+    reference = (state.header, state.total, manifest["columns"])
+
+    if inputs[0].path != manifest["inputs"][0]["path"]:
+        return None, [], "the first data set (which the header is taken from) has changed"
+
+    total = np.array(state.total)
+    records = []
+    changes = {"unchanged": 0, "rescaled": 0, "changed": 0, "added": 0, "removed": 0}
+
+    for entry in inputs:
+        old = previous.pop(str(entry.path), None)
+        record = _input_record(entry, old)
+        records.append(record)
+        scale = float(entry.weight)
+
+        if (
+            old is not None
+            and old["sha256"] == record["sha256"]
+            and old["columns_to_exclude"] == record["columns_to_exclude"]
+        ):
+            if old["scale"] != scale:
+                # Same data at a new scale
+                total += state.snapshot(old["sha256"]) * (scale - old["scale"])
+                changes["rescaled"] += 1
+            else:
+                changes["unchanged"] += 1
+            continue
+
+        print(f"Reading {'changed' if old is not None else 'added'} data set {entry.path}")
+        header, values, names = read_input(entry._replace(weight=1.0), chunksize)
+        try:
+            check_alignment(reference, (header, values, names), entry.path, 0)
+        except ValueError as error:
+            return None, [], f"the headers or shape of {entry.path} differ from the previous total ({error})"
+
+        if old is not None:
+            total -= state.snapshot(old["sha256"]) * old["scale"]
+            changes["changed"] += 1
+        else:
+            changes["added"] += 1
+        total += values * scale
+        state.save_snapshot(record["sha256"], values)
+
+    for old in previous.values():
+        print(f"Removing data set {old['path']} from the total")
+        total -= state.snapshot(old["sha256"]) * old["scale"]
+        changes["removed"] += 1
+
+    summary = ", ".join(f"{count} {change}" for change, count in changes.items() if count)
+    return total, records, summary
+
+
+def incremental_batch_sum(
+    config_df: pd.DataFrame,
+    output_path: str,
+    path_col_name: str = "Path",
+    scale_col_name: str = "Scale",
+    columns_to_exclude_col_name: str = "Columns to Exclude",
+    state_path: typing.Optional[str] = None,
+    rebuild: bool = False,
+    chunksize: int = 2000,
+) -> typing.Dict[str, typing.Any]:
+    """ Batch sum which keeps its result and a manifest of the inputs, a rerun only re-reads the inputs that were added, removed, rescaled or changed (by hash) and updates the total.
+        A full rebuild is done (and recorded in the manifest) if there is no previous result, if requested, or if a changed input's headers or shape differ from the previous total
+
+    Args:
+        config_df (pd.DataFrame): Configuration with the data set paths, scales and number of header columns
+        output_path (str): Location to write the sum to (csv, xlsx or parquet)
+        path_col_name (str, optional): Name of column containing data set paths. Defaults to "Path".
+        scale_col_name (str, optional): Name of column containing scales. Defaults to "Scale".
+        columns_to_exclude_col_name (str, optional): Name of column containing the number of header columns. Defaults to "Columns to Exclude".
+        state_path (typing.Optional[str], optional): Folder to keep the previous result in, needs space for a copy of every input. Defaults to None (next to the output).
+        rebuild (bool, optional): Sum every input from scratch. Defaults to False.
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+
+    Raises:
+        ValueError: If the configuration lists the same data set more than once or the pre-flight check finds problems
+
+    Returns:
+        typing.Dict[str, typing.Any]: Manifest of the result
+    """
+    inputs = [
+        TimeseriesInput(
+            row[path_col_name],
+            float(row[scale_col_name]),
+            "table",
+            int(row[columns_to_exclude_col_name]),
+        )
+        for _, row in config_df.iterrows()
+    ]
+    paths = [str(entry.path) for entry in inputs]
+    if len(set(paths)) != len(paths):
+        raise ValueError("Each data set can only be listed once in an incremental batch sum")
+    validate_inputs(inputs)
+
+    state = _SumState(state_path or _default_state_path(output_path))
+
+    total, reason = None, None
+    if rebuild:
+        reason = "a full rebuild was requested"
+    elif not state.load():
+        reason = f"no previous result was found in {state.state_path}"
+    else:
+        total, records, summary = _delta_sum(inputs, state, chunksize)
+        if total is None:
+            reason = summary
+            error_printing(f"Full rebuild needed: {reason}")
+        else:
+            print(f"Updated previous total: {summary}")
+            header, names = state.header, state.manifest["columns"]
+
+    if total is None:
+        print(f"Summing all {len(inputs)} data sets ({reason})")
+        header, total, names, records = _full_sum(inputs, state, chunksize)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "update": "delta" if reason is None else "rebuild",
+        "rebuild_reason": reason,
+        "rows": int(total.shape[0]),
+        "columns": [str(name) for name in names],
+        "header_columns": [str(column) for column in header.columns],
+        "inputs": records,
+    }
+    state.save(total, header, manifest)
+
+    writer = _TimeseriesWriter(output_path, _output_format(output_path, None, inputs))
+    writer.write(header, total, names)
+    writer.close()
+
+    return manifest
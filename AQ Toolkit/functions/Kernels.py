@@ -0,0 +1,307 @@
+""" Kernels for the hottest loops (NO2 conversion, background and hour of day factors, rolling means and per receptor sorts). Every kernel has a NumPy version and,
+    when Numba is installed, a compiled version run in parallel across hours or receptors. Both take and return the same arrays, so callers don't change with the backend
+"""
+
+import contextlib
+import os
+import sys
+import typing
+
+import numpy as np
+
+# Backend is kept in the environment so worker processes use the same one
+KERNEL_BACKEND_VARIABLE = "AQ_TOOLKIT_KERNELS"
+
+
+def _available_kernel_backends() -> typing.List[str]:
+    return ["auto", "numpy", "numba"]
+
+
+def numba_available() -> bool:
+    """ Whether Numba is installed (it is optional, the NumPy kernels are used without it)
+    """
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def set_backend(backend: str):
+    """ Select the kernels to use for this run and any worker processes it starts
+
+    Args:
+        backend (str): auto (Numba when installed), numpy or numba (see _available_kernel_backends)
+
+    Raises:
+        ValueError: If the backend is not supported or Numba is asked for but not installed
+    """
+    if backend not in _available_kernel_backends():
+        raise ValueError(f"Kernel backend: {backend} is not supported")
+    if backend == "numba" and not numba_available():
+        raise ValueError("Numba kernels were asked for but Numba is not installed (pip install numba)")
+    os.environ[KERNEL_BACKEND_VARIABLE] = backend
+
+
+def backend() -> str:
+    """ Kernels in use, numba or numpy
+    """
+    selected = os.environ.get(KERNEL_BACKEND_VARIABLE, "auto")
+    if selected == "numba" or (selected == "auto" and numba_available()):
+        return "numba"
+    return "numpy"
+
+
+@contextlib.contextmanager
+def use_backend(selected: str):
+    """ Use a backend within a block (eg to compare backends), the previous selection is restored afterwards
+    """
+    previous = os.environ.get(KERNEL_BACKEND_VARIABLE)
+    set_backend(selected)
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop(KERNEL_BACKEND_VARIABLE, None)
+        else:
+            os.environ[KERNEL_BACKEND_VARIABLE] = previous
+
+
+############################################################
+# NumPy kernels, results are written into an output with the memory layout of the input (so later sums add in the same order)
+
+
+def _olm_numpy(values, background_no2, scaled_ozone, initial, remaining, out):
+    np.add(
+        values * initial + np.minimum(remaining * values, scaled_ozone[:, np.newaxis]),
+        background_no2[:, np.newaxis],
+        out=out,
+    )
+
+
+def _scale_rows_numpy(values, factors, out):
+    np.multiply(values, factors[:, np.newaxis], out=out)
+
+
+def _add_rows_numpy(values, offsets, out):
+    np.add(values, offsets[:, np.newaxis], out=out)
+
+
+def _rolling_means_numpy(prefix, missing, hours, out):
+    np.divide(prefix[hours:] - prefix[:-hours], hours, out=out)
+    if missing is not None:
+        out[(missing[hours:] - missing[:-hours]) > 0] = np.nan
+
+
+def _sort_columns_numpy(values, out):
+    out[:] = np.sort(values, axis=0)
+
+
+def _top_positions_numpy(key, rows, out):
+    out[:] = np.argsort(key, axis=0, kind="stable")[:rows]
+
+
+_NUMPY_KERNELS = {
+    "olm": _olm_numpy,
+    "scale_rows": _scale_rows_numpy,
+    "add_rows": _add_rows_numpy,
+    "rolling_means": _rolling_means_numpy,
+    "sort_columns": _sort_columns_numpy,
+    "top_positions": _top_positions_numpy,
+}
+
+
+############################################################
+# Numba kernels, compiled on first use
+
+_numba_kernels = None
+
+
+def _compile_numba() -> typing.Dict[str, typing.Callable]:
+    """ Numba versions of the kernels, parallel across hours (elementwise kernels) or receptors (column kernels)
+    """
+    global _numba_kernels
+    if _numba_kernels is not None:
+        return _numba_kernels
+
+    import numba
+    from numba import njit, prange
+
+    # Process pools fork after kernels have run, the TBB layer hangs on exit and OpenMP isn't fork safe. Kernels are only called from one thread of each process
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER = "workqueue"
+
+    # Compiled kernels can't be cached to disk from a frozen executable (no source files)
+    jit = njit(parallel=True, cache=not getattr(sys, "frozen", False))
+
+    @jit
+    def olm(values, background_no2, scaled_ozone, initial, remaining, out):
+        for row in prange(values.shape[0]):
+            ozone = scaled_ozone[row]
+            background = background_no2[row]
+            for column in range(values.shape[1]):
+                value = values[row, column]
+                converted = remaining * value
+                # Same as np.minimum, a missing ozone value gives a missing result
+                limited = converted if converted < ozone else ozone
+                out[row, column] = value * initial + limited + background
+
+    @jit
+    def scale_rows(values, factors, out):
+        for row in prange(values.shape[0]):
+            factor = factors[row]
+            for column in range(values.shape[1]):
+                out[row, column] = values[row, column] * factor
+
+    @jit
+    def add_rows(values, offsets, out):
+        for row in prange(values.shape[0]):
+            offset = offsets[row]
+            for column in range(values.shape[1]):
+                out[row, column] = values[row, column] + offset
+
+    @jit
+    def rolling_means(prefix, missing, has_missing, hours, out):
+        for column in prange(out.shape[1]):
+            for row in range(out.shape[0]):
+                if has_missing and missing[row + hours, column] - missing[row, column] > 0:
+                    out[row, column] = np.nan
+                else:
+                    out[row, column] = (prefix[row + hours, column] - prefix[row, column]) / hours
+
+    @jit
+    def sort_columns(values, out):
+        for column in prange(values.shape[1]):
+            out[:, column] = np.sort(values[:, column])
+
+    @jit
+    def top_positions(key, rows, out):
+        for column in prange(key.shape[1]):
+            # Merge sort is stable so ties keep the earliest row
+            out[:, column] = np.argsort(key[:, column], kind="mergesort")[:rows]
+
+    def rolling_means_kernel(prefix, missing, hours, out):
+        has_missing = missing is not None
+        if not has_missing:
+            missing = np.zeros((1, 1), dtype=np.int64)
+        rolling_means(prefix, missing, has_missing, hours, out)
+
+    _numba_kernels = {
+        "olm": olm,
+        "scale_rows": scale_rows,
+        "add_rows": add_rows,
+        "rolling_means": rolling_means_kernel,
+        "sort_columns": sort_columns,
+        "top_positions": top_positions,
+    }
+    return _numba_kernels
+
+
+def _kernel(name: str) -> typing.Callable:
+    if backend() == "numba":
+        return _compile_numba()[name]
+    return _NUMPY_KERNELS[name]
+
+
+############################################################
+# Kernels
+
+
+def olm_kernel(
+    values: np.ndarray, background_no2: np.ndarray, scaled_ozone: np.ndarray, initial: float
+) -> np.ndarray:
+    """ Ozone Limiting Method in a single pass, (initial * value) + minimum((1 - initial) * value, scaled ozone) + background NO2
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors (NOx)
+        background_no2 (np.ndarray): Background NO2 for each hour
+        scaled_ozone (np.ndarray): Background ozone for each hour already multiplied by the ozone scale
+        initial (float): Initial NO2/NOx ratio
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors (NO2 including background)
+    """
+    out = np.empty_like(values, dtype=np.result_type(values, background_no2, scaled_ozone))
+    # Ratios are in the precision of the values (NumPy multiplies float32 values by a Python float in float32)
+    ratio_type = values.dtype.type if np.issubdtype(values.dtype, np.floating) else np.float64
+    _kernel("olm")(values, background_no2, scaled_ozone, ratio_type(initial), ratio_type(1 - initial), out)
+    return out
+
+
+def scale_rows(values: np.ndarray, factors: np.ndarray) -> np.ndarray:
+    """ Multiply every receptor of each hour by a factor for that hour (eg hour of day factors)
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors
+        factors (np.ndarray): Factor for each hour
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors
+    """
+    out = np.empty_like(values, dtype=np.result_type(values, factors))
+    _kernel("scale_rows")(values, factors, out)
+    return out
+
+
+def add_rows(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """ Add a value for each hour to every receptor of that hour (eg background)
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors
+        offsets (np.ndarray): Value for each hour
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors
+    """
+    out = np.empty_like(values, dtype=np.result_type(values, offsets))
+    _kernel("add_rows")(values, offsets, out)
+    return out
+
+
+def rolling_means(
+    prefix: np.ndarray, missing: typing.Optional[np.ndarray], hours: int
+) -> np.ndarray:
+    """ Rolling means from running sums, windows with a missing value are NaN (as with pandas rolling with the default minimum periods)
+
+    Args:
+        prefix (np.ndarray): Running sum of each receptor with a leading row of zeros (hours + 1 by receptors)
+        missing (typing.Optional[np.ndarray]): Running count of missing values in the same layout, None if nothing is missing
+        hours (int): Length of the window
+
+    Returns:
+        np.ndarray: Mean of each full window (hours - window + 1 by receptors)
+    """
+    hours = int(hours)
+    out = np.empty((max(prefix.shape[0] - 1 - hours + 1, 0), prefix.shape[1]))
+    if out.shape[0] > 0:
+        _kernel("rolling_means")(prefix, missing, hours, out)
+    return out
+
+
+def sort_columns(values: np.ndarray) -> np.ndarray:
+    """ Sort each receptor's hours, missing values are placed last
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors
+
+    Returns:
+        np.ndarray: Sorted 2D array of hours by receptors
+    """
+    out = np.empty_like(values)
+    _kernel("sort_columns")(values, out)
+    return out
+
+
+def top_positions(key: np.ndarray, rows: int) -> np.ndarray:
+    """ Rows of the smallest values of each receptor in order, ties keep the earliest row and missing values are placed last
+
+    Args:
+        key (np.ndarray): 2D array of hours by receptors to rank (negate to rank the largest first)
+        rows (int): Number of rows to keep
+
+    Returns:
+        np.ndarray: Positions of the kept rows for each receptor (rows by receptors)
+    """
+    out = np.empty((min(int(rows), key.shape[0]), key.shape[1]), dtype=np.int64)
+    _kernel("top_positions")(key, out.shape[0], out)
+    return out
@@ -0,0 +1,728 @@
+""" Linear combinations of timeseries (Σ weight × timeseries), the engine behind batch_sum, timeseries_difference and the GRAL factoriser.
+    Every input is streamed once a chunk of hours at a time, checked to line up with the first input and accumulated in float64 before being written in any supported format
+"""
+
+import contextlib
+import csv
+import itertools
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .Apportionment import Apportionment, dominant_sources, source_names
+from .Checkpoint import Checkpoint, run_key
+from .File_Utilties import (
+    _coerce_receptor_values,
+    _convert_path,
+    _export_excel,
+    _export_parquet,
+    _read_dataset_chunks,
+    append_to_file_path,
+    gooey_tqdm,
+)
+from .Kernels import scale_rows
+from .Profiling import phase, record_data
+from .Shared_Arrays import SharedTimeseries
+from .Sparse_Blocks import SparseChunk, add_into, compress_zero_columns, to_dense
+from .Time_Index import _parse_hours
+from .Timeseries import Timeseries
+
+
+def _available_input_formats() -> typing.List[str]:
+    return ["table", "gral"]
+
+
+def _available_output_formats() -> typing.List[str]:
+    return ["csv", "xlsx", "parquet", "gral"]
+
+
+class TimeseriesInput(typing.NamedTuple):
+    """ A timeseries to include in a linear combination
+
+    Args:
+        path (str): Path to the timeseries
+        weight (float, optional): Amount to multiply the timeseries by. Defaults to 1.0.
+        format (str, optional): table (csv or xlsx with a row of column names, as read by _read_large_dataset) or gral (GRAL ReceptorTimeSeries txt/csv with header rows). Defaults to "table".
+        header_length (int, optional): Number of header (date/hour) columns before the receptors. Defaults to 3.
+        header_rows (int, optional): Number of header rows including the column names (gral only). Defaults to 7.
+        receptors (typing.Optional[int], optional): Number of receptor columns to read, redundant columns for other source groups are ignored (gral only). Defaults to None (all columns).
+        hour_factors (typing.Optional[typing.Dict[int, float]], optional): Factor for each hour of day (from the last header column, eg GRAL Time) to multiply by as well as the weight. Defaults to None.
+        intermediate_path (typing.Optional[str], optional): Location to also write this timeseries after weighting. Defaults to None.
+    """
+
+    path: str
+    weight: float = 1.0
+    format: str = "table"
+    header_length: int = 3
+    header_rows: int = 7
+    receptors: typing.Optional[int] = None
+    hour_factors: typing.Optional[typing.Dict[int, float]] = None
+    intermediate_path: typing.Optional[str] = None
+
+
+def _gral_read_options(file_path: str) -> typing.Dict[str, typing.Any]:
+    """ Delimiter and encoding of a GRAL timeseries, txt files are tab delimited UTF-16 and anything else is read as csv
+
+    Args:
+        file_path (str): Path to timeseries
+
+    Returns:
+        typing.Dict[str, typing.Any]: Keyword arguments for reading the file
+    """
+    if str(file_path).split(".")[-1] == "txt":
+        return {"sep": "\t", "encoding": "utf_16"}
+    return {"sep": ",", "encoding": None}
+
+
+def _gral_width(entry: TimeseriesInput) -> typing.Optional[int]:
+    """ Number of data columns to read from a GRAL timeseries, None for all
+    """
+    if entry.receptors is None:
+        return None
+    return int(entry.header_length) + int(entry.receptors)
+
+
+def _read_gral_header_rows(entry: TimeseriesInput) -> typing.List[typing.List[str]]:
+    """ Header rows of a GRAL timeseries as text (receptor names, coordinates, source group etc then the column names)
+
+    Args:
+        entry (TimeseriesInput): GRAL timeseries
+
+    Returns:
+        typing.List[typing.List[str]]: Fields of each header row
+    """
+    options = _gral_read_options(entry.path)
+    with open(entry.path, "r", encoding=options["encoding"], newline="") as gral_file:
+        reader = csv.reader(gral_file, delimiter=options["sep"])
+        return list(itertools.islice(reader, int(entry.header_rows)))
+
+
+def _gral_output_header(entry: TimeseriesInput) -> typing.List[typing.List[str]]:
+    """ Header rows to write a GRAL timeseries with. Rows before the column names that are a field short of them (as written by GRAL) are moved across a column to line up with the receptors,
+        rows already lined up (eg written by the toolkit with a leading blank column) are kept as they are
+
+    Args:
+        entry (TimeseriesInput): GRAL timeseries to take the header from
+
+    Returns:
+        typing.List[typing.List[str]]: Fields of each header row
+    """
+    header_rows = _read_gral_header_rows(entry)
+    column_names = header_rows[-1]
+    width = _gral_width(entry) or len(column_names)
+    output_rows = []
+    for row in header_rows[:-1]:
+        if len(row) == len(column_names) - 1:
+            row = [""] + row
+        output_rows.append(row[:width])
+    return output_rows + [column_names[:width]]
+
+
+def _read_gral_chunks(
+    entry: TimeseriesInput, chunksize: int
+) -> typing.Iterator[Timeseries]:
+    """ Read the data rows of a GRAL timeseries a chunk of hours at a time, date/hour columns are kept as text so they can be compared and written back unchanged
+
+    Args:
+        entry (TimeseriesInput): GRAL timeseries
+        chunksize (int): Number of hours to read at a time
+
+    Yields:
+        typing.Iterator[Timeseries]: Header columns, receptor values and receptor names of each chunk
+    """
+    header_length = int(entry.header_length)
+    width = _gral_width(entry)
+    column_names = _read_gral_header_rows(entry)[-1][:width]
+
+    options = _gral_read_options(entry.path)
+    reader = pd.read_csv(
+        entry.path,
+        sep=options["sep"],
+        encoding=options["encoding"],
+        header=None,
+        skiprows=int(entry.header_rows),
+        usecols=None if width is None else range(0, width),
+        dtype={column: str for column in range(header_length)},
+        float_precision="round_trip",
+        chunksize=chunksize,
+    )
+    while True:
+        with phase("read"):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        record_data(*chunk.shape)
+        header = chunk.iloc[:, :header_length]
+        header.columns = column_names[:header_length]
+        yield Timeseries(
+            header, _coerce_receptor_values(chunk.iloc[:, header_length:]), column_names[header_length:]
+        )
+
+
+def _read_table_chunks(
+    entry: TimeseriesInput, chunksize: int
+) -> typing.Iterator[Timeseries]:
+    """ Read a csv or xlsx timeseries a chunk of hours at a time (xlsx is read whole), columns with no name (eg trailing commas) are dropped
+
+    Args:
+        entry (TimeseriesInput): Table timeseries
+        chunksize (int): Number of hours to read at a time
+
+    Yields:
+        typing.Iterator[Timeseries]: Header columns, receptor values and receptor names of each chunk
+    """
+    header_length = int(entry.header_length)
+    for chunk in _read_dataset_chunks(entry.path, chunksize):
+        chunk = chunk.loc[:, ~chunk.columns.astype(str).str.contains("^Unnamed")]
+        yield Timeseries.from_frame(chunk, header_length)
+
+
+def _read_input_chunks(
+    entry: TimeseriesInput, chunksize: int, sparse: bool = False
+) -> typing.Iterator[Timeseries]:
+    """ Read an input a chunk of hours at a time with its weight (and hour of day factors) applied
+
+    Args:
+        entry (TimeseriesInput): Timeseries to read
+        chunksize (int): Number of hours to read at a time
+        sparse (bool, optional): Drop the all-zero receptor columns of each chunk when most are zero (see Sparse_Blocks), weights and factors are then only applied to the rest. Defaults to False.
+
+    Raises:
+        ValueError: If the input format is not supported
+
+    Yields:
+        typing.Iterator[Timeseries]: Header columns, weighted receptor values (np.ndarray or SparseChunk) and receptor names of each chunk
+    """
+    if entry.format == "gral":
+        chunks = _read_gral_chunks(entry, chunksize)
+    elif entry.format == "table":
+        chunks = _read_table_chunks(entry, chunksize)
+    else:
+        raise ValueError(f"Timeseries format: {entry.format} is not supported")
+
+    weight = float(entry.weight)
+    for header, values, names in chunks:
+        if sparse:
+            values = compress_zero_columns(values)
+        if entry.hour_factors:
+            factors = (
+                pd.Series(_parse_hours(header.iloc[:, -1]))
+                .map(entry.hour_factors)
+                .to_numpy(dtype=np.float64)
+            )
+            if isinstance(values, SparseChunk):
+                values = SparseChunk(values.runs, scale_rows(values.values, factors), values.width)
+            else:
+                values = scale_rows(values, factors)
+        yield Timeseries(header, values * weight, names)
+
+
+def read_input(
+    entry: TimeseriesInput, chunksize: int = 2000, sparse: bool = False
+) -> Timeseries:
+    """ Read a whole input with its weight (and hour of day factors) applied
+
+    Args:
+        entry (TimeseriesInput): Timeseries to read
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+        sparse (bool, optional): Keep only the receptor columns with a non-zero value when most are zero. Defaults to False.
+
+    Raises:
+        ValueError: If the input has no data
+
+    Returns:
+        Timeseries: Header columns, weighted receptor values (np.ndarray or SparseChunk) and receptor names
+    """
+    chunks = list(_read_input_chunks(entry, chunksize, sparse))
+    if len(chunks) == 0:
+        raise ValueError(f"No data found in {entry.path}")
+    timeseries = Timeseries.concat(
+        [chunk.with_values(to_dense(chunk.values)) for chunk in chunks]
+    )
+    if sparse:
+        return timeseries.with_values(compress_zero_columns(timeseries.values))
+    return timeseries
+
+
+def check_alignment(
+    reference: typing.Tuple[pd.DataFrame, np.ndarray, typing.List[str]],
+    other: typing.Tuple[pd.DataFrame, np.ndarray, typing.List[str]],
+    other_path: str,
+    start_row: int,
+):
+    """ Check a chunk of another input covers the same hours and receptors as the chunk of the first input (date/hour columns compared for every row at once)
+
+    Args:
+        reference (typing.Tuple[pd.DataFrame, np.ndarray, typing.List[str]]): Chunk of the first input
+        other (typing.Tuple[pd.DataFrame, np.ndarray, typing.List[str]]): Chunk of the input being combined with it
+        other_path (str): Path of the other input (for the error message)
+        start_row (int): Data row the chunks start from
+
+    Raises:
+        ValueError: If the chunks have a different number of rows or receptors, or the date/hour columns don't match
+    """
+    reference_header, reference_values, reference_names = reference
+    other_header, other_values, other_names = other
+
+    if len(other_values) != len(reference_values):
+        raise ValueError(
+            f"{other_path} has a different number of hours to the first timeseries ({len(other_values)} rows instead of {len(reference_values)} from data row {start_row})"
+        )
+    if [str(name) for name in other_names] != [str(name) for name in reference_names]:
+        raise ValueError(
+            f"{other_path} has different receptors to the first timeseries ({len(other_names)} receptors instead of {len(reference_names)})"
+        )
+
+    # Header columns can only be compared if both inputs have the same number of them
+    if other_header.shape[1] != reference_header.shape[1]:
+        return
+    reference_time = reference_header.to_numpy()
+    other_time = other_header.to_numpy()
+    mismatched = np.flatnonzero((reference_time != other_time).any(axis=1))
+    if len(mismatched) > 0:
+        row = mismatched[0]
+        raise ValueError(
+            f"Hours in {other_path} do not line up with the first timeseries from data row {start_row + row}: "
+            f"{' '.join(map(str, other_time[row]))} instead of {' '.join(map(str, reference_time[row]))} ({len(mismatched)} mismatched rows in this chunk)"
+        )
+
+
+def _chunk_frame(
+    header: pd.DataFrame, values: np.ndarray, names: typing.List[str]
+) -> pd.DataFrame:
+    """ Header columns and receptor values of a chunk as a single DataFrame (values are copied as the totals they come from are reused)
+    """
+    return Timeseries(header.reset_index(drop=True), values, names).frame(copy=True)
+
+
+class _TimeseriesWriter:
+    """ Writes a combined timeseries chunk by chunk, csv and gral are written as they arrive while xlsx and parquet are collected and exported at the end
+
+    Args:
+        output_path (str): Location to write to
+        output_format (str): csv, xlsx, parquet or gral
+        gral_header (typing.Optional[typing.List[typing.List[str]]], optional): Header rows for gral output. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        output_format: str,
+        gral_header: typing.Optional[typing.List[typing.List[str]]] = None,
+    ):
+        self.output_path = str(output_path)
+        self.output_format = output_format
+        self._gral_header = gral_header
+        self._file = None
+        self._frames = []
+
+    def write(self, header: pd.DataFrame, values: np.ndarray, names: typing.List[str]):
+        """ Write a chunk of hours
+
+        Args:
+            header (pd.DataFrame): Header columns
+            values (np.ndarray): Receptor values
+            names (typing.List[str]): Receptor names
+        """
+        frame = _chunk_frame(header, values, names)
+
+        if self.output_format in ["xlsx", "parquet"]:
+            self._frames.append(frame)
+            return
+
+        with phase("export"):
+            if self._file is None:
+                print(f"Exporting data to {self.output_path}")
+                self._file = open(self.output_path, "w", newline="")
+                if self.output_format == "gral":
+                    pd.DataFrame(self._gral_header).to_csv(
+                        self._file, header=False, index=False
+                    )
+                else:
+                    frame.iloc[:0].to_csv(self._file, index=False)
+            frame.to_csv(self._file, header=False, index=False)
+
+    def close(self, discard: bool = False):
+        """ Finish writing (xlsx and parquet are exported now)
+
+        Args:
+            discard (bool, optional): Don't export anything collected (eg after an error). Defaults to False.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._frames and not discard:
+            frame = pd.concat(self._frames, ignore_index=True)
+            self._frames = []
+            if self.output_format == "xlsx":
+                _export_excel(frame, self.output_path)
+            else:
+                _export_parquet(frame, self.output_path)
+
+
+def _output_format(
+    output_path: str, output_format: typing.Optional[str], inputs: typing.List[TimeseriesInput]
+) -> str:
+    """ Output format requested, or from the file extension (csv of GRAL inputs is written as GRAL)
+
+    Raises:
+        ValueError: If the format is not supported or can't be determined
+    """
+    if output_format is None:
+        suffix = _convert_path(output_path).suffix.lower()
+        if suffix == ".csv":
+            output_format = "gral" if inputs[0].format == "gral" else "csv"
+        else:
+            output_format = suffix.lstrip(".")
+
+    if output_format not in _available_output_formats():
+        raise ValueError(f"Output format: {output_format} is not supported")
+    if output_format == "gral" and inputs[0].format != "gral":
+        raise ValueError("GRAL output takes its header rows from the first timeseries, which must be a GRAL timeseries")
+    return output_format
+
+
+class _CollectedFrame:
+    """ Collects the combined timeseries into a DataFrame when no output path is given
+    """
+
+    def __init__(self):
+        self._frames = []
+
+    def write(self, header: pd.DataFrame, values: np.ndarray, names: typing.List[str]):
+        self._frames.append(_chunk_frame(header, values, names))
+
+    def close(self, discard: bool = False):
+        pass
+
+    def frame(self) -> pd.DataFrame:
+        return pd.concat(self._frames, ignore_index=True)
+
+
+def _streamed_combination(
+    inputs: typing.List[TimeseriesInput],
+    output: typing.Union[_TimeseriesWriter, _CollectedFrame],
+    intermediates: typing.List[typing.Optional[_TimeseriesWriter]],
+    chunksize: int,
+    sparse: bool = False,
+    apportionment: typing.Optional[Apportionment] = None,
+    dominant: typing.Optional[_TimeseriesWriter] = None,
+) -> int:
+    """ Read every input in lockstep a chunk of hours at a time and write the weighted sum of each chunk.
+        With an apportionment, the weighted chunks of each input are also merged into its buffers of the highest hours and the source contributing most to each hour can be written alongside
+
+    Returns:
+        int: Number of hours combined
+    """
+    readers = [_read_input_chunks(entry, chunksize, sparse) for entry in inputs]
+
+    rows = 0
+    for chunks in itertools.zip_longest(*readers):
+        for entry, chunk in zip(inputs, chunks):
+            if chunk is None:
+                raise ValueError(
+                    f"{entry.path} has a different number of hours to the other timeseries (stopped after {rows} rows)"
+                )
+
+        total = None
+        for entry, chunk, intermediate in zip(inputs, chunks, intermediates):
+            if total is None:
+                total = to_dense(chunk[1], copy=True)
+            else:
+                check_alignment(chunks[0], chunk, entry.path, rows)
+                add_into(total, chunk[1])
+            if intermediate is not None:
+                intermediate.write(chunk[0], to_dense(chunk[1]), chunk[2])
+
+        output.write(chunks[0][0], total, chunks[0][2])
+        if apportionment is not None:
+            contributions = [to_dense(chunk[1]) for chunk in chunks]
+            apportionment.update(rows, chunks[0][0], total, contributions, chunks[0][2])
+            if dominant is not None:
+                sources = np.array(apportionment.sources + [""], dtype=object)
+                dominant.write(chunks[0][0], sources[dominant_sources(contributions)], chunks[0][2])
+        rows += len(total)
+
+    return rows
+
+
+def _read_weighted_input(
+    entry: TimeseriesInput,
+    chunksize: int,
+    slot_spec: typing.Dict[str, typing.Any],
+    sparse: bool = False,
+) -> typing.Tuple[pd.DataFrame, typing.List[str], int]:
+    """ Read a whole input with its weight applied into a shared memory slot for the main process to add (run in a worker process)
+
+    Args:
+        entry (TimeseriesInput): Timeseries to read
+        chunksize (int): Number of hours to read at a time
+        slot_spec (typing.Dict[str, typing.Any]): Spec of the shared timeseries slot to write into
+        sparse (bool, optional): Only weight the non-zero receptor columns of each chunk. Defaults to False.
+
+    Raises:
+        ValueError: If the input is a different size to the first timeseries
+
+    Returns:
+        typing.Tuple[pd.DataFrame, typing.List[str], int]: Header columns, receptor names and number of rows written to the slot
+    """
+    headers = []
+    with SharedTimeseries.attach(slot_spec) as slot:
+        rows = 0
+        for header, values, names in _read_input_chunks(entry, chunksize, sparse):
+            if rows + len(values) > slot.shape[0] or values.shape[1] != slot.shape[1]:
+                raise ValueError(
+                    f"{entry.path} is a different size to the first timeseries ({slot.shape[0]} rows by {slot.shape[1]} receptors)"
+                )
+            slot.values[rows : rows + len(values)] = to_dense(values)
+            headers.append(header)
+            rows += len(values)
+    return pd.concat(headers, ignore_index=True), names, rows
+
+
+def _whole_input_combination(
+    inputs: typing.List[TimeseriesInput],
+    output: typing.Union[_TimeseriesWriter, _CollectedFrame],
+    intermediates: typing.List[typing.Optional[_TimeseriesWriter]],
+    chunksize: int,
+    workers: int,
+    checkpoint: typing.Optional[Checkpoint] = None,
+    start: int = 0,
+    sparse: bool = False,
+) -> int:
+    """ Read whole inputs one at a time and add them to the total in input order, optionally checkpointing the total as it goes.
+        With more workers, inputs are read across a pool of processes while the main process adds them, each worker writes an input into one of a fixed number of shared memory slots which are freed for the next inputs once added
+
+    Args:
+        start (int, optional): Number of inputs already added to the checkpointed total. Defaults to 0.
+        sparse (bool, optional): Only add the non-zero receptor columns of each input. Defaults to False.
+
+    Returns:
+        int: Number of hours combined
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    if start > 0 and checkpoint is not None and checkpoint.total is not None:
+        header, total, names = checkpoint.header, checkpoint.total, checkpoint.names
+        # Intermediate files of the inputs already added are written again, the failed run discarded them
+        for entry, intermediate in zip(inputs[:start], intermediates[:start]):
+            if intermediate is not None:
+                intermediate.write(*read_input(entry, chunksize))
+    else:
+        # The first input sizes the total (and the slots)
+        header, total, names = read_input(inputs[0], chunksize)
+        if intermediates[0] is not None:
+            intermediates[0].write(header, total, names)
+        if checkpoint is not None:
+            total = checkpoint.accumulator(total, header, names)
+            checkpoint.completed(1)
+        start = 1
+    reference = (header, total, names)
+
+    def add(position, entry, intermediate, input_header, values, input_names):
+        check_alignment(reference, (input_header, values, input_names), entry.path, 0)
+        with phase("compute"):
+            if checkpoint is None:
+                add_into(total, values)
+            else:
+                # The input is recorded as completed as soon as it is in the total, before anything else can fail
+                with checkpoint.adding(position + 1):
+                    add_into(total, values)
+        if intermediate is not None:
+            intermediate.write(input_header, to_dense(values), input_names)
+
+    remaining = list(zip(range(len(inputs)), inputs, intermediates))[start:]
+
+    if workers == 1:
+        for position, entry, intermediate in gooey_tqdm(remaining, total=len(remaining)):
+            input_header, values, input_names = read_input(entry, chunksize, sparse)
+            add(position, entry, intermediate, input_header, values, input_names)
+    elif remaining:
+        slots = []
+        try:
+            for _ in range(min(workers, len(remaining))):
+                slots.append(SharedTimeseries.allocate(len(total), names))
+            free_slots = deque(slots)
+            pending = deque()
+            queue = iter(remaining)
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+
+                def submit_next():
+                    for position, entry, intermediate in queue:
+                        slot = free_slots.popleft()
+                        future = executor.submit(_read_weighted_input, entry, chunksize, slot.spec, sparse)
+                        pending.append((future, slot, position, entry, intermediate))
+                        return
+
+                for _ in slots:
+                    submit_next()
+
+                for _ in gooey_tqdm(range(len(remaining)), total=len(remaining)):
+                    future, slot, position, entry, intermediate = pending.popleft()
+                    input_header, input_names, rows = future.result()
+                    values = slot.values[:rows]
+                    add(position, entry, intermediate, input_header, values, input_names)
+                    # Nothing refers to the slot once added, it can be reused
+                    del values
+
+                    free_slots.append(slot)
+                    submit_next()
+        finally:
+            for slot in slots:
+                slot.close()
+
+    output.write(header, total, names)
+    return len(total)
+
+
+def linear_combination(
+    inputs: typing.List[TimeseriesInput],
+    output_path: typing.Optional[str] = None,
+    output_format: typing.Optional[str] = None,
+    chunksize: int = 2000,
+    workers: int = 1,
+    checkpoint_path: typing.Optional[str] = None,
+    checkpoint_interval: int = 10,
+    resume: bool = False,
+    preflight: bool = True,
+    sparse: bool = False,
+    apportion_hours: int = 0,
+    apportion_path: typing.Optional[str] = None,
+    dominant_path: typing.Optional[str] = None,
+) -> typing.Optional[pd.DataFrame]:
+    """ Weighted sum of timeseries (Σ weight × timeseries), eg a batch sum with scales, a difference (weights 1 and -1) or factored source groups.
+        Inputs are read in lockstep a chunk of hours at a time, each chunk is checked to cover the same hours and receptors as the first input and the sum is accumulated in float64 and written as it goes.
+        With more workers, whole inputs are read across a pool of processes into shared memory instead (more memory, faster for many inputs).
+        With a checkpoint, whole inputs are added one at a time to a running total saved at intervals, so a failed run can resume from the last checkpoint.
+        With apportion hours, each receptor's highest hours of the sum and every input's contribution at those hours are kept as the inputs are streamed (see Apportionment)
+
+    Args:
+        inputs (typing.List[TimeseriesInput]): Timeseries to combine, the header columns (and GRAL header rows) are taken from the first
+        output_path (typing.Optional[str], optional): Location to write the combined timeseries to. Defaults to None (return it instead).
+        output_format (typing.Optional[str], optional): csv, xlsx, parquet or gral (see _available_output_formats). Defaults to None (from the output file extension).
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+        workers (int, optional): Number of processes to read inputs with. Defaults to 1 (streamed).
+        checkpoint_path (typing.Optional[str], optional): Folder to checkpoint the running total to. Defaults to None (no checkpoints).
+        checkpoint_interval (int, optional): Number of inputs added between checkpoints. Defaults to 10.
+        resume (bool, optional): Continue from the checkpoint of a previous run with the same inputs. Defaults to False.
+        preflight (bool, optional): Check every input's header and number of hours before reading any of them (see Preflight). Defaults to True.
+        sparse (bool, optional): Drop all-zero receptor columns as inputs are read and skip them when weighting and adding (see Sparse_Blocks), for inputs where most receptors are zero such as GRAL source groups. Defaults to False.
+        apportion_hours (int, optional): Number of highest hours of the sum to apportion to the inputs for each receptor. Defaults to 0 (no apportionment).
+        apportion_path (typing.Optional[str], optional): Location to write the apportionment table to (csv, xlsx or parquet). Defaults to None (the output path ending in _Apportionment).
+        dominant_path (typing.Optional[str], optional): Location to write the input contributing most to every hour and receptor to (csv, xlsx or parquet). Defaults to None (not written).
+
+    Raises:
+        ValueError: If there are no inputs, a format is not supported, the pre-flight check finds problems, the inputs don't line up or apportionment is asked for without streaming
+
+    Returns:
+        typing.Optional[pd.DataFrame]: Combined timeseries if no output path is given
+    """
+    if len(inputs) == 0:
+        raise ValueError("No timeseries provided to combine")
+    for entry in inputs:
+        if entry.format not in _available_input_formats():
+            raise ValueError(f"Timeseries format: {entry.format} is not supported")
+
+    chunksize = int(chunksize)
+    workers = int(workers or 1)
+
+    apportion_hours = int(apportion_hours or 0)
+    if dominant_path is not None and apportion_hours <= 0:
+        raise ValueError("The dominant source of each hour is written with an apportionment, set the number of hours to apportion")
+    apportionment = None
+    if apportion_hours > 0:
+        if (workers > 1 and len(inputs) > 1) or checkpoint_path is not None:
+            raise ValueError("Apportionment is kept while inputs are streamed, it can't be used with more workers or a checkpoint")
+        if apportion_path is None:
+            if output_path is None:
+                raise ValueError("No location given to write the apportionment to")
+            apportion_path = append_to_file_path(output_path, "_Apportionment")
+        apportionment = Apportionment(source_names([entry.path for entry in inputs]), apportion_hours)
+
+    if preflight:
+        from .Preflight import validate_inputs
+
+        validate_inputs(inputs)
+
+    if output_path is None:
+        output = _CollectedFrame()
+    else:
+        output_format = _output_format(output_path, output_format, inputs)
+        gral_header = _gral_output_header(inputs[0]) if output_format == "gral" else None
+        output = _TimeseriesWriter(output_path, output_format, gral_header)
+
+    intermediates = []
+    for entry in inputs:
+        if entry.intermediate_path is None:
+            intermediates.append(None)
+        else:
+            intermediate_format = _output_format(entry.intermediate_path, None, [entry])
+            intermediates.append(
+                _TimeseriesWriter(
+                    entry.intermediate_path,
+                    intermediate_format,
+                    _gral_output_header(entry) if intermediate_format == "gral" else None,
+                )
+            )
+    # The apportionment is exported after the whole sum has streamed, so its format is checked first
+    if apportionment is not None and _convert_path(apportion_path).suffix not in [".csv", ".xlsx", ".parquet"]:
+        raise ValueError(f"Unable to export the apportionment to {apportion_path}, use csv, xlsx or parquet")
+    dominant = None
+    if dominant_path is not None:
+        dominant_format = _convert_path(dominant_path).suffix.lower().lstrip(".")
+        if dominant_format not in ["csv", "xlsx", "parquet"]:
+            raise ValueError(f"Unable to write the dominant sources to {dominant_path}, use csv, xlsx or parquet")
+        dominant = _TimeseriesWriter(dominant_path, dominant_format)
+
+    checkpoint = contextlib.nullcontext()
+    if checkpoint_path is not None:
+        checkpoint = Checkpoint(
+            checkpoint_path,
+            run_key([entry._asdict() for entry in inputs], output_path, output_format),
+            checkpoint_interval,
+        )
+
+    with checkpoint:
+        start = checkpoint.resume() if checkpoint_path is not None and resume else 0
+        try:
+            if workers > 1 and len(inputs) > 1:
+                print(f"Reading {len(inputs) - 1} timeseries across {workers} processes")
+            if (workers > 1 and len(inputs) > 1) or checkpoint_path is not None:
+                rows = _whole_input_combination(
+                    inputs,
+                    output,
+                    intermediates,
+                    chunksize,
+                    workers,
+                    checkpoint if checkpoint_path is not None else None,
+                    start,
+                    sparse,
+                )
+            else:
+                rows = _streamed_combination(
+                    inputs, output, intermediates, chunksize, sparse, apportionment, dominant
+                )
+        except BaseException:
+            for writer in [output, dominant] + intermediates:
+                if writer is not None:
+                    writer.close(discard=True)
+            raise
+
+        for writer in [output, dominant] + intermediates:
+            if writer is not None:
+                writer.close()
+        if checkpoint_path is not None:
+            checkpoint.finish()
+
+    print(f"Combined {len(inputs)} timeseries over {rows} hours")
+    if apportionment is not None:
+        with phase("export"):
+            print(f"Exporting the {apportion_hours} highest hours of each receptor apportioned to {apportion_path}")
+            apportionment.export(apportion_path)
+
+    if output_path is None:
+        return output.frame()
+    return None
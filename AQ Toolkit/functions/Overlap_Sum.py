@@ -1,6 +1,11 @@
 """ Overlap Sum is a tool for joining back together multiple data sets that share columns
 """
-from .File_Utilties import _read_large_dataset, error_printing, gooey_tqdm
+from .File_Utilties import (
+    _read_large_dataset,
+    error_printing,
+    gooey_tqdm,
+    prepend_header_dataframe,
+)
 
 import pandas as pd
 
@@ -23,7 +28,7 @@ def _rename_columns(
     """
     try:
         renamed_df = dataframe.set_axis(
-            header_columns + receptor_id_names, axis=1, inplace=False
+            header_columns + receptor_id_names, axis=1
         )
     except:
         # ValueError is raised when axis' don't match warn user
@@ -66,9 +71,30 @@ def overlap_sum(
         id_df (pd.DataFrame): DataFrame where the index is the file name (as provided in the input_file_list (if Path use `.stem`)) and the remainder of the row is the column names
         header_column_length (int): Number of columns that are shared across all datasets (eg, year, month, day)
 
+    Raises:
+        ValueError: If the pre-flight check finds problems (missing files or IDs, or a different number of hours)
+
     Returns:
         pd.DataFrame: Summed Dataset with all columns provided in id_df
     """
+    from .Linear_Combination import TimeseriesInput
+    from .Preflight import preflight_problems, report_problems
+
+    # Data sets have different receptors so only the number of hours must match
+    problems = preflight_problems(
+        [
+            TimeseriesInput(file_name, header_length=header_column_length)
+            for file_name in input_file_list
+        ],
+        compare_receptors=False,
+    )
+    problems += [
+        f"{file_name} has no receptor IDs in the configuration"
+        for file_name in input_file_list
+        if file_name.stem not in id_df.index
+    ]
+    report_problems(problems, len(input_file_list))
+
     out_df = _read_large_dataset(input_file_list[0], 2000)
 
     # Get the contents of the row where the file_name is the index (stem is used to avoid pathing problems) and return a list
@@ -108,10 +134,4 @@ def overlap_sum(
     out_df = out_df.loc[:, ~out_df.columns.str.contains("^Unnamed")]
 
     # Prepend header columns
-    if len(out_df_header.columns) > 0:
-
-        # Insert backwards to keep original order
-        for column in out_df_header.columns[::-1]:
-            out_df.insert(0, column, out_df_header[column])
-
-    return out_df
+    return prepend_header_dataframe(out_df, out_df_header)
@@ -0,0 +1,269 @@
+""" Pre-flight checks for configuration driven runs, every input is checked before any data is read (path, header columns and number of hours from a count of the lines) so all problems are reported at once rather than one at a time part way through a long run
+"""
+
+import os
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .File_Utilties import (
+    _convert_path,
+    _count_lines,
+    _read_column_names,
+    error_printing,
+)
+from .Linear_Combination import TimeseriesInput, _gral_width, _read_gral_header_rows
+
+# Scanning is mostly waiting on the disk so threads are enough
+PREFLIGHT_THREADS = 8
+
+
+class TimeseriesScan(typing.NamedTuple):
+    """ What a pre-flight scan found in an input
+
+    Args:
+        path (str): Path to the input
+        rows (typing.Optional[int]): Number of hours (data rows), None if it couldn't be scanned
+        receptors (typing.List[str]): Receptor names (columns after the header columns)
+        problems (typing.List[str]): Problems with the input on its own
+    """
+
+    path: str
+    rows: typing.Optional[int]
+    receptors: typing.List[str]
+    problems: typing.List[str]
+
+
+def _table_rows(path: str) -> int:
+    """ Number of data rows in a csv or xlsx table (below the row of column names)
+    """
+    file_path = _convert_path(path)
+    if file_path.suffix == ".xlsx":
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            return workbook.worksheets[0].max_row - 1
+        finally:
+            workbook.close()
+    return _count_lines(path, skip_blank_lines=True) - 1
+
+
+def scan_input(entry: TimeseriesInput) -> TimeseriesScan:
+    """ Scan the header and count the hours of an input without parsing its data
+
+    Args:
+        entry (TimeseriesInput): Input to scan
+
+    Returns:
+        TimeseriesScan: Number of hours, receptor names and any problems found
+    """
+    path = str(entry.path)
+    if not os.path.isfile(entry.path):
+        return TimeseriesScan(path, None, [], [f"{path} can't be found"])
+
+    header_length = int(entry.header_length)
+    problems = []
+    try:
+        if entry.format == "gral":
+            header_rows = _read_gral_header_rows(entry)
+            if len(header_rows) < int(entry.header_rows):
+                return TimeseriesScan(
+                    path, None, [], [f"{path} has fewer lines than the {entry.header_rows} GRAL header rows"]
+                )
+            names = header_rows[-1][: _gral_width(entry)]
+            rows = _count_lines(entry.path, skip_blank_lines=True) - int(entry.header_rows)
+            if entry.receptors is not None and len(names) < _gral_width(entry):
+                problems.append(
+                    f"{path} has {len(names) - header_length} receptor columns, {entry.receptors} receptors were expected"
+                )
+        else:
+            names = [
+                str(name)
+                for name in _read_column_names(entry.path)
+                if not str(name).startswith("Unnamed")
+            ]
+            rows = _table_rows(entry.path)
+    except (OSError, UnicodeError, ValueError, pd.errors.ParserError) as error:
+        return TimeseriesScan(path, None, [], [f"{path} couldn't be read ({error})"])
+
+    if len(names) <= header_length:
+        problems.append(
+            f"{path} has {len(names)} named columns, {header_length} header columns then at least one receptor were expected"
+        )
+    if rows <= 0:
+        problems.append(f"{path} has no data rows")
+
+    return TimeseriesScan(path, rows, [str(name) for name in names[header_length:]], problems)
+
+
+def scan_inputs(
+    inputs: typing.List[TimeseriesInput], threads: int = PREFLIGHT_THREADS
+) -> typing.List[TimeseriesScan]:
+    """ Scan inputs across a pool of threads
+
+    Args:
+        inputs (typing.List[TimeseriesInput]): Inputs to scan
+        threads (int, optional): Number of files to scan at a time. Defaults to PREFLIGHT_THREADS.
+
+    Returns:
+        typing.List[TimeseriesScan]: Scan of each input in order
+    """
+    if len(inputs) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(int(threads), len(inputs)))) as executor:
+        return list(executor.map(scan_input, inputs))
+
+
+def _receptor_difference(reference: TimeseriesScan, other: TimeseriesScan) -> str:
+    """ Describe how the receptors of an input differ from the first input
+    """
+    if len(other.receptors) != len(reference.receptors):
+        return f"{other.path} has {len(other.receptors)} receptors, {reference.path} has {len(reference.receptors)}"
+    position = next(
+        position
+        for position, (name, reference_name) in enumerate(zip(other.receptors, reference.receptors))
+        if name != reference_name
+    )
+    return (
+        f"{other.path} has different receptors to {reference.path} from receptor {position + 1} "
+        f"({other.receptors[position]} instead of {reference.receptors[position]})"
+    )
+
+
+def preflight_problems(
+    inputs: typing.List[TimeseriesInput],
+    compare_receptors: bool = True,
+    threads: int = PREFLIGHT_THREADS,
+    compare_rows: bool = True,
+) -> typing.List[str]:
+    """ Find every problem with a set of inputs that are combined hour by hour, each input is checked on its own then against the first input (the number of hours and, optionally, the receptors must match)
+
+    Args:
+        inputs (typing.List[TimeseriesInput]): Inputs of the run
+        compare_receptors (bool, optional): Whether every input must have the same receptors as the first. Defaults to True.
+        threads (int, optional): Number of files to scan at a time. Defaults to PREFLIGHT_THREADS.
+        compare_rows (bool, optional): Whether every input must have the same number of hours as the first (not for inputs joined one after the other). Defaults to True.
+
+    Returns:
+        typing.List[str]: Problems found (empty if the inputs look consistent)
+    """
+    scans = scan_inputs(inputs, threads)
+    problems = [problem for scan in scans for problem in scan.problems]
+
+    # Inputs with problems of their own aren't compared as well
+    valid = [scan for scan in scans if not scan.problems]
+    if len(valid) > 1:
+        reference = valid[0]
+        for scan in valid[1:]:
+            if compare_rows and scan.rows != reference.rows:
+                problems.append(
+                    f"{scan.path} has {scan.rows} hours, {reference.path} has {reference.rows}"
+                )
+            if compare_receptors and scan.receptors != reference.receptors:
+                problems.append(_receptor_difference(reference, scan))
+    return problems
+
+
+def report_problems(problems: typing.List[str], item_count: int, item_name: str = "inputs"):
+    """ Print every problem found by a pre-flight check then stop the run
+
+    Args:
+        problems (typing.List[str]): Problems found
+        item_count (int): Number of inputs (or configuration rows) checked
+        item_name (str, optional): What was checked. Defaults to "inputs".
+
+    Raises:
+        ValueError: If any problems were found
+    """
+    if len(problems) == 0:
+        print(f"Pre-flight check passed for {item_count} {item_name}")
+        return
+    error_printing(
+        f"Pre-flight check found {len(problems)} problems with {item_count} {item_name}, nothing has been run:\n"
+        + "\n".join(f"- {problem}" for problem in problems)
+    )
+    raise ValueError(
+        f"Pre-flight check found {len(problems)} problems with the {item_name}: {'; '.join(problems)}"
+    )
+
+
+def validate_inputs(
+    inputs: typing.List[TimeseriesInput],
+    compare_receptors: bool = True,
+    threads: int = PREFLIGHT_THREADS,
+):
+    """ Check a set of inputs that are combined hour by hour before any of them are read
+
+    Args:
+        inputs (typing.List[TimeseriesInput]): Inputs of the run
+        compare_receptors (bool, optional): Whether every input must have the same receptors as the first. Defaults to True.
+        threads (int, optional): Number of files to scan at a time. Defaults to PREFLIGHT_THREADS.
+
+    Raises:
+        ValueError: If any problems were found (all of them are listed)
+    """
+    report_problems(preflight_problems(inputs, compare_receptors, threads), len(inputs))
+
+
+def validate_factorizer_config(
+    config_df: pd.DataFrame,
+    header_length: int,
+    path_col_name: str = "Path",
+    factor_col_name: str = "Factor",
+    output_col_name: str = "Output",
+    threads: int = PREFLIGHT_THREADS,
+):
+    """ Check every row of a factorizer configuration before any data is read, each data set needs a factor file with the same number of hours and a folder to write to
+
+    Args:
+        config_df (pd.DataFrame): Configuration with the data set, factor and output paths
+        header_length (int): Number of header columns in the data sets
+        path_col_name (str, optional): Name of column containing data set paths. Defaults to "Path".
+        factor_col_name (str, optional): Name of column containing factor paths. Defaults to "Factor".
+        output_col_name (str, optional): Name of column containing output paths. Defaults to "Output".
+        threads (int, optional): Number of files to scan at a time. Defaults to PREFLIGHT_THREADS.
+
+    Raises:
+        ValueError: If any problems were found (all of them are listed)
+    """
+    missing_columns = [
+        column
+        for column in [path_col_name, factor_col_name, output_col_name]
+        if column not in config_df.columns
+    ]
+    if missing_columns:
+        raise ValueError(f"Configuration is missing the columns: {', '.join(missing_columns)}")
+
+    data_inputs = [
+        TimeseriesInput(row[path_col_name], header_length=int(header_length))
+        for _, row in config_df.iterrows()
+    ]
+    # Factors are taken from the last column so any number of header columns is fine
+    factor_inputs = [
+        TimeseriesInput(row[factor_col_name], header_length=0)
+        for _, row in config_df.iterrows()
+    ]
+    scans = scan_inputs(data_inputs + factor_inputs, threads)
+    data_scans, factor_scans = scans[: len(data_inputs)], scans[len(data_inputs):]
+
+    problems = []
+    for row_number, (data_scan, factor_scan, output_path) in enumerate(
+        zip(data_scans, factor_scans, config_df[output_col_name]), start=1
+    ):
+        row_problems = data_scan.problems + factor_scan.problems
+        if (
+            data_scan.rows is not None
+            and factor_scan.rows is not None
+            and data_scan.rows != factor_scan.rows
+        ):
+            row_problems.append(
+                f"{factor_scan.path} has {factor_scan.rows} factors for the {data_scan.rows} hours in {data_scan.path}"
+            )
+        output_folder = _convert_path(output_path).parent
+        if not output_folder.is_dir():
+            row_problems.append(f"output folder {output_folder} doesn't exist")
+        problems.extend(f"row {row_number}: {problem}" for problem in row_problems)
+
+    report_problems(problems, len(config_df), "configuration rows")
@@ -0,0 +1,337 @@
+""" Run instrumentation, times the read/transform/compute/export phases of a command, samples peak memory and writes a JSON run report (optionally with a cProfile or pyinstrument profile)
+"""
+
+import contextlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import typing
+
+# The profiler of the current run, phases are only recorded while a run is active
+_active_profiler = None
+
+
+def _available_profilers() -> typing.List[str]:
+    return ["cProfile", "pyinstrument"]
+
+
+def _current_rss() -> typing.Optional[int]:
+    """ Current resident memory of this process in bytes (requires psutil)
+
+    Returns:
+        typing.Optional[int]: Resident memory in bytes, None if psutil is not installed
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+def _peak_rss() -> typing.Optional[int]:
+    """ Peak resident memory of this process so far in bytes, from the operating system where available
+
+    Returns:
+        typing.Optional[int]: Peak resident memory in bytes, None if it can't be determined
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows, psutil reports the peak working set instead
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return getattr(psutil.Process(os.getpid()).memory_info(), "peak_wset", None)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _MemorySampler(threading.Thread):
+    """ Background thread sampling resident memory so each phase can report its own peak
+    """
+
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = _current_rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def reset(self) -> typing.Optional[int]:
+        """ Return the peak since the last reset and start again from the current memory
+        """
+        peak = self.peak
+        self.peak = _current_rss()
+        return peak
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RunProfiler:
+    """ Collects phase timings, memory and data sizes for a single command
+
+    Args:
+        command (str): Name of the command being run
+        profiler (typing.Optional[str], optional): cProfile or pyinstrument to record a full profile. Defaults to None.
+        profile_path (typing.Optional[str], optional): Location to write the profile to. Defaults to None.
+        report_path (typing.Optional[str], optional): Location to write the JSON run report to. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        profiler: typing.Optional[str] = None,
+        profile_path: typing.Optional[str] = None,
+        report_path: typing.Optional[str] = None,
+    ):
+        if profiler is not None and profiler not in _available_profilers():
+            raise ValueError(f"Profiler: {profiler} is not supported")
+
+        self.command = command
+        self.profiler = profiler
+        self.profile_path = profile_path
+        self.report_path = report_path
+        self.phases = {}
+        self.rows = 0
+        self.columns = 0
+        self.values = 0
+        self._stack = []
+        self._profile = None
+        self._sampler = None
+        self._start_time = None
+        self.total_seconds = None
+        self.error = None
+
+    def start(self) -> "RunProfiler":
+        """ Start timing the run (and profiling if requested), phases are recorded from now on
+        """
+        global _active_profiler
+
+        if _current_rss() is not None:
+            self._sampler = _MemorySampler()
+            self._sampler.start()
+
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            self._profile = Profiler()
+            self._profile.start()
+        elif self.profiler == "cProfile":
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        self._start_time = time.perf_counter()
+        _active_profiler = self
+        return self
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """ Time a phase of the run, time spent in nested phases is only counted against the innermost phase
+
+        Args:
+            name (str): Name of phase (eg read, transform, compute, export)
+        """
+        # Memory used so far belongs to the enclosing phase
+        self._record_peak(self._stack[-1][0] if self._stack else None)
+        self._stack.append([name, time.perf_counter(), 0.0])
+        try:
+            yield
+        finally:
+            name, start, nested_seconds = self._stack.pop()
+            elapsed = time.perf_counter() - start
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            phase = self._phase_totals(name)
+            phase["seconds"] += elapsed - nested_seconds
+            phase["calls"] += 1
+            self._record_peak(name)
+
+    def _phase_totals(self, name: str) -> typing.Dict[str, typing.Any]:
+        """ Totals recorded for a phase, created on first use
+        """
+        return self.phases.setdefault(
+            name, {"seconds": 0.0, "calls": 0, "peak_rss_bytes": None}
+        )
+
+    def _record_peak(self, name: typing.Optional[str] = None):
+        """ Attribute the peak memory since the last check to a phase. Without psutil there is no sampler and phases have no peak
+            (the operating system only reports the peak of the whole process, which is given once for the run)
+        """
+        if self._sampler is None:
+            return
+        peak = self._sampler.reset()
+        if name is None or peak is None:
+            return
+        phase = self._phase_totals(name)
+        phase["peak_rss_bytes"] = max(phase["peak_rss_bytes"] or 0, peak)
+
+    def record_data(self, rows: int, columns: int):
+        """ Record the size of a dataset processed during the run
+
+        Args:
+            rows (int): Number of rows (hours)
+            columns (int): Number of columns (receptors)
+        """
+        self.rows += int(rows)
+        self.columns += int(columns)
+        self.values += int(rows) * int(columns)
+
+    def finish(self, error: typing.Optional[BaseException] = None) -> typing.Dict[str, typing.Any]:
+        """ Stop timing, write the profile and run report if requested and print a summary
+
+        Args:
+            error (typing.Optional[BaseException], optional): Error the command failed with. Defaults to None (completed).
+
+        Returns:
+            typing.Dict[str, typing.Any]: Run report
+        """
+        global _active_profiler
+        _active_profiler = None
+
+        self.total_seconds = time.perf_counter() - self._start_time
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+        if self._sampler is not None:
+            self._sampler.stop()
+
+        if self._profile is not None:
+            self._write_profile()
+
+        report = self.report()
+
+        if self.error is None:
+            print(f"Completed {self.command} in {self.total_seconds:.2f} seconds")
+        else:
+            print(f"Failed {self.command} after {self.total_seconds:.2f} seconds ({self.error})")
+        for name, phase in report["phases"].items():
+            print(f"    {name}: {phase['seconds']:.2f} seconds ({phase['calls']} calls)")
+
+        if self.report_path:
+            print(f"Exporting run report to {self.report_path}")
+            with open(self.report_path, "w") as report_file:
+                json.dump(report, report_file, indent=4)
+
+        return report
+
+    def _write_profile(self):
+        """ Write the recorded profile, cProfile is written as pstats (open with snakeviz) and pyinstrument as html
+        """
+        if self.profiler == "pyinstrument":
+            self._profile.stop()
+            print(self._profile.output_text(unicode=False, color=False))
+            if self.profile_path:
+                with open(self.profile_path, "w") as profile_file:
+                    profile_file.write(self._profile.output_html())
+        else:
+            import pstats
+
+            self._profile.disable()
+            pstats.Stats(self._profile, stream=sys.stdout).sort_stats(
+                "cumulative"
+            ).print_stats(20)
+            if self.profile_path:
+                self._profile.dump_stats(self.profile_path)
+
+        if self.profile_path:
+            print(f"Exported {self.profiler} profile to {self.profile_path}")
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        """ Summary of the run including phase timings, data processed and throughput
+
+        Returns:
+            typing.Dict[str, typing.Any]: Run report
+        """
+        try:
+            from .__version__ import version
+        except ImportError:
+            version = None
+
+        total_seconds = self.total_seconds
+        if total_seconds is None:
+            total_seconds = time.perf_counter() - self._start_time
+
+        phases = dict(self.phases)
+        phases["other"] = {
+            "seconds": max(
+                total_seconds - sum(phase["seconds"] for phase in self.phases.values()),
+                0.0,
+            ),
+            "calls": 1,
+            "peak_rss_bytes": None,
+        }
+
+        return {
+            "command": self.command,
+            "toolkit_version": version,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "started": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - total_seconds)
+            ),
+            "total_seconds": total_seconds,
+            "error": self.error,
+            "peak_rss_bytes": _peak_rss(),
+            "phases": phases,
+            "rows_processed": self.rows,
+            "columns_processed": self.columns,
+            "values_processed": self.values,
+            "rows_per_second": self.rows / total_seconds if total_seconds else None,
+            "values_per_second": self.values / total_seconds if total_seconds else None,
+        }
+
+
+def phase(name: str) -> typing.ContextManager:
+    """ Time a phase against the active run, does nothing if no run is being profiled
+
+    Args:
+        name (str): Name of phase (eg read, transform, compute, export)
+
+    Returns:
+        typing.ContextManager: Context manager timing the phase
+    """
+    if _active_profiler is None:
+        return contextlib.nullcontext()
+    return _active_profiler.phase(name)
+
+
+def record_data(rows: int, columns: int):
+    """ Record the size of a dataset against the active run, does nothing if no run is being profiled
+
+    Args:
+        rows (int): Number of rows (hours)
+        columns (int): Number of columns (receptors)
+    """
+    if _active_profiler is not None:
+        _active_profiler.record_data(rows, columns)
+
+
+def start_run(settings: typing.Dict[str, typing.Any]) -> RunProfiler:
+    """ Start instrumenting a command from user input in Gooey (command, profile, profile_path and run_report)
+
+    Args:
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Returns:
+        RunProfiler: Started profiler, call finish once the command completes
+    """
+    return RunProfiler(
+        settings["command"],
+        settings.get("profile"),
+        settings.get("profile_path"),
+        settings.get("run_report"),
+    ).start()
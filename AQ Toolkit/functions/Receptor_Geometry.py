@@ -0,0 +1,316 @@
+""" Receptor geometry, loads receptor coordinates (CALPUFF header / _Locations file or GRAL receptor file) and indexes them for spatial queries such as all receptors within a radius or inside a polygon
+"""
+
+import re
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import _convert_path, _read_large_dataset
+
+
+def _numeric_tokens(line: str) -> typing.List[float]:
+    """ Return all tokens in a line that can be converted to a float
+
+    Args:
+        line (str): Line of text split on commas, tabs and spaces
+
+    Returns:
+        typing.List[float]: Numeric values in the line
+    """
+    values = []
+    for token in re.split(r"[,\s]+", line.strip()):
+        try:
+            values.append(float(token))
+        except ValueError:
+            continue
+    return values
+
+
+def _read_calpuff_dat_locations(file_path: str) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Read receptor locations from the header of a CALPUFF dat timeseries (same rows as _export_calpuff_header)
+
+    Args:
+        file_path (str): Path to CALPUFF dat file
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: Receptor IDs and X/Y coordinates
+    """
+    with open(file_path) as dat_file:
+        for i, line in enumerate(dat_file):
+            if i == 3:
+                number_of_receptors = int(line.split()[0])
+            elif i == 9:
+                x = _numeric_tokens(line)[-number_of_receptors:]
+            elif i == 10:
+                y = _numeric_tokens(line)[-number_of_receptors:]
+                break
+
+    ids = np.array([str(receptor) for receptor in range(1, number_of_receptors + 1)])
+    return ids, np.column_stack([x, y])
+
+
+def _read_gral_receptor_locations(
+    file_path: str,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Read receptor locations from a GRAL Receptor.dat file (number of receptors on the first line, then ID, X, Y, Z per line)
+
+    Args:
+        file_path (str): Path to GRAL receptor file
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: Receptor IDs and X/Y coordinates
+    """
+    ids = []
+    coordinates = []
+    with open(file_path) as receptor_file:
+        for line in receptor_file:
+            values = _numeric_tokens(line)
+            if len(values) < 3:
+                # Number of receptors or blank lines
+                continue
+            ids.append(str(int(values[0])))
+            coordinates.append(values[1:3])
+
+    return np.array(ids), np.array(coordinates, dtype=float)
+
+
+def _read_table_locations(file_path: str) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Read receptor locations from a table, either the _Locations output from dat_to_csv (X and Y rows) or a table with ID, X & Y columns
+
+    Args:
+        file_path (str): Path to csv or xlsx file
+
+    Raises:
+        ValueError: If the coordinates can't be found in the table
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: Receptor IDs and X/Y coordinates
+    """
+    locations_df = _read_large_dataset(file_path)
+
+    if str(locations_df.columns[0]) == "X or Y":
+        # Written by dat_to_csv, first row is X and second row is Y with a column per receptor
+        ids = np.array([str(column) for column in locations_df.columns[1:]])
+        xy = locations_df.iloc[:2, 1:].apply(pd.to_numeric, errors="coerce").to_numpy()
+        return ids, xy.T
+
+    columns = {str(column).strip().lower(): column for column in locations_df.columns}
+    if "x" not in columns or "y" not in columns:
+        raise ValueError(
+            f"Unable to find receptor coordinates in {file_path}, expected X and Y columns"
+        )
+    id_column = locations_df.columns[0]
+    for name in ["id", "receptor", "receptor id", "sensor id"]:
+        if name in columns:
+            id_column = columns[name]
+            break
+    ids = locations_df[id_column].astype(str).to_numpy()
+    xy = locations_df[[columns["x"], columns["y"]]].to_numpy(dtype=float)
+    return ids, xy
+
+
+class ReceptorLocations:
+    """ Receptor coordinates with a spatial index for fast radius and polygon queries.
+        A KD-tree is used when scipy is installed, otherwise receptors are bucketed into a uniform grid
+
+    Args:
+        ids (np.ndarray): Receptor IDs (as found in the column names of the timeseries)
+        xy (np.ndarray): 2D array of X, Y coordinates for each receptor
+    """
+
+    def __init__(self, ids: np.ndarray, xy: np.ndarray):
+        self.ids = np.asarray(ids).astype(str)
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+
+        if len(self.ids) != len(self.xy):
+            raise ValueError(
+                f"Number of receptor IDs ({len(self.ids)}) does not match number of coordinates ({len(self.xy)})"
+            )
+
+        try:
+            from scipy.spatial import cKDTree
+
+            self._tree = cKDTree(self.xy)
+        except ImportError:
+            self._tree = None
+            self._build_grid()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def read(cls, file_path: str) -> "ReceptorLocations":
+        """ Read receptor locations from a CALPUFF dat file, a _Locations csv (from dat_to_csv), a GRAL Receptor.dat or a table with ID, X & Y columns
+
+        Args:
+            file_path (str): Path to receptor location file
+
+        Returns:
+            ReceptorLocations: Indexed receptor locations
+        """
+        path = _convert_path(file_path)
+        if path.suffix.lower() in [".csv", ".xlsx"]:
+            ids, xy = _read_table_locations(file_path)
+        elif path.name.lower().startswith("receptor"):
+            ids, xy = _read_gral_receptor_locations(file_path)
+        else:
+            ids, xy = _read_calpuff_dat_locations(file_path)
+
+        print(f"Read {len(ids)} receptor locations from {file_path}")
+        return cls(ids, xy)
+
+    def _build_grid(self):
+        """ Bucket receptors into a uniform grid (roughly 4 receptors per cell), used when scipy is not available
+        """
+        if len(self.xy) == 0:
+            self._cell_size = 1.0
+            self._origin = np.zeros(2)
+            self._cells = {}
+            return
+
+        self._origin = self.xy.min(axis=0)
+        extent = self.xy.max(axis=0) - self._origin
+        area = max(extent[0] * extent[1], 1e-12)
+        self._cell_size = max(np.sqrt(4 * area / len(self.xy)), extent.max() / 1000, 1e-9)
+
+        cells = np.floor((self.xy - self._origin) / self._cell_size).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        sorted_cells = cells[order]
+        boundaries = np.flatnonzero((np.diff(sorted_cells, axis=0) != 0).any(axis=1)) + 1
+        self._cells = {
+            tuple(cells[group[0]]): group
+            for group in np.split(order, boundaries)
+        }
+
+    def _candidates_in_box(self, minimum: np.ndarray, maximum: np.ndarray) -> np.ndarray:
+        """ Receptor positions in grid cells overlapping a bounding box
+
+        Args:
+            minimum (np.ndarray): Lower left corner of box
+            maximum (np.ndarray): Upper right corner of box
+
+        Returns:
+            np.ndarray: Receptor positions that may be within the box
+        """
+        low = np.floor((minimum - self._origin) / self._cell_size).astype(np.int64)
+        high = np.floor((maximum - self._origin) / self._cell_size).astype(np.int64)
+        if (high - low + 1).prod() > len(self._cells):
+            # Box is larger than the populated grid, check populated cells only
+            groups = [
+                group
+                for cell, group in self._cells.items()
+                if low[0] <= cell[0] <= high[0] and low[1] <= cell[1] <= high[1]
+            ]
+        else:
+            groups = [
+                self._cells[(i, j)]
+                for i in range(low[0], high[0] + 1)
+                for j in range(low[1], high[1] + 1)
+                if (i, j) in self._cells
+            ]
+        if len(groups) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(groups))
+
+    def within_radius(self, x: float, y: float, radius: float) -> np.ndarray:
+        """ Receptor IDs within a radius of a point (eg a sensitive receptor)
+
+        Args:
+            x (float): X coordinate of point (same units as receptor locations)
+            y (float): Y coordinate of point
+            radius (float): Search radius (same units as receptor locations)
+
+        Returns:
+            np.ndarray: Receptor IDs within the radius
+        """
+        centre = np.array([x, y], dtype=float)
+        if self._tree is not None:
+            positions = np.sort(self._tree.query_ball_point(centre, radius))
+        else:
+            positions = self._candidates_in_box(centre - radius, centre + radius)
+            distances = np.hypot(*(self.xy[positions] - centre).T)
+            positions = positions[distances <= radius]
+        return self.ids[positions.astype(np.int64)]
+
+    def within_polygon(self, polygon: np.ndarray) -> np.ndarray:
+        """ Receptor IDs inside a polygon (ray casting, vectorised over the receptors within the polygon's bounding box)
+
+        Args:
+            polygon (np.ndarray): 2D array of polygon vertices (X, Y)
+
+        Returns:
+            np.ndarray: Receptor IDs inside the polygon
+        """
+        polygon = np.asarray(polygon, dtype=float).reshape(-1, 2)
+        minimum, maximum = polygon.min(axis=0), polygon.max(axis=0)
+
+        if self._tree is not None:
+            centre = (minimum + maximum) / 2
+            positions = np.sort(
+                self._tree.query_ball_point(centre, np.hypot(*(maximum - centre)))
+            ).astype(np.int64)
+        else:
+            positions = self._candidates_in_box(minimum, maximum)
+
+        points = self.xy[positions]
+        inside = np.zeros(len(points), dtype=bool)
+        x, y = points[:, 0], points[:, 1]
+        for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+            crosses = (y1 > y) != (y2 > y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_intersect = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+            inside ^= crosses & (x < x_intersect)
+
+        return self.ids[positions[inside]]
+
+
+def read_polygon(file_path: str) -> np.ndarray:
+    """ Read polygon vertices from a table with X & Y columns (or the first two columns)
+
+    Args:
+        file_path (str): Path to csv or xlsx file
+
+    Returns:
+        np.ndarray: 2D array of polygon vertices
+    """
+    polygon_df = _read_large_dataset(file_path)
+    columns = {str(column).strip().lower(): column for column in polygon_df.columns}
+    if "x" in columns and "y" in columns:
+        return polygon_df[[columns["x"], columns["y"]]].to_numpy(dtype=float)
+    return polygon_df.iloc[:, :2].to_numpy(dtype=float)
+
+
+def spatial_receptors(
+    settings: typing.Dict[str, typing.Any]
+) -> typing.Optional[typing.List[str]]:
+    """ Receptor IDs selected by the spatial options from user input in Gooey (locations_file with either a radius around a point or a polygon file)
+
+    Args:
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Raises:
+        ValueError: If a locations file is provided without a radius or polygon
+
+    Returns:
+        typing.Optional[typing.List[str]]: Selected receptor IDs, None if no spatial subset was requested
+    """
+    if not settings.get("locations_file"):
+        return None
+
+    locations = ReceptorLocations.read(settings["locations_file"])
+
+    if settings.get("polygon_file"):
+        receptors = locations.within_polygon(read_polygon(settings["polygon_file"]))
+    elif settings.get("radius"):
+        receptors = locations.within_radius(
+            float(settings["centre_x"]), float(settings["centre_y"]), float(settings["radius"])
+        )
+    else:
+        raise ValueError(
+            "Provide either a radius (with centre X & Y) or a polygon file to select receptors by location"
+        )
+
+    print(f"Selected {len(receptors)} of {len(locations)} receptors by location")
+    return receptors.tolist()
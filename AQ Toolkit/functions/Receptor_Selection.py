@@ -0,0 +1,74 @@
+""" Receptor selection, combines receptor ID lists, a column of IDs in a configuration file and spatial subsets into the receptors to read for analysis commands
+"""
+
+import typing
+
+from .File_Utilties import _read_large_dataset
+from .Receptor_Geometry import spatial_receptors
+
+
+def parse_receptor_ids(receptor_ids: str) -> typing.List[str]:
+    """ Parse a list of receptor IDs separated by commas, numeric ranges are expanded (eg '1, 4, 10-12' returns 1, 4, 10, 11, 12)
+
+    Args:
+        receptor_ids (str): Receptor IDs separated by commas
+
+    Returns:
+        typing.List[str]: Receptor IDs
+    """
+    receptors = []
+    for receptor in receptor_ids.split(","):
+        receptor = receptor.strip()
+        if not receptor:
+            continue
+        start, _, end = receptor.partition("-")
+        if start.strip().isdigit() and end.strip().isdigit():
+            receptors.extend(
+                str(number) for number in range(int(start), int(end) + 1)
+            )
+        else:
+            receptors.append(receptor)
+    return receptors
+
+
+def selected_receptors(
+    settings: typing.Dict[str, typing.Any]
+) -> typing.Optional[typing.List[str]]:
+    """ Receptor IDs selected by the receptor selection options from user input in Gooey. When more than one option is provided only receptors selected by all of them are kept.
+        Regular expressions are matched against the column names when reading (see `receptor_regex`)
+
+    Args:
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Returns:
+        typing.Optional[typing.List[str]]: Selected receptor IDs, None if every receptor should be read
+    """
+    selections = []
+
+    if settings.get("receptor_ids"):
+        selections.append(parse_receptor_ids(settings["receptor_ids"]))
+
+    if settings.get("receptor_config"):
+        config_df = _read_large_dataset(settings["receptor_config"])
+        column = settings.get("receptor_col_name") or config_df.columns[0]
+        receptor_column = config_df[column].dropna()
+        if receptor_column.dtype.kind == "f" and (receptor_column % 1 == 0).all():
+            # Whole numbers read as floats (eg 12.0) to match column names like 12
+            receptor_column = receptor_column.astype(int)
+        selections.append(receptor_column.astype(str).str.strip().tolist())
+
+    spatial_selection = spatial_receptors(settings)
+    if spatial_selection is not None:
+        selections.append(spatial_selection)
+
+    if len(selections) == 0:
+        return None
+
+    # Keep the order of the first selection
+    receptors = selections[0]
+    for selection in selections[1:]:
+        selection = set(selection)
+        receptors = [receptor for receptor in receptors if receptor in selection]
+
+    print(f"Selected {len(receptors)} receptors")
+    return receptors
@@ -0,0 +1,318 @@
+""" Shared memory arrays for process pools, a large array is copied into shared memory once and workers attach to it by name rather than receiving a pickled copy
+"""
+
+import typing
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+class SharedArray:
+    """ NumPy array backed by shared memory. The process creating it owns the memory and removes it on close, workers attach with the (picklable) spec
+
+    Args:
+        shape (typing.Tuple[int, ...]): Shape of the array
+        dtype (typing.Any): Data type of the array
+        name (typing.Optional[str], optional): Name of existing shared memory to attach to. Defaults to None (create new shared memory).
+    """
+
+    def __init__(
+        self,
+        shape: typing.Tuple[int, ...],
+        dtype: typing.Any,
+        name: typing.Optional[str] = None,
+    ):
+        self.shape = tuple(int(size) for size in shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        if self.owner:
+            # Shared memory can't be empty
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # Pool workers share the resource tracker of the process that created the memory, so it is only removed once
+            self._memory = shared_memory.SharedMemory(name=name)
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._memory.buf)
+
+    @classmethod
+    def copy_of(cls, array: np.ndarray) -> "SharedArray":
+        """ Create shared memory holding a copy of an array
+
+        Args:
+            array (np.ndarray): Array to copy
+
+        Returns:
+            SharedArray: Shared array owned by this process
+        """
+        array = np.asarray(array)
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @property
+    def spec(self) -> typing.Tuple[str, typing.Tuple[int, ...], str]:
+        """ Name, shape and data type to pass to workers so they can attach
+        """
+        return self._memory.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec: typing.Tuple[str, typing.Tuple[int, ...], str]) -> "SharedArray":
+        """ Attach to shared memory created by another process
+
+        Args:
+            spec (typing.Tuple[str, typing.Tuple[int, ...], str]): Spec of the shared array
+
+        Returns:
+            SharedArray: Shared array (not owned by this process)
+        """
+        name, shape, dtype = spec
+        return cls(shape, dtype, name)
+
+    def close(self):
+        """ Release this process's view, the owner also removes the shared memory
+        """
+        # The view must be released before the memory can be closed
+        self.array = None
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _shareable(values: np.ndarray) -> np.ndarray:
+    """ Array that can be held in shared memory, text (object) columns are converted to fixed width strings
+
+    Args:
+        values (np.ndarray): Array to share
+
+    Returns:
+        np.ndarray: Array with a fixed size data type
+    """
+    values = np.asarray(values)
+    if values.dtype.hasobject:
+        return values.astype(str)
+    return values
+
+
+class SharedTimeseries:
+    """ Timeseries (header columns, row labels and receptor matrix) published to shared memory once so a pool of workers can read it without pickled copies.
+        Workers attach with the spec and get zero-copy NumPy views, or a DataFrame built on those views
+
+    Args:
+        values (SharedArray): Rows by receptors values
+        columns (typing.List): Receptor column names
+        header (typing.Optional[typing.Dict[typing.Any, SharedArray]], optional): Header columns (eg YYYY, JDY, HHMM). Defaults to None.
+        index (typing.Optional[SharedArray], optional): Row labels. Defaults to None (0 to number of rows).
+    """
+
+    def __init__(
+        self,
+        values: SharedArray,
+        columns: typing.List,
+        header: typing.Optional[typing.Dict[typing.Any, SharedArray]] = None,
+        index: typing.Optional[SharedArray] = None,
+    ):
+        self._values = values
+        self.columns = list(columns)
+        self._header = header or {}
+        self._index = index
+
+    @classmethod
+    def publish(
+        cls,
+        data: typing.Union[pd.DataFrame, np.ndarray],
+        header: typing.Optional[pd.DataFrame] = None,
+        columns: typing.Optional[typing.List] = None,
+        dtype: typing.Any = None,
+    ) -> "SharedTimeseries":
+        """ Copy a timeseries into shared memory, anything already created is removed if publishing fails
+
+        Args:
+            data (typing.Union[pd.DataFrame, np.ndarray]): Receptor data (rows by receptors)
+            header (typing.Optional[pd.DataFrame], optional): Header columns with the same rows. Defaults to None.
+            columns (typing.Optional[typing.List], optional): Receptor column names, taken from the DataFrame if not provided. Defaults to None.
+            dtype (typing.Any, optional): Data type of the receptor values. Defaults to None (data type of the data).
+
+        Returns:
+            SharedTimeseries: Shared timeseries owned by this process
+        """
+        if columns is None:
+            columns = list(data.columns) if isinstance(data, pd.DataFrame) else list(
+                range(np.shape(data)[1])
+            )
+        index = data.index if isinstance(data, pd.DataFrame) else None
+
+        created = []
+        try:
+            values = SharedArray.copy_of(np.asarray(data, dtype=dtype))
+            created.append(values)
+
+            shared_header = {}
+            if header is not None:
+                for column in header.columns:
+                    shared_header[column] = SharedArray.copy_of(
+                        _shareable(header[column].to_numpy())
+                    )
+                    created.append(shared_header[column])
+
+            shared_index = None
+            if index is not None and not index.equals(pd.RangeIndex(len(index))):
+                shared_index = SharedArray.copy_of(_shareable(index.to_numpy()))
+                created.append(shared_index)
+        except BaseException:
+            for shared in created:
+                shared.close()
+            raise
+
+        return cls(values, columns, shared_header, shared_index)
+
+    @classmethod
+    def allocate(
+        cls, rows: int, columns: typing.List, dtype: typing.Any = np.float64
+    ) -> "SharedTimeseries":
+        """ Create an empty (uninitialised) shared timeseries for workers to write into
+
+        Args:
+            rows (int): Number of rows
+            columns (typing.List): Receptor column names
+            dtype (typing.Any, optional): Data type of the receptor values. Defaults to np.float64.
+
+        Returns:
+            SharedTimeseries: Shared timeseries owned by this process
+        """
+        return cls(SharedArray((rows, len(columns)), dtype), columns)
+
+    @property
+    def spec(self) -> typing.Dict[str, typing.Any]:
+        """ Picklable description for workers to attach with
+        """
+        return {
+            "values": self._values.spec,
+            "columns": self.columns,
+            "header": {column: shared.spec for column, shared in self._header.items()},
+            "index": None if self._index is None else self._index.spec,
+        }
+
+    @classmethod
+    def attach(cls, spec: typing.Dict[str, typing.Any]) -> "SharedTimeseries":
+        """ Attach to a shared timeseries published by another process
+
+        Args:
+            spec (typing.Dict[str, typing.Any]): Spec of the shared timeseries
+
+        Returns:
+            SharedTimeseries: Shared timeseries (not owned by this process)
+        """
+        attached = []
+        try:
+            values = SharedArray.attach(spec["values"])
+            attached.append(values)
+            header = {}
+            for column, header_spec in spec["header"].items():
+                header[column] = SharedArray.attach(header_spec)
+                attached.append(header[column])
+            index = None
+            if spec["index"] is not None:
+                index = SharedArray.attach(spec["index"])
+                attached.append(index)
+        except BaseException:
+            for shared in attached:
+                shared.close()
+            raise
+        return cls(values, spec["columns"], header, index)
+
+    @property
+    def values(self) -> np.ndarray:
+        """ Zero-copy view of the rows by receptors values
+        """
+        return self._values.array
+
+    @property
+    def shape(self) -> typing.Tuple[int, int]:
+        return self._values.shape
+
+    @property
+    def index(self) -> pd.Index:
+        if self._index is None:
+            return pd.RangeIndex(self.shape[0])
+        return pd.Index(self._index.array)
+
+    @property
+    def header(self) -> pd.DataFrame:
+        """ Header columns (built on the shared views)
+        """
+        return pd.DataFrame(
+            {column: shared.array for column, shared in self._header.items()},
+            index=self.index,
+            copy=False,
+        )
+
+    def frame(self, start: int = 0, stop: typing.Optional[int] = None) -> pd.DataFrame:
+        """ DataFrame of the receptor values (or a slice of receptor columns) built on the shared view without copying
+
+        Args:
+            start (int, optional): Position of the first receptor. Defaults to 0.
+            stop (typing.Optional[int], optional): Position after the last receptor. Defaults to None (all receptors).
+
+        Returns:
+            pd.DataFrame: Receptor data
+        """
+        return pd.DataFrame(
+            self.values[:, start:stop],
+            columns=self.columns[start:stop],
+            index=self.index,
+            copy=False,
+        )
+
+    def close(self):
+        """ Release the views, the owner also removes the shared memory
+        """
+        for shared in [self._values, self._index] + list(self._header.values()):
+            if shared is not None:
+                shared.close()
+
+    def __enter__(self) -> "SharedTimeseries":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def as_frame(
+    data: typing.Union[pd.DataFrame, SharedTimeseries, np.ndarray]
+) -> pd.DataFrame:
+    """ Receptor data as a DataFrame, shared timeseries and arrays are wrapped without copying so toolkit functions can take either
+
+    Args:
+        data (typing.Union[pd.DataFrame, SharedTimeseries, np.ndarray]): Receptor data
+
+    Returns:
+        pd.DataFrame: Receptor data
+    """
+    if isinstance(data, SharedTimeseries):
+        return data.frame()
+    if isinstance(data, np.ndarray):
+        return pd.DataFrame(data, copy=False)
+    return data
+
+
+def receptor_shards(receptors: int, workers: int) -> typing.List[typing.Tuple[int, int]]:
+    """ Split receptor columns into contiguous shards, a few per worker to balance the load
+
+    Args:
+        receptors (int): Number of receptor columns
+        workers (int): Number of worker processes
+
+    Returns:
+        typing.List[typing.Tuple[int, int]]: Start and stop position of each shard
+    """
+    boundaries = np.linspace(0, receptors, min(workers * 4, receptors) + 1).astype(int)
+    return list(zip(boundaries[:-1].tolist(), boundaries[1:].tolist()))
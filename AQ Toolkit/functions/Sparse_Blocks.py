@@ -0,0 +1,123 @@
+""" Block-sparse receptor values for timeseries with many all-zero receptors (eg GRAL source groups, where the file also carries columns for other source groups and most receptors are only affected for some hours).
+    A chunk of hours keeps only the receptor columns with a non-zero value in it, weights and factors are only applied to the kept block and sums only add it
+"""
+
+import typing
+
+import numpy as np
+
+# Chunks with more non-zero columns than this are kept dense, adding a column block costs several times more per value than a dense add
+SPARSE_DENSITY = 0.1
+
+
+class SparseChunk:
+    """ Receptor values of a chunk of hours with the all-zero receptor columns dropped, the rest are kept as runs of adjacent columns
+
+    Args:
+        runs (typing.List[typing.Tuple[int, int]]): Start and stop position of each run of kept receptor columns
+        values (np.ndarray): Hours by kept receptor values (runs side by side)
+        width (int): Number of receptor columns including the dropped ones
+    """
+
+    def __init__(self, runs: typing.List[typing.Tuple[int, int]], values: np.ndarray, width: int):
+        self.runs = runs
+        self.values = values
+        self.width = int(width)
+
+    @property
+    def shape(self) -> typing.Tuple[int, int]:
+        return self.values.shape[0], self.width
+
+    @property
+    def density(self) -> float:
+        """ Fraction of the receptor columns kept
+        """
+        return self.values.shape[1] / self.width if self.width else 0.0
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __mul__(self, other: typing.Union[float, np.ndarray]) -> "SparseChunk":
+        # Scalar weights and hour of day factors (hours by 1) only apply to the kept block, the rest stay zero
+        return SparseChunk(self.runs, self.values * other, self.width)
+
+    def _blocks(self) -> typing.Iterator[typing.Tuple[slice, np.ndarray]]:
+        """ Receptor columns of each run with its block of values
+        """
+        offset = 0
+        for start, stop in self.runs:
+            yield slice(start, stop), self.values[:, offset : offset + stop - start]
+            offset += stop - start
+
+    def dense(self) -> np.ndarray:
+        """ Values with the dropped columns filled back in as zero
+        """
+        values = np.zeros(self.shape, dtype=self.values.dtype)
+        for columns, block in self._blocks():
+            values[:, columns] = block
+        return values
+
+    def add_to(self, total: np.ndarray):
+        """ Add the kept blocks to a total in place
+        """
+        for columns, block in self._blocks():
+            total[:, columns] += block
+
+
+def compress_zero_columns(
+    values: np.ndarray, max_density: float = SPARSE_DENSITY
+) -> typing.Union[SparseChunk, np.ndarray]:
+    """ Drop the all-zero receptor columns of a chunk if few enough columns are left
+
+    Args:
+        values (np.ndarray): Hours by receptor values
+        max_density (float, optional): Largest fraction of non-zero columns to store sparse. Defaults to SPARSE_DENSITY.
+
+    Returns:
+        typing.Union[SparseChunk, np.ndarray]: Sparse chunk, or the values unchanged if too many columns are non-zero
+    """
+    if values.ndim != 2 or values.shape[1] == 0:
+        return values
+    # NaN counts as non-zero so it is carried through as with dense values
+    columns = np.flatnonzero(values.any(axis=0))
+    if len(columns) > max_density * values.shape[1]:
+        return values
+    if len(columns) == 0:
+        return SparseChunk([], values[:, :0], values.shape[1])
+
+    breaks = np.flatnonzero(np.diff(columns) != 1) + 1
+    starts = columns[np.r_[0, breaks]]
+    stops = columns[np.r_[breaks - 1, len(columns) - 1]] + 1
+    return SparseChunk(
+        list(zip(starts.tolist(), stops.tolist())), values[:, columns], values.shape[1]
+    )
+
+
+def to_dense(
+    values: typing.Union[SparseChunk, np.ndarray], copy: bool = False
+) -> np.ndarray:
+    """ Receptor values as a dense array
+
+    Args:
+        values (typing.Union[SparseChunk, np.ndarray]): Sparse or dense values
+        copy (bool, optional): Always return a new array. Defaults to False.
+
+    Returns:
+        np.ndarray: Hours by receptor values
+    """
+    if isinstance(values, SparseChunk):
+        return values.dense()
+    return values.copy() if copy else values
+
+
+def add_into(total: np.ndarray, values: typing.Union[SparseChunk, np.ndarray]):
+    """ Add receptor values to a total in place, only the kept blocks of a sparse chunk are added
+
+    Args:
+        total (np.ndarray): Hours by receptor total to add to
+        values (typing.Union[SparseChunk, np.ndarray]): Values with the same shape as the total
+    """
+    if isinstance(values, SparseChunk):
+        values.add_to(total)
+    else:
+        np.add(total, values, out=total)
@@ -6,7 +6,9 @@ Returns:
 
 import pandas as pd
 import typing
-from .File_Utilties import _read_large_dataset
+from .File_Utilties import _read_timeseries, _receptor_usecols
+from .Shared_Arrays import SharedTimeseries, as_frame, receptor_shards
+from .Time_Index import TimeIndex, AveragingPeriods
 
 
 def statstics_generator(settings: typing.Dict[str, typing.Any]) -> pd.DataFrame:
@@ -19,14 +21,82 @@ def statstics_generator(settings: typing.Dict[str, typing.Any]) -> pd.DataFrame:
         pd.DataFrame: Compiled statistics results
     """
 
-    data = _read_large_dataset(settings["path"], 2000)
+    # A statistics spec is compiled before reading so a typo doesn't wait on a large file
+    if settings.get("statistics_spec"):
+        from .Statistics_Plan import StatisticsPlan
 
-    data = data.fillna(float(settings["fill_invalid_value"]))
+        print(f"Statistics plan: {StatisticsPlan.compile(settings['statistics_spec']).describe()}")
 
-    data = data.iloc[:, int(settings["header_length"]) :]
-    data = data[int(settings["top_header_length"]):]
-    data.reset_index(inplace=True, drop=True)
-    data = data.apply(pd.to_numeric, errors='coerce')
+    # Only parse the columns of selected receptors (ID list, regex or spatial subset)
+    read_kwargs = {}
+    if settings.get("receptors") is not None or settings.get("receptor_regex"):
+        read_kwargs["usecols"] = _receptor_usecols(
+            settings["path"],
+            settings["header_length"],
+            settings.get("receptors"),
+            settings.get("receptor_regex"),
+        )
+
+    # Receptor columns are converted to floats as they are read (float32 halves memory)
+    timeseries = _read_timeseries(
+        settings["path"],
+        settings["header_length"],
+        settings["top_header_length"],
+        settings.get("precision") or "float64",
+        float(settings["fill_invalid_value"]),
+        **read_kwargs,
+    )
+
+    # Missing hours are added (and repeated hours dropped) so averaging periods line up with the real hours
+    gap_fill = settings.get("gap_fill") or "none"
+    if gap_fill != "none":
+        from .Time_Integrity import complete_hours
+
+        timeseries = complete_hours(
+            timeseries,
+            gap_fill,
+            float(settings["fill_invalid_value"]),
+            settings.get("header_format", "auto"),
+            str(settings["path"]),
+        )
+
+    # Statistics only need a view of the receptor values, the header is passed alongside
+    data = timeseries.receptor_frame()
+    workers = int(settings.get("workers") or 1)
+    if workers > 1 and data.shape[1] > 1:
+        return _parallel_statistics(timeseries.header, data, settings, workers)
+    return compute_statistics(timeseries.header, data, settings)
+
+
+def compute_statistics(
+    header: typing.Optional[pd.DataFrame],
+    data: typing.Union[pd.DataFrame, SharedTimeseries],
+    settings: typing.Dict[str, typing.Any],
+) -> pd.DataFrame:
+    """ Compute the statistics selected in settings for every receptor column, a statistics spec (see Statistics_Plan) replaces the individual statistics
+
+    Args:
+        header (typing.Optional[pd.DataFrame]): Header columns (eg YYYY, JDY, HHMM), taken from the shared timeseries if None
+        data (typing.Union[pd.DataFrame, SharedTimeseries]): Receptor data, or a shared timeseries view
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Returns:
+        pd.DataFrame: Compiled statistics results
+    """
+    if header is None and isinstance(data, SharedTimeseries):
+        header = data.header
+    data = as_frame(data)
+
+    start_hour = 0
+    if settings['start_hour']:
+        start_hour = int(settings['start_hour'])
+
+    if settings.get("statistics_spec"):
+        from .Statistics_Plan import StatisticsPlan
+
+        return StatisticsPlan.compile(settings["statistics_spec"]).frame(
+            header, data, settings.get("header_format", "auto"), start_hour
+        )
 
     outdf = pd.DataFrame()
 
@@ -65,20 +135,134 @@ def statstics_generator(settings: typing.Dict[str, typing.Any]) -> pd.DataFrame:
             }
         )
         outdf = pd.concat([temp_df, outdf], axis=1, sort=False)
-    start_hour = 0
-    if settings['start_hour']:
-        start_hour = int(settings['start_hour'])
     if settings["custom_hrs_mean"]:
         col_name = "Maximum " + str(settings["custom_hrs_mean"]) + " Hour Average of Sensor"
-        resample_period = str(settings["custom_hrs_mean"]) + "H"
-        temp_data = data.copy()
-        import datetime as dt
-        start_date = dt.datetime(year=2021, month=1, day=1, hour=start_hour)
-        dates = pd.date_range(start=start_date, freq='H', periods=len(temp_data))
-        temp_data.index = dates
-        # temp_data = temp_data.apply(pd.to_numeric, errors='coerce')
-        temp_df = pd.DataFrame({col_name: temp_data.resample(resample_period).mean().max()})
+        # Periods come from the header timestamps when available, otherwise consecutive hours from the start hour
+        time_index = TimeIndex.from_header(
+            header, settings.get("header_format", "auto"), start_hour
+        )
+        periods = AveragingPeriods.block(time_index, int(settings["custom_hrs_mean"]))
+        temp_df = pd.DataFrame(
+            {col_name: periods.max_mean(data.to_numpy())},
+            index=data.columns,
+        )
         outdf = pd.concat([temp_df, outdf], axis=1, sort=False)
     outdf.insert(0, "Index", "")
     outdf["Index"] = data.columns
     return outdf
+
+
+def _statistics_shard(
+    spec: typing.Dict[str, typing.Any],
+    start: int,
+    stop: int,
+    settings: typing.Dict[str, typing.Any],
+) -> pd.DataFrame:
+    """ Statistics for a shard of receptor columns of a shared timeseries (run in a worker process)
+
+    Args:
+        spec (typing.Dict[str, typing.Any]): Spec of the shared timeseries
+        start (int): Position of the first receptor in the shard
+        stop (int): Position after the last receptor in the shard
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Returns:
+        pd.DataFrame: Statistics for the receptors in the shard
+    """
+    with SharedTimeseries.attach(spec) as shared:
+        # Statistics are new arrays so nothing refers to the shared memory once the shard is done
+        return compute_statistics(shared.header, shared.frame(start, stop), settings)
+
+
+def _parallel_statistics(
+    header: pd.DataFrame,
+    data: pd.DataFrame,
+    settings: typing.Dict[str, typing.Any],
+    workers: int,
+) -> pd.DataFrame:
+    """ Compute statistics for shards of receptor columns across a pool of processes, the data is published to shared memory once rather than pickled to every worker
+
+    Args:
+        header (pd.DataFrame): Header columns (eg YYYY, JDY, HHMM)
+        data (pd.DataFrame): Receptor data
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+        workers (int): Number of processes to use
+
+    Returns:
+        pd.DataFrame: Compiled statistics results (same receptor order as the data)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = receptor_shards(data.shape[1], workers)
+    print(f"Computing statistics for {data.shape[1]} receptors in {len(shards)} shards across {workers} processes")
+
+    with SharedTimeseries.publish(data, header) as shared:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_statistics_shard, shared.spec, start, stop, settings)
+                for start, stop in shards
+            ]
+            results = [future.result() for future in futures]
+
+    return pd.concat(results, axis=0)
+
+
+def _long_format_statistics(
+    file_path: str, settings: typing.Dict[str, typing.Any]
+) -> pd.DataFrame:
+    """ Compute statistics for a single file and return them in long format (File, Receptor, Statistic, Value)
+
+    Args:
+        file_path (str): Path to data set to compute statistics upon
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Returns:
+        pd.DataFrame: Statistics in long format
+    """
+    file_settings = dict(settings)
+    file_settings["path"] = file_path
+    # Files are already spread across the pool, receptors of each file are computed in the worker
+    file_settings["workers"] = 1
+
+    outdf = statstics_generator(file_settings)
+
+    outdf = outdf.melt(id_vars="Index", var_name="Statistic", value_name="Value")
+    outdf = outdf.rename(columns={"Index": "Receptor"})
+    outdf["Receptor"] = outdf["Receptor"].astype(str)
+    outdf["Value"] = pd.to_numeric(outdf["Value"], errors="coerce")
+    outdf.insert(0, "File", str(file_path))
+    return outdf
+
+
+def batch_statistics(
+    file_list: typing.List[str],
+    settings: typing.Dict[str, typing.Any],
+    max_workers: typing.Optional[int] = None,
+) -> pd.DataFrame:
+    """ Compute the same statistics for many time series datasets across a pool of processes
+
+    Args:
+        file_list (typing.List[str]): Paths to data sets to compute statistics upon
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey (path is replaced by each file)
+        max_workers (typing.Optional[int], optional): Number of processes to use, None will use all processors. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Consolidated statistics in long format (File, Receptor, Statistic, Value)
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from .File_Utilties import gooey_tqdm
+
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_long_format_statistics, file_path, settings): file_path
+            for file_path in file_list
+        }
+        for future in gooey_tqdm(as_completed(futures), total=len(futures)):
+            file_path = futures[future]
+            print(f"Computed statistics for {file_path}")
+            results[file_path] = future.result()
+
+    # Keep the order of the input files regardless of the order they finished
+    return pd.concat([results[file_path] for file_path in file_list], ignore_index=True)
@@ -0,0 +1,369 @@
+""" Statistics spec language compiled to a single execution plan, eg "max(rolling(8h)); p99.9(1h); mean(block(24h, start=1)); count(>246)".
+    Each statement is an aggregate of a source series (hourly values, rolling means or block means). Shared intermediates (the running sums behind every rolling window,
+    the block means, the valid counts and the sorted column behind every percentile) are computed once, and all metrics come out of one pass over blocks of receptor columns
+"""
+
+import re
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .Kernels import rolling_means, sort_columns
+from .Time_Index import AveragingPeriods, TimeIndex
+
+# Receptor columns evaluated at a time, bounds the memory of the intermediates (rows × columns for each source)
+PLAN_COLUMNS = 512
+
+
+def _available_aggregates() -> typing.List[str]:
+    return ["max", "min", "mean", "median", "pNN", "count"]
+
+
+class Source(typing.NamedTuple):
+    """ Series an aggregate is taken over
+
+    Args:
+        kind (str): hourly, rolling (rolling mean over a number of rows) or block (mean of fixed blocks of hours, see AveragingPeriods.block)
+        hours (int, optional): Length of the rolling window or block. Defaults to 1.
+        start (int, optional): Hour of day blocks are aligned to. Defaults to 0.
+    """
+
+    kind: str
+    hours: int = 1
+    start: int = 0
+
+    @property
+    def label(self) -> str:
+        if self.kind == "hourly":
+            return "1h"
+        if self.kind == "rolling":
+            return f"rolling({self.hours}h)"
+        if self.start:
+            return f"block({self.hours}h, start={self.start})"
+        return f"block({self.hours}h)"
+
+
+class Metric(typing.NamedTuple):
+    """ A single statement of a statistics spec
+
+    Args:
+        aggregate (str): max, min, mean, percentile or count
+        source (Source): Series the aggregate is taken over
+        value (typing.Optional[float], optional): Percentile (0 - 100) or count threshold. Defaults to None.
+        operator (typing.Optional[str], optional): Comparison of a count (>, >=, < or <=). Defaults to None.
+    """
+
+    aggregate: str
+    source: Source
+    value: typing.Optional[float] = None
+    operator: typing.Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        """ Canonical text of the statement, used as its column name
+        """
+        if self.aggregate == "percentile":
+            return f"p{self.value:g}({self.source.label})"
+        if self.aggregate == "count":
+            if self.source.kind == "hourly":
+                return f"count({self.operator}{self.value:g})"
+            return f"count({self.operator}{self.value:g}, {self.source.label})"
+        return f"{self.aggregate}({self.source.label})"
+
+
+_COMPARISONS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+
+def _split_arguments(text: str) -> typing.List[str]:
+    """ Split on commas outside brackets
+    """
+    arguments, depth, current = [], 0, ""
+    for character in text:
+        if character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+        if character == "," and depth == 0:
+            arguments.append(current.strip())
+            current = ""
+        else:
+            current += character
+    if current.strip():
+        arguments.append(current.strip())
+    return arguments
+
+
+def _parse_hours(text: str, statement: str) -> int:
+    match = re.fullmatch(r"(\d+)\s*h?", text.strip())
+    if match is None or int(match.group(1)) <= 0:
+        raise ValueError(f"Statistic '{statement}': {text} is not a positive number of hours (eg 8h)")
+    return int(match.group(1))
+
+
+def _parse_source(text: str, statement: str) -> Source:
+    """ Parse a source: 1h, rolling(Nh) or block(Nh[, start=K])
+    """
+    text = text.strip()
+    if text == "" or re.fullmatch(r"1\s*h?", text):
+        return Source("hourly")
+
+    match = re.fullmatch(r"(rolling|block)\s*\((.*)\)", text)
+    if match is None:
+        raise ValueError(
+            f"Statistic '{statement}': unknown series {text}, use 1h, rolling(Nh) or block(Nh, start=K)"
+        )
+    kind = match.group(1)
+    arguments = _split_arguments(match.group(2))
+    if len(arguments) == 0:
+        raise ValueError(f"Statistic '{statement}': {kind} needs a number of hours (eg {kind}(8h))")
+    hours = _parse_hours(arguments[0], statement)
+
+    start = 0
+    for argument in arguments[1:]:
+        option = re.fullmatch(r"start\s*=\s*(-?\d+)", argument)
+        if kind != "block" or option is None:
+            raise ValueError(f"Statistic '{statement}': unknown option {argument} for {kind}")
+        start = int(option.group(1))
+    if kind == "rolling" and hours == 1:
+        return Source("hourly")
+    return Source(kind, hours, start)
+
+
+def parse_statement(statement: str) -> Metric:
+    """ Parse a single statement of a statistics spec (eg p99.9(1h) or count(>246, rolling(8h)))
+
+    Args:
+        statement (str): Statement to parse
+
+    Raises:
+        ValueError: If the statement is not valid, the message says which part
+
+    Returns:
+        Metric: Parsed statement
+    """
+    text = statement.strip().lower()
+    match = re.fullmatch(r"([a-z]+|p\d+(?:\.\d+)?)\s*(?:\((.*)\))?", text)
+    if match is None:
+        raise ValueError(f"Statistic '{statement}' is not of the form aggregate(series), eg max(rolling(8h))")
+    name, arguments = match.group(1), _split_arguments(match.group(2) or "")
+
+    if name == "count":
+        comparison = re.fullmatch(r"(>=|<=|>|<)\s*(-?\d+(?:\.\d+)?(?:e-?\d+)?)", arguments[0]) if arguments else None
+        if comparison is None:
+            raise ValueError(f"Statistic '{statement}': count needs a comparison (eg count(>246))")
+        if len(arguments) > 2:
+            raise ValueError(f"Statistic '{statement}': count takes a comparison and a series")
+        source = _parse_source(arguments[1] if len(arguments) == 2 else "", statement)
+        return Metric("count", source, float(comparison.group(2)), comparison.group(1))
+
+    if len(arguments) > 1:
+        raise ValueError(f"Statistic '{statement}': {name} takes a single series")
+    source = _parse_source(arguments[0] if arguments else "", statement)
+
+    if name == "median":
+        return Metric("percentile", source, 50.0)
+    if name.startswith("p") and name[1:2].isdigit():
+        percentile = float(name[1:])
+        if percentile > 100:
+            raise ValueError(f"Statistic '{statement}': percentile must be between 0 and 100")
+        return Metric("percentile", source, percentile)
+    if name in ["max", "min", "mean"]:
+        return Metric(name, source)
+    raise ValueError(
+        f"Statistic '{statement}': aggregate {name} is not supported, use one of {', '.join(_available_aggregates())}"
+    )
+
+
+def _percentiles(
+    ordered: np.ndarray, valid: np.ndarray, percentiles: typing.List[float]
+) -> typing.List[np.ndarray]:
+    """ Percentiles with linear interpolation (as pandas quantile) from a column sorted with missing values last
+    """
+    results = []
+    for percentile in percentiles:
+        position = (percentile / 100) * np.maximum(valid - 1, 0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low = np.take_along_axis(ordered, lower[np.newaxis, :], axis=0)[0]
+        high = np.take_along_axis(ordered, upper[np.newaxis, :], axis=0)[0]
+        result = low + (high - low) * (position - lower)
+        results.append(np.where(valid > 0, result, np.nan))
+    return results
+
+
+class StatisticsPlan:
+    """ Execution plan of a statistics spec. Statements are grouped by the series they aggregate so each series (and its sort) is computed once per block of receptors
+
+    Args:
+        metrics (typing.List[Metric]): Statements in output order, repeats are dropped
+    """
+
+    def __init__(self, metrics: typing.List[Metric]):
+        labels = {}
+        for metric in metrics:
+            labels.setdefault(metric.label, metric)
+        self.metrics = list(labels.values())
+        if len(self.metrics) == 0:
+            raise ValueError("No statistics given in the statistics spec")
+
+        # Series in first use order, with the statements taken over each
+        self.sources = {}
+        for position, metric in enumerate(self.metrics):
+            self.sources.setdefault(metric.source, []).append(position)
+
+    @classmethod
+    def compile(cls, spec: str) -> "StatisticsPlan":
+        """ Compile a statistics spec, statements are separated by semicolons (or new lines)
+
+        Args:
+            spec (str): Statistics spec, eg "max(rolling(8h)); p99.9(1h); mean(block(24h, start=1)); count(>246)"
+
+        Raises:
+            ValueError: If any statement is not valid
+
+        Returns:
+            StatisticsPlan: Plan to evaluate
+        """
+        statements = [statement for statement in re.split(r"[;\n]", str(spec)) if statement.strip()]
+        return cls([parse_statement(statement) for statement in statements])
+
+    @property
+    def labels(self) -> typing.List[str]:
+        return [metric.label for metric in self.metrics]
+
+    def describe(self) -> str:
+        """ Series computed and the statements taken from each
+        """
+        return "; ".join(
+            f"{source.label} -> {', '.join(self.metrics[position].label for position in positions)}"
+            for source, positions in self.sources.items()
+        )
+
+    def needs_time_index(self) -> bool:
+        return any(source.kind == "block" for source in self.sources)
+
+    def _evaluate_block(
+        self,
+        values: np.ndarray,
+        periods: typing.Dict[Source, AveragingPeriods],
+        results: np.ndarray,
+        columns: slice,
+    ):
+        """ Evaluate every statement for a block of receptor columns
+        """
+        missing = np.isnan(values)
+        any_missing = bool(missing.any())
+
+        # Running sums shared by every rolling window
+        prefix, missing_prefix = None, None
+        if any(source.kind == "rolling" for source in self.sources):
+            prefix = np.zeros((values.shape[0] + 1, values.shape[1]))
+            np.cumsum(np.where(missing, 0, values) if any_missing else values, axis=0, out=prefix[1:])
+            if any_missing:
+                missing_prefix = np.zeros(prefix.shape, dtype=np.int64)
+                np.cumsum(missing, axis=0, out=missing_prefix[1:])
+
+        for source, positions in self.sources.items():
+            if source.kind == "hourly":
+                series = values
+            elif source.kind == "rolling":
+                # Leading partial windows are dropped rather than NaN, statistics skip them either way
+                series = rolling_means(prefix, missing_prefix, source.hours)
+            else:
+                series = periods[source].mean(values)
+
+            source_missing = missing if source.kind == "hourly" else np.isnan(series)
+            valid = series.shape[0] - source_missing.sum(axis=0)
+            ordered = None
+            totals = None
+
+            for position in positions:
+                metric = self.metrics[position]
+                if metric.aggregate == "count":
+                    results[position, columns] = _COMPARISONS[metric.operator](series, metric.value).sum(axis=0)
+                    continue
+                if series.shape[0] == 0:
+                    results[position, columns] = np.nan
+                elif metric.aggregate == "max":
+                    results[position, columns] = np.fmax.reduce(series, axis=0)
+                elif metric.aggregate == "min":
+                    results[position, columns] = np.fmin.reduce(series, axis=0)
+                elif metric.aggregate == "mean":
+                    if totals is None:
+                        totals = np.where(source_missing, 0, series).sum(axis=0)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        results[position, columns] = np.where(valid > 0, totals / valid, np.nan)
+                else:
+                    # Sorted once for every percentile of the series, missing values sort last
+                    if ordered is None:
+                        ordered = sort_columns(series)
+                    results[position, columns] = _percentiles(ordered, valid, [metric.value])[0]
+
+    def evaluate(
+        self,
+        values: np.ndarray,
+        time_index: typing.Optional[TimeIndex] = None,
+        block_columns: int = PLAN_COLUMNS,
+    ) -> np.ndarray:
+        """ Evaluate the plan over blocks of receptor columns, every statement of a block comes from the same pass
+
+        Args:
+            values (np.ndarray): Hours by receptors values
+            time_index (typing.Optional[TimeIndex], optional): Time index of the rows, needed for block series. Defaults to None.
+            block_columns (int, optional): Number of receptors to evaluate at a time. Defaults to PLAN_COLUMNS.
+
+        Raises:
+            ValueError: If a block series is asked for without a time index
+
+        Returns:
+            np.ndarray: Statements by receptors results
+        """
+        periods = {}
+        for source in self.sources:
+            if source.kind == "block":
+                if time_index is None:
+                    raise ValueError(f"{source.label} needs the timestamps of the data")
+                periods[source] = AveragingPeriods.block(time_index, source.hours, source.start)
+
+        values = np.asarray(values)
+        results = np.empty((len(self.metrics), values.shape[1]))
+        block_columns = max(1, int(block_columns))
+        for start in range(0, values.shape[1], block_columns):
+            columns = slice(start, min(start + block_columns, values.shape[1]))
+            self._evaluate_block(
+                np.asarray(values[:, columns], dtype=np.float64), periods, results, columns
+            )
+        return results
+
+    def frame(
+        self,
+        header: pd.DataFrame,
+        data: pd.DataFrame,
+        header_format: str = "auto",
+        start_hour: int = 0,
+    ) -> pd.DataFrame:
+        """ Statistics table with a row per receptor (Index) and a column per statement in spec order
+
+        Args:
+            header (pd.DataFrame): Header columns (eg YYYY, JDY, HHMM)
+            data (pd.DataFrame): Receptor data
+            header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+            start_hour (int, optional): Hour of the first row if the header has no timestamps. Defaults to 0.
+
+        Returns:
+            pd.DataFrame: Compiled statistics results
+        """
+        time_index = None
+        if self.needs_time_index():
+            time_index = TimeIndex.from_header(header, header_format, start_hour)
+        results = self.evaluate(data.to_numpy(), time_index)
+
+        outdf = pd.DataFrame(results.T, index=data.columns, columns=self.labels)
+        outdf.insert(0, "Index", list(data.columns))
+        return outdf
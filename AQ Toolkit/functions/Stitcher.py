@@ -7,6 +7,7 @@ Returns:
     pd.DataFrame: Summed DataFrame
 """
 import os
+import typing
 import pandas as pd
 import numpy as np
 from .File_Utilties import (
@@ -15,6 +16,7 @@ from .File_Utilties import (
     separate_header_data,
     prepend_header_dataframe,
 )
+from .Shared_Arrays import SharedTimeseries, as_frame
 
 
 def _validate_params(row: pd.Series):
@@ -60,15 +62,15 @@ def _clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def stitcher(
-    dataframe_1: pd.DataFrame,
-    dataframe_2: pd.DataFrame,
+    dataframe_1: typing.Union[pd.DataFrame, SharedTimeseries],
+    dataframe_2: typing.Union[pd.DataFrame, SharedTimeseries],
     columns_to_exclude_1: int,
     columns_to_exclude_2: int,
 ) -> pd.DataFrame:
 
-    dataframe_1 = _clean_dataset(dataframe_1)
+    dataframe_1 = _clean_dataset(as_frame(dataframe_1))
 
-    dataframe_2 = _clean_dataset(dataframe_2)
+    dataframe_2 = _clean_dataset(as_frame(dataframe_2))
 
     dataframe_header_1, data_1 = separate_header_data(dataframe_1, columns_to_exclude_1)
 
@@ -86,6 +88,72 @@ def stitcher(
     return prepend_header_dataframe(summed_df, dataframe_header_1)
 
 
+def batch_sum(
+    config_df: pd.DataFrame,
+    path_col_name: str = "Path",
+    scale_col_name: str = "Scale",
+    columns_to_exclude_col_name: str = "Columns to Exclude",
+    workers: int = 1,
+    output_path: typing.Optional[str] = None,
+    chunksize: int = 2000,
+    checkpoint_interval: int = 0,
+    checkpoint_path: typing.Optional[str] = None,
+    resume: bool = False,
+    apportion_hours: int = 0,
+    apportion_path: typing.Optional[str] = None,
+    dominant_path: typing.Optional[str] = None,
+) -> typing.Optional[pd.DataFrame]:
+    """ Sum data sets element-wise after multiplying each by its scale (a linear combination), the header of the first data set is kept.
+        With checkpoints the running sum is saved every few data sets so a failed run can be resumed.
+        With apportion hours, the highest hours of the sum at each receptor are apportioned to the data sets (scaled) in the same pass
+
+    Args:
+        config_df (pd.DataFrame): Configuration with the data set paths, scales and number of header columns
+        path_col_name (str, optional): Name of column containing data set paths. Defaults to "Path".
+        scale_col_name (str, optional): Name of column containing scales. Defaults to "Scale".
+        columns_to_exclude_col_name (str, optional): Name of column containing the number of header columns. Defaults to "Columns to Exclude".
+        workers (int, optional): Number of processes to read data sets with while the main process sums them. Defaults to 1 (streamed a chunk of hours at a time).
+        output_path (typing.Optional[str], optional): Location to write the sum to (csv, xlsx or parquet). Defaults to None (return it instead).
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+        checkpoint_interval (int, optional): Number of data sets summed between checkpoints. Defaults to 0 (no checkpoints).
+        checkpoint_path (typing.Optional[str], optional): Folder to keep the checkpoint in. Defaults to None (next to the output).
+        resume (bool, optional): Continue from the checkpoint of a failed run with the same configuration. Defaults to False.
+        apportion_hours (int, optional): Number of highest hours of the sum to apportion for each receptor. Defaults to 0 (no apportionment).
+        apportion_path (typing.Optional[str], optional): Location to write the apportionment table to. Defaults to None (the output path ending in _Apportionment).
+        dominant_path (typing.Optional[str], optional): Location to write the data set contributing most to every hour and receptor to. Defaults to None (not written).
+
+    Returns:
+        typing.Optional[pd.DataFrame]: Summed data with the header of the first data set if no output path is given
+    """
+    from .Checkpoint import checkpoint_settings
+    from .Linear_Combination import TimeseriesInput, linear_combination
+
+    inputs = [
+        TimeseriesInput(
+            row[path_col_name],
+            float(row[scale_col_name]),
+            "table",
+            int(row[columns_to_exclude_col_name]),
+        )
+        for _, row in config_df.iterrows()
+    ]
+    checkpoint_path, checkpoint_interval = checkpoint_settings(
+        output_path, checkpoint_interval, checkpoint_path, resume
+    )
+    return linear_combination(
+        inputs,
+        output_path,
+        chunksize=chunksize,
+        workers=workers,
+        checkpoint_path=checkpoint_path,
+        checkpoint_interval=checkpoint_interval,
+        resume=resume,
+        apportion_hours=apportion_hours,
+        apportion_path=apportion_path,
+        dominant_path=dominant_path,
+    )
+
+
 def old_stitcher(config_file_path: str) -> pd.DataFrame:
     """ Stitcher module to batch sum multiple time series datasets element wise
 
@@ -0,0 +1,251 @@
+""" Time concatenation joins timeseries split along the time axis (eg an annual CALPUFF or GRAL run in monthly parts) back into a single continuous timeseries.
+    Inputs are ordered by the timestamps in their header columns and checked for gaps and overlaps before anything is written, then streamed a chunk of hours at a time
+"""
+
+import os
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import _read_dataset_chunks
+from .Linear_Combination import (
+    TimeseriesInput,
+    _available_input_formats,
+    _CollectedFrame,
+    _gral_output_header,
+    _gral_read_options,
+    _output_format,
+    _read_gral_header_rows,
+    _read_input_chunks,
+    _TimeseriesWriter,
+)
+from .Preflight import PREFLIGHT_THREADS, preflight_problems, report_problems
+from .Time_Index import TimeIndex, _hour_label
+
+
+class TimeSpan(typing.NamedTuple):
+    """ Hours covered by an input
+
+    Args:
+        entry (TimeseriesInput): Input the hours are from
+        first (typing.Optional[int]): Hour key of the first row, None if the timestamps couldn't be read
+        last (typing.Optional[int]): Hour key of the last row, None if the timestamps couldn't be read
+        rows (int): Number of hours
+        problems (typing.List[str]): Problems with the hours of the input on its own (eg gaps)
+        hour_ending (bool, optional): Whether the hours were found to be hour ending (1 - 24). Defaults to False.
+    """
+
+    entry: TimeseriesInput
+    first: typing.Optional[int]
+    last: typing.Optional[int]
+    rows: int
+    problems: typing.List[str]
+    hour_ending: bool = False
+
+
+def _read_header_columns(entry: TimeseriesInput) -> pd.DataFrame:
+    """ Read only the header (date/hour) columns of an input
+
+    Args:
+        entry (TimeseriesInput): Input to read
+
+    Returns:
+        pd.DataFrame: Header columns of every row
+    """
+    header_length = int(entry.header_length)
+    if entry.format == "gral":
+        options = _gral_read_options(entry.path)
+        header = pd.read_csv(
+            entry.path,
+            sep=options["sep"],
+            encoding=options["encoding"],
+            header=None,
+            skiprows=int(entry.header_rows),
+            usecols=range(0, header_length),
+            dtype=str,
+        )
+        header.columns = _read_gral_header_rows(entry)[-1][:header_length]
+        return header
+
+    chunks = list(_read_dataset_chunks(entry.path, 20000, usecols=range(0, header_length)))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _step_problem(path: str, keys: np.ndarray) -> typing.Optional[str]:
+    """ Describe the first gap or repeated hour between consecutive rows of an input
+    """
+    steps = np.diff(keys)
+    broken = np.flatnonzero(steps != 1)
+    if len(broken) == 0:
+        return None
+    row = broken[0]
+    if steps[row] > 1:
+        description = f"{steps[row] - 1} missing hours after {_hour_label(keys[row])}"
+    else:
+        description = f"{_hour_label(keys[row + 1])} follows {_hour_label(keys[row])}"
+    return f"{path} is not continuous from data row {row + 2}: {description} ({len(broken)} breaks in total)"
+
+
+def time_span(entry: TimeseriesInput, header_format: str = "auto") -> TimeSpan:
+    """ Read the timestamps of an input from its header columns and check its hours are continuous
+
+    Args:
+        entry (TimeseriesInput): Input to check
+        header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+
+    Returns:
+        TimeSpan: First and last hour of the input and any problems found
+    """
+    path = str(entry.path)
+    try:
+        header = _read_header_columns(entry)
+        time_index = TimeIndex.from_header(header, header_format)
+    except (OSError, UnicodeError, ValueError, pd.errors.ParserError) as error:
+        return TimeSpan(entry, None, None, 0, [f"{path} timestamps couldn't be read ({error})"])
+
+    if not time_index.from_timestamps:
+        return TimeSpan(
+            entry,
+            None,
+            None,
+            len(time_index),
+            [f"{path} has no timestamp columns in its header ({', '.join(map(str, header.columns))})"],
+        )
+    if len(time_index) == 0:
+        return TimeSpan(entry, None, None, 0, [f"{path} has no data rows"])
+
+    keys = time_index.keys
+    step_problem = _step_problem(path, keys)
+    return TimeSpan(
+        entry,
+        int(keys[0]),
+        int(keys[-1]),
+        len(keys),
+        [] if step_problem is None else [step_problem],
+        time_index.hour_ending,
+    )
+
+
+def _join_problem(previous: TimeSpan, following: TimeSpan) -> typing.Optional[str]:
+    """ Describe a gap or overlap between an input and the input that follows it
+    """
+    expected = previous.last + 1
+    if following.first == expected:
+        return None
+    if following.first > expected:
+        return (
+            f"{following.first - expected} missing hours between {previous.entry.path} (ends {_hour_label(previous.last)}) "
+            f"and {following.entry.path} (starts {_hour_label(following.first)})"
+        )
+    return (
+        f"{expected - following.first} overlapping hours between {previous.entry.path} (ends {_hour_label(previous.last)}) "
+        f"and {following.entry.path} (starts {_hour_label(following.first)})"
+    )
+
+
+def ordered_spans(
+    inputs: typing.List[TimeseriesInput],
+    header_format: str = "auto",
+    threads: int = PREFLIGHT_THREADS,
+) -> typing.List[TimeSpan]:
+    """ Check a set of inputs join into a single continuous timeseries, the inputs can be given in any order.
+        Every problem is reported at once (missing files, different receptors, gaps or repeated hours within an input, then gaps or overlaps between inputs)
+
+    Args:
+        inputs (typing.List[TimeseriesInput]): Inputs to join
+        header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+        threads (int, optional): Number of files to check at a time. Defaults to PREFLIGHT_THREADS.
+
+    Raises:
+        ValueError: If any problems were found (all of them are listed)
+
+    Returns:
+        typing.List[TimeSpan]: Hours covered by each input in time order
+    """
+    # Inputs are joined one after the other so only the receptors have to match
+    problems = preflight_problems(inputs, True, threads, compare_rows=False)
+
+    # Missing files have already been reported
+    existing = [entry for entry in inputs if os.path.isfile(entry.path)]
+    with ThreadPoolExecutor(max_workers=max(1, min(int(threads), len(existing) or 1))) as executor:
+        spans = list(executor.map(lambda entry: time_span(entry, header_format), existing))
+    problems.extend(problem for span in spans for problem in span.problems)
+
+    spans = [span for span in spans if span.first is not None]
+    if any(span.hour_ending for span in spans):
+        # Hour ending is only detected from hour 24, short parts without it (eg a part ending before midnight) follow the rest
+        spans = [
+            span if span.hour_ending else span._replace(first=span.first - 1, last=span.last - 1, hour_ending=True)
+            for span in spans
+        ]
+    spans = sorted(spans, key=lambda span: span.first)
+    for previous, following in zip(spans[:-1], spans[1:]):
+        join_problem = _join_problem(previous, following)
+        if join_problem is not None:
+            problems.append(join_problem)
+
+    report_problems(problems, len(inputs))
+    return spans
+
+
+def time_concatenation(
+    inputs: typing.List[TimeseriesInput],
+    output_path: typing.Optional[str] = None,
+    output_format: typing.Optional[str] = None,
+    chunksize: int = 2000,
+    header_format: str = "auto",
+) -> typing.Optional[pd.DataFrame]:
+    """ Join timeseries covering consecutive periods (eg monthly runs of a year) into a single continuous timeseries.
+        Inputs are put in time order from their header columns (eg YYYY, JDY, HHMM or GRAL date and hour) and checked for gaps and overlaps before anything is written,
+        then each input is streamed to the output a chunk of hours at a time so the joined timeseries is never held in memory (unless no output path is given)
+
+    Args:
+        inputs (typing.List[TimeseriesInput]): Timeseries to join in any order, the weight of each is applied as with batch_sum
+        output_path (typing.Optional[str], optional): Location to write the joined timeseries to. Defaults to None (return it instead).
+        output_format (typing.Optional[str], optional): csv, xlsx, parquet or gral (see _available_output_formats). Defaults to None (from the output file extension).
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+        header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+
+    Raises:
+        ValueError: If there are no inputs, a format is not supported or the inputs don't join into a continuous timeseries
+
+    Returns:
+        typing.Optional[pd.DataFrame]: Joined timeseries if no output path is given
+    """
+    if len(inputs) == 0:
+        raise ValueError("No timeseries provided to join")
+    for entry in inputs:
+        if entry.format not in _available_input_formats():
+            raise ValueError(f"Timeseries format: {entry.format} is not supported")
+
+    spans = ordered_spans(inputs, header_format)
+    ordered = [span.entry for span in spans]
+
+    if output_path is None:
+        output = _CollectedFrame()
+    else:
+        # Header rows of GRAL output are taken from the earliest input
+        output_format = _output_format(output_path, output_format, ordered)
+        gral_header = _gral_output_header(ordered[0]) if output_format == "gral" else None
+        output = _TimeseriesWriter(output_path, output_format, gral_header)
+
+    try:
+        for entry in ordered:
+            print(f"Joining {entry.path}")
+            for chunk in _read_input_chunks(entry, int(chunksize)):
+                output.write(*chunk)
+    except BaseException:
+        output.close(discard=True)
+        raise
+    output.close()
+
+    rows = sum(span.rows for span in spans)
+    print(
+        f"Joined {len(spans)} timeseries over {rows} hours from {_hour_label(spans[0].first)} to {_hour_label(spans[-1].last)}"
+    )
+
+    if output_path is None:
+        return output.frame()
+    return None
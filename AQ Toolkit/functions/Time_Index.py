@@ -0,0 +1,354 @@
+""" Time index handling for timeseries datasets, this converts the header columns (CALPUFF YYYY/JDY/HHMM or GRAL date/hour) into integer hour keys so averaging periods can be computed from the real timestamps
+"""
+
+import typing
+
+import numpy as np
+import pandas as pd
+
+# Column names (lower case) that are recognised when detecting the header format
+_YEAR_NAMES = ["yyyy", "year"]
+_JULIAN_DAY_NAMES = ["jdy", "jday", "julian day", "day of year"]
+_HHMM_NAMES = ["hhmm"]
+_HOUR_NAMES = ["hour", "hr", "hh", "time"]
+_DATE_NAMES = ["date"]
+
+
+def _find_column(
+    header: pd.DataFrame, candidate_names: typing.List[str]
+) -> typing.Optional[typing.Any]:
+    """ Find the first column in the header whose name (case insensitive) is in the candidate names
+
+    Args:
+        header (pd.DataFrame): Header columns of the dataset
+        candidate_names (typing.List[str]): Lower case names to match
+
+    Returns:
+        typing.Optional[typing.Any]: Matching column label or None if not found
+    """
+    for column in header.columns:
+        if str(column).strip().lower() in candidate_names:
+            return column
+    return None
+
+
+def _days_since_epoch(years: np.ndarray) -> np.ndarray:
+    """ Number of days between 1970-01-01 and the 1st of January of each year (leap years included)
+
+    Args:
+        years (np.ndarray): Integer years
+
+    Returns:
+        np.ndarray: Days since epoch for the start of each year
+    """
+    return (
+        (years - 1970).astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+    )
+
+
+def _map_unique(values: pd.Series, converter: typing.Callable) -> np.ndarray:
+    """ Apply a converter to the unique values of a column only, then broadcast back to every row
+        Date/hour strings repeat many times so this avoids parsing each row
+
+    Args:
+        values (pd.Series): Column to convert
+        converter (typing.Callable): Function taking an array of unique values and returning converted values
+
+    Returns:
+        np.ndarray: Converted values for every row
+    """
+    codes, uniques = pd.factorize(values)
+    converted = np.asarray(converter(uniques))
+    return converted[codes]
+
+
+def _timestamp_columns(
+    header: pd.DataFrame, header_format: str = "auto"
+) -> typing.Dict[str, typing.Any]:
+    """ Find the header columns holding the timestamps, either year/julian day with HHMM or hour (CALPUFF) or date/hour (GRAL)
+
+    Args:
+        header (pd.DataFrame): Header columns of the dataset
+        header_format (str, optional): One of auto, calpuff, gral or sequential. Defaults to "auto".
+
+    Returns:
+        typing.Dict[str, typing.Any]: Column label of each part found (year, julian_day then hhmm or hour, or date and hour), empty if no timestamps were found
+    """
+    year_column = _find_column(header, _YEAR_NAMES)
+    julian_day_column = _find_column(header, _JULIAN_DAY_NAMES)
+    hhmm_column = _find_column(header, _HHMM_NAMES)
+    hour_column = _find_column(header, _HOUR_NAMES)
+    date_column = _find_column(header, _DATE_NAMES)
+
+    if header_format == "gral" and date_column is None and header.shape[1] >= 2:
+        # GRAL timeseries are read without column names, date then hour
+        date_column, hour_column = header.columns[0], header.columns[1]
+
+    if (
+        header_format in ["auto", "calpuff"]
+        and year_column is not None
+        and julian_day_column is not None
+        and (hhmm_column is not None or hour_column is not None)
+    ):
+        columns = {"year": year_column, "julian_day": julian_day_column}
+        if hhmm_column is not None:
+            columns["hhmm"] = hhmm_column
+        else:
+            columns["hour"] = hour_column
+        return columns
+    if (
+        header_format in ["auto", "gral"]
+        and date_column is not None
+        and hour_column is not None
+    ):
+        return {"date": date_column, "hour": hour_column}
+    return {}
+
+
+def _calpuff_hour_keys(
+    years: pd.Series, julian_days: pd.Series, hours: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Convert CALPUFF style year/julian day/hour columns into hour keys
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: Hour keys and the hour of day for each row
+    """
+    years = pd.to_numeric(years).to_numpy(dtype=np.int64)
+    julian_days = pd.to_numeric(julian_days).to_numpy(dtype=np.int64)
+    days = _days_since_epoch(years) + julian_days - 1
+    return days * 24 + hours, hours
+
+
+def _gral_hour_keys(
+    dates: pd.Series, hours: pd.Series
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Convert GRAL style date (eg 01.01.2021) and hour (eg 01:00) columns into hour keys
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: Hour keys and the hour of day for each row
+    """
+    days = _map_unique(
+        dates.astype(str).str.strip(),
+        lambda uniques: pd.to_datetime(uniques, dayfirst=True)
+        .to_numpy()
+        .astype("datetime64[D]")
+        .astype(np.int64),
+    )
+    hours = _parse_hours(hours)
+    return days * 24 + hours, hours
+
+
+def _parse_hours(hours: pd.Series) -> np.ndarray:
+    """ Parse an hour column that may be integers (1, 2, ...) or strings (01:00, 02:00, ...)
+
+    Args:
+        hours (pd.Series): Hour column
+
+    Returns:
+        np.ndarray: Integer hour of day
+    """
+    if pd.api.types.is_numeric_dtype(hours):
+        return hours.to_numpy(dtype=np.int64)
+    return _map_unique(
+        hours.astype(str).str.strip(),
+        lambda uniques: np.array(
+            [int(str(hour).split(":")[0]) for hour in uniques], dtype=np.int64
+        ),
+    )
+
+
+def _hour_label(key: int) -> str:
+    """ Readable timestamp of an hour key (hour beginning)
+    """
+    return str(np.datetime64(int(key), "h")).replace("T", " ") + ":00"
+
+
+class TimeIndex:
+    """ Integer hour keys (hours since 1970-01-01 00:00, hour beginning convention) for each row of a dataset
+
+    Args:
+        keys (np.ndarray): Integer hour keys
+        from_timestamps (bool): Whether the keys were read from header columns (False if assumed sequential)
+        hour_ending (bool, optional): Whether the header hours were hour ending (1 - 24) and shifted back an hour. Defaults to False.
+    """
+
+    def __init__(self, keys: np.ndarray, from_timestamps: bool, hour_ending: bool = False):
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.from_timestamps = from_timestamps
+        self.hour_ending = hour_ending
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def sequential(cls, length: int, start_hour: int = 0) -> "TimeIndex":
+        """ Build a time index assuming consecutive hours starting at start_hour on day zero
+
+        Args:
+            length (int): Number of rows
+            start_hour (int, optional): Hour of the first row. Defaults to 0.
+
+        Returns:
+            TimeIndex: Sequential time index
+        """
+        return cls(np.arange(start_hour, start_hour + length, dtype=np.int64), False)
+
+    @classmethod
+    def from_header(
+        cls, header: pd.DataFrame, header_format: str = "auto", start_hour: int = 0
+    ) -> "TimeIndex":
+        """ Read the timestamps of a dataset from its header columns
+
+        Args:
+            header (pd.DataFrame): Header columns of the dataset (eg YYYY, JDY, HHMM)
+            header_format (str, optional): One of auto, calpuff, gral or sequential. Defaults to "auto".
+            start_hour (int, optional): Hour of the first row if timestamps cannot be found. Defaults to 0.
+
+        Raises:
+            ValueError: If the requested format is not supported or the header columns can't be found
+
+        Returns:
+            TimeIndex: Time index of the dataset
+        """
+        if header_format not in _available_header_formats():
+            raise ValueError(f"Header format: {header_format} is not supported")
+
+        if header_format == "sequential":
+            return cls.sequential(len(header.index), start_hour)
+
+        columns = _timestamp_columns(header, header_format)
+        if "julian_day" in columns:
+            if "hhmm" in columns:
+                hours = pd.to_numeric(header[columns["hhmm"]]).to_numpy(dtype=np.int64) // 100
+            else:
+                hours = _parse_hours(header[columns["hour"]])
+            keys, hours = _calpuff_hour_keys(
+                header[columns["year"]], header[columns["julian_day"]], hours
+            )
+        elif "date" in columns:
+            keys, hours = _gral_hour_keys(header[columns["date"]], header[columns["hour"]])
+        elif header_format == "auto":
+            return cls.sequential(len(header.index), start_hour)
+        else:
+            raise ValueError(
+                f"Unable to find {header_format} timestamp columns in header: {list(header.columns)}"
+            )
+
+        # Hour ending data (1 - 24) is shifted back an hour so hour 24 stays within its own day
+        hour_ending = len(hours) > 0 and hours.max() == 24
+        if hour_ending:
+            keys = keys - 1
+
+        return cls(keys, True, hour_ending)
+
+
+def _available_header_formats() -> typing.List[str]:
+    return ["auto", "calpuff", "gral", "sequential"]
+
+
+class AveragingPeriods:
+    """ Integer period IDs for each row with the rows per period computed once, used for grouped reductions (eg 24 hour averages)
+
+    Args:
+        period_ids (np.ndarray): Period ID of each row, rows must be in time order
+    """
+
+    def __init__(self, period_ids: np.ndarray):
+        self.period_ids = np.asarray(period_ids, dtype=np.int64)
+        if len(self.period_ids) > 1 and (np.diff(self.period_ids) < 0).any():
+            raise ValueError("Rows must be in time order to compute averaging periods")
+
+        # Start row of each period and the number of rows in each period
+        is_start = np.empty(len(self.period_ids), dtype=bool)
+        is_start[:1] = True
+        np.not_equal(self.period_ids[1:], self.period_ids[:-1], out=is_start[1:])
+        self.starts = np.flatnonzero(is_start)
+        self.counts = np.diff(np.append(self.starts, len(self.period_ids)))
+        self.labels = self.period_ids[self.starts]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def block(
+        cls, time_index: TimeIndex, hours: int, start: int = 0
+    ) -> "AveragingPeriods":
+        """ Fixed length blocks of hours, aligned to midnight of the first day plus the start offset (eg 24 hours starting at 1am), as with pandas resample
+
+        Args:
+            time_index (TimeIndex): Time index of the dataset
+            hours (int): Length of each averaging block in hours
+            start (int, optional): Hour of day the blocks are aligned to. Defaults to 0.
+
+        Returns:
+            AveragingPeriods: Averaging periods for the blocks
+        """
+        hours = int(hours)
+        if hours <= 0:
+            raise ValueError(f"Averaging period must be a positive number of hours, got {hours}")
+        keys = time_index.keys
+        origin = (int(keys.min()) // 24 * 24 if len(keys) else 0) + int(start)
+        return cls(np.floor_divide(keys - origin, hours))
+
+    @classmethod
+    def calendar_day(cls, time_index: TimeIndex) -> "AveragingPeriods":
+        """ Calendar day (midnight to midnight) averaging periods
+
+        Args:
+            time_index (TimeIndex): Time index of the dataset
+
+        Returns:
+            AveragingPeriods: Averaging periods for each day
+        """
+        return cls.block(time_index, 24)
+
+    def sum(self, values: np.ndarray) -> np.ndarray:
+        """ Sum of each period for every column
+
+        Args:
+            values (np.ndarray): 2D array of rows (hours) by columns (receptors)
+
+        Returns:
+            np.ndarray: 2D array of periods by columns
+        """
+        return np.add.reduceat(values, self.starts, axis=0)
+
+    def mean(self, values: np.ndarray) -> np.ndarray:
+        """ Mean of each period for every column, missing values (NaN) are ignored as with pandas
+
+        Args:
+            values (np.ndarray): 2D array of rows (hours) by columns (receptors)
+
+        Returns:
+            np.ndarray: 2D array of periods by columns
+        """
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        if len(self.starts) == 0:
+            return np.empty((0, values.shape[1]))
+
+        missing = np.isnan(values)
+        if not missing.any():
+            return self.sum(values) / self.counts[:, np.newaxis]
+
+        # Only fall back to the (slower) missing aware reduction when needed
+        valid_counts = np.add.reduceat(~missing, self.starts, axis=0)
+        sums = np.add.reduceat(np.where(missing, 0, values), self.starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(valid_counts > 0, sums / valid_counts, np.nan)
+
+    def max_mean(self, values: np.ndarray) -> np.ndarray:
+        """ Maximum of the period means for every column
+
+        Args:
+            values (np.ndarray): 2D array of rows (hours) by columns (receptors)
+
+        Returns:
+            np.ndarray: Maximum period mean for each column
+        """
+        means = self.mean(values)
+        if means.shape[0] == 0:
+            return np.full(means.shape[1], np.nan)
+        # fmax ignores periods without valid data
+        return np.fmax.reduce(means, axis=0)
@@ -0,0 +1,236 @@
+""" Time integrity of timeseries datasets, the header columns are converted to hour keys (see Time_Index) to find missing and repeated hours, then the data is put onto a complete hourly grid in one pass.
+    Commands otherwise assume every row is the next hour, so a missing hour shifts every rolling and block average after it
+"""
+
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import error_printing
+from .Time_Index import TimeIndex, _days_since_epoch, _hour_label, _timestamp_columns
+from .Timeseries import Timeseries
+
+
+def _available_gap_fills() -> typing.List[str]:
+    return ["none", "constant", "nan", "background"]
+
+
+class HourCheck(typing.NamedTuple):
+    """ Complete hourly grid of a dataset and the row of the data for each hour
+
+    Args:
+        hours (np.ndarray): Hour keys from the first to the last hour of the data
+        rows (np.ndarray): Row of the data for each hour, -1 where the hour is missing (the first row is used for repeated hours)
+        missing (int): Number of hours with no row
+        duplicates (int): Number of rows repeating an earlier hour
+        hour_ending (bool): Whether the header hours were hour ending (1 - 24)
+    """
+
+    hours: np.ndarray
+    rows: np.ndarray
+    missing: int
+    duplicates: int
+    hour_ending: bool
+
+    @property
+    def complete(self) -> bool:
+        """ Whether the rows already are every hour once in order
+        """
+        return (
+            self.missing == 0
+            and self.duplicates == 0
+            and bool((self.rows == np.arange(len(self.rows))).all())
+        )
+
+    def describe(self) -> str:
+        if self.complete:
+            return f"All {len(self.hours)} hours present once and in order"
+        if len(self.hours) == 0:
+            return "No hours found"
+        if self.missing == 0 and self.duplicates == 0:
+            return f"All {len(self.hours)} hours present but out of order"
+        return (
+            f"{self.missing} missing hours and {self.duplicates} repeated hours between "
+            f"{_hour_label(self.hours[0])} and {_hour_label(self.hours[-1])}"
+        )
+
+
+def check_hours(time_index: TimeIndex) -> HourCheck:
+    """ Find the missing and repeated hours of a dataset, rows can be in any order
+
+    Args:
+        time_index (TimeIndex): Hour keys read from the header columns
+
+    Raises:
+        ValueError: If the time index wasn't read from timestamps
+
+    Returns:
+        HourCheck: Complete hourly grid with the row for each hour
+    """
+    if not time_index.from_timestamps:
+        raise ValueError(
+            "Missing hours can only be found from timestamp header columns (eg YYYY, JDY, HHMM or GRAL date and hour)"
+        )
+    keys = time_index.keys
+    if len(keys) == 0:
+        return HourCheck(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0, 0, False)
+
+    start = keys.min()
+    hours = np.arange(start, keys.max() + 1, dtype=np.int64)
+    positions = keys - start
+
+    # Written last row first so the first row of a repeated hour is kept
+    rows = np.full(len(hours), -1, dtype=np.int64)
+    rows[positions[::-1]] = np.arange(len(keys) - 1, -1, -1, dtype=np.int64)
+
+    missing = int((rows < 0).sum())
+    duplicates = len(keys) - (len(hours) - missing)
+    return HourCheck(hours, rows, missing, duplicates, time_index.hour_ending)
+
+
+def _fill_for(gap_fill: str, fill_value: float) -> float:
+    """ Value given to the receptors of a missing hour
+    """
+    if gap_fill == "constant":
+        return float(fill_value)
+    if gap_fill == "nan":
+        # Left blank so statistics skip the hour rather than counting a made up value
+        return np.nan
+    # Background only, the source contributes nothing so the background is all that is left once it is added
+    return 0.0
+
+
+def fill_rows(values: np.ndarray, rows: np.ndarray, fill: float) -> np.ndarray:
+    """ Put receptor values onto a grid of rows with a single gather
+
+    Args:
+        values (np.ndarray): Rows by receptor values
+        rows (np.ndarray): Row of the values for each row of the grid, -1 for rows to fill
+        fill (float): Value for rows with no values
+
+    Returns:
+        np.ndarray: Grid rows by receptor values
+    """
+    present = rows >= 0
+    gridded = values[np.where(present, rows, 0)] if len(values) else np.empty(
+        (len(rows), values.shape[1]), dtype=values.dtype
+    )
+    if not present.all():
+        gridded = gridded.astype(np.result_type(gridded.dtype, np.asarray(fill).dtype), copy=False)
+        gridded[~present] = fill
+    return gridded
+
+
+def _hours_header(
+    header: pd.DataFrame, hours: np.ndarray, hour_ending: bool, header_format: str = "auto"
+) -> pd.DataFrame:
+    """ Timestamp header columns for hours that aren't in the data (columns that aren't timestamps are left blank)
+
+    Args:
+        header (pd.DataFrame): Header columns of the data, for the column names and formats
+        hours (np.ndarray): Hour keys to write
+        hour_ending (bool): Write hours as hour ending (1 - 24)
+        header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+
+    Returns:
+        pd.DataFrame: Header columns for the hours
+    """
+    generated = pd.DataFrame(
+        {column: pd.Series([None] * len(hours), dtype=object) for column in header.columns}
+    )
+    columns = _timestamp_columns(header, header_format)
+
+    days = np.floor_divide(hours, 24)
+    hour_of_day = np.mod(hours, 24) + (1 if hour_ending else 0)
+
+    if "julian_day" in columns:
+        years = days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+        generated[columns["year"]] = years
+        generated[columns["julian_day"]] = days - _days_since_epoch(years) + 1
+    if "hhmm" in columns:
+        generated[columns["hhmm"]] = hour_of_day * 100
+    if "date" in columns:
+        generated[columns["date"]] = pd.to_datetime(
+            days.astype("datetime64[D]")
+        ).strftime("%d.%m.%Y")
+    if "hour" in columns:
+        if pd.api.types.is_numeric_dtype(header[columns["hour"]]):
+            generated[columns["hour"]] = hour_of_day
+        else:
+            generated[columns["hour"]] = [f"{hour:02d}:00" for hour in hour_of_day]
+    return generated
+
+
+def complete_hours(
+    timeseries: Timeseries,
+    gap_fill: str = "constant",
+    fill_value: float = 0.0,
+    header_format: str = "auto",
+    name: str = "Timeseries",
+) -> Timeseries:
+    """ Put a timeseries onto a complete hourly grid from its first to its last hour. Missing hours are added with a fill (a constant, NaN so statistics skip them, or background only where the source contributes nothing) and repeated hours keep their first row
+
+    Args:
+        timeseries (Timeseries): Timeseries with timestamp header columns
+        gap_fill (str, optional): One of none, constant, nan or background (see _available_gap_fills). Defaults to "constant".
+        fill_value (float, optional): Value for missing hours with a constant fill. Defaults to 0.0.
+        header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+        name (str, optional): Name of the timeseries for messages. Defaults to "Timeseries".
+
+    Raises:
+        ValueError: If the gap fill is not supported or the header has no timestamps
+
+    Returns:
+        Timeseries: Timeseries on the hourly grid, its row labels are the hour keys (for aligning other timeseries by hour)
+    """
+    if gap_fill not in _available_gap_fills():
+        raise ValueError(f"Gap fill: {gap_fill} is not supported")
+    if gap_fill == "none":
+        return timeseries
+
+    check = check_hours(timeseries.time_index(header_format))
+    if check.complete:
+        print(f"{name}: {check.describe()}")
+        header = timeseries.header.set_axis(pd.Index(check.hours), axis=0)
+        return Timeseries(header, timeseries.values, timeseries.receptors)
+
+    error_printing(f"{name}: {check.describe()}, missing hours are filled ({gap_fill})")
+
+    present = check.rows >= 0
+    header = timeseries.header.iloc[np.where(present, check.rows, 0)].reset_index(drop=True)
+    if not present.all():
+        generated = _hours_header(
+            timeseries.header, check.hours[~present], check.hour_ending, header_format
+        )
+        header = header.astype(object)
+        header.loc[~present, :] = generated.to_numpy()
+        header = header.infer_objects()
+    header.index = pd.Index(check.hours)
+
+    values = fill_rows(timeseries.values, check.rows, _fill_for(gap_fill, fill_value))
+    return Timeseries(header, values, timeseries.receptors)
+
+
+def align_by_hour(
+    frame: pd.DataFrame, header_format: str = "auto", name: str = "Data set"
+) -> pd.DataFrame:
+    """ Index a table by the hour keys of its timestamp header columns so it can be matched to a timeseries on a complete hourly grid (repeated hours keep their first row)
+
+    Args:
+        frame (pd.DataFrame): Table with timestamp header columns
+        header_format (str, optional): Header format of the timestamps (see TimeIndex.from_header). Defaults to "auto".
+        name (str, optional): Name of the table for messages. Defaults to "Data set".
+
+    Raises:
+        ValueError: If the table has no timestamp header columns
+
+    Returns:
+        pd.DataFrame: Table indexed by hour key
+    """
+    time_index = TimeIndex.from_header(frame, header_format)
+    check = check_hours(time_index)
+    if not check.complete:
+        error_printing(f"{name}: {check.describe()}")
+    keyed = frame.set_axis(pd.Index(time_index.keys), axis=0)
+    return keyed[~keyed.index.duplicated(keep="first")]
@@ -0,0 +1,150 @@
+""" Timeseries kept as a header sidecar (eg YYYY, JDY, HHMM) alongside a contiguous hours by receptors matrix.
+    Commands work on the matrix and the header columns are only joined back on when the result is exported, rather than being split off and prepended onto a copy of every intermediate table
+"""
+
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .File_Utilties import (
+    _coerce_receptor_values,
+    _convert_path,
+    _export_csv,
+    _export_excel,
+    _export_parquet,
+)
+from .Time_Index import TimeIndex
+
+
+class Timeseries(typing.NamedTuple):
+    """ Header columns, receptor values and receptor IDs of a timeseries. Unpacks as (header, values, receptors) like the chunks read for linear combinations
+
+    Args:
+        header (pd.DataFrame): Header columns, its index gives the row labels of the timeseries
+        values (np.ndarray): Hours by receptors values
+        receptors (typing.List): Receptor IDs in column order
+    """
+
+    header: pd.DataFrame
+    values: np.ndarray
+    receptors: typing.List
+
+    @classmethod
+    def from_frame(
+        cls,
+        dataframe: pd.DataFrame,
+        header_length: int,
+        fill_value: typing.Optional[float] = None,
+    ) -> "Timeseries":
+        """ Split a table as read (header columns then receptor columns), receptor columns are converted to floats in one pass
+
+        Args:
+            dataframe (pd.DataFrame): Table as read
+            header_length (int): Number of header columns before the receptor data starts
+            fill_value (typing.Optional[float], optional): Value to fill missing (blank) receptor values with. Defaults to None.
+
+        Returns:
+            Timeseries: Timeseries keeping the row labels of the table
+        """
+        header_length = int(header_length)
+        return cls(
+            dataframe.iloc[:, :header_length],
+            _coerce_receptor_values(dataframe.iloc[:, header_length:], fill_value),
+            list(dataframe.columns[header_length:]),
+        )
+
+    @classmethod
+    def concat(cls, parts: typing.List["Timeseries"]) -> "Timeseries":
+        """ Join timeseries with the same receptors one after the other (eg chunks of hours)
+
+        Args:
+            parts (typing.List[Timeseries]): Timeseries in time order
+
+        Raises:
+            ValueError: If there is nothing to join
+
+        Returns:
+            Timeseries: Joined timeseries with a fresh index
+        """
+        if len(parts) == 0:
+            raise ValueError("No timeseries to join")
+        return cls(
+            pd.concat([part.header for part in parts], ignore_index=True),
+            np.concatenate([part.values for part in parts]),
+            parts[0].receptors,
+        )
+
+    @property
+    def index(self) -> pd.Index:
+        return self.header.index
+
+    @property
+    def rows(self) -> int:
+        return self.values.shape[0]
+
+    def time_index(self, header_format: str = "auto", start_hour: int = 0) -> TimeIndex:
+        """ Integer hour keys of each row read from the header columns (see TimeIndex.from_header)
+        """
+        return TimeIndex.from_header(self.header, header_format, start_hour)
+
+    def with_values(
+        self, values: np.ndarray, receptors: typing.Optional[typing.List] = None
+    ) -> "Timeseries":
+        """ Same hours with new receptor values (eg after factoring), the header is shared rather than copied
+
+        Args:
+            values (np.ndarray): Hours by receptors values
+            receptors (typing.Optional[typing.List], optional): Receptor IDs of the values. Defaults to None (the current receptors).
+
+        Raises:
+            ValueError: If the number of hours differs
+
+        Returns:
+            Timeseries: Timeseries with the new values
+        """
+        if values.shape[0] != self.rows:
+            raise ValueError(f"{values.shape[0]} rows of values for a timeseries of {self.rows} hours")
+        return Timeseries(
+            self.header, values, self.receptors if receptors is None else list(receptors)
+        )
+
+    def fillna(self, fill_value: float) -> "Timeseries":
+        """ Fill missing receptor values
+        """
+        return self.with_values(
+            np.where(np.isnan(self.values), float(fill_value), self.values)
+        )
+
+    def receptor_frame(self, copy: bool = False) -> pd.DataFrame:
+        """ Receptor values as a DataFrame over the values (no copy unless asked for) with the row labels of the header
+        """
+        return pd.DataFrame(
+            self.values, index=self.header.index, columns=self.receptors, copy=copy
+        )
+
+    def frame(self, copy: bool = False) -> pd.DataFrame:
+        """ Header columns joined to the receptor columns in a single step, only needed to export
+
+        Args:
+            copy (bool, optional): Copy the values rather than viewing them (if they are reused after the table is made). Defaults to False.
+
+        Returns:
+            pd.DataFrame: Table of header then receptor columns
+        """
+        return pd.concat([self.header, self.receptor_frame(copy)], axis=1)
+
+    def export(self, output_path: str):
+        """ Export the timeseries as a table in the format of the output extension (csv, xlsx or parquet)
+
+        Args:
+            output_path (str): Location to export to
+
+        Raises:
+            ValueError: If the output extension is not supported
+        """
+        exporters = {".csv": _export_csv, ".xlsx": _export_excel, ".parquet": _export_parquet}
+        suffix = _convert_path(output_path).suffix
+        if suffix not in exporters:
+            raise ValueError(f"Unable to export to {output_path}, use csv, xlsx or parquet")
+        exporters[suffix](self.frame(), output_path)
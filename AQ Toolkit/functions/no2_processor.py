@@ -4,15 +4,29 @@ Returns:
     [type]: [description]
 """
 
+import numpy as np
 import pandas as pd
 
-from .File_Utilties import _read_large_dataset, prepend_header_dataframe
+from .File_Utilties import (
+    _read_large_dataset,
+    _receptor_usecols,
+    error_printing,
+    gooey_tqdm,
+)
+from .Kernels import add_rows, olm_kernel, scale_rows
+from .Profiling import phase
+from .Shared_Arrays import SharedTimeseries, as_frame
+from .Timeseries import Timeseries
 import typing
 
 
 def _compute_statistics(
-    dataframe: pd.DataFrame, exceedances: float, percentile: float, window: float
+    dataframe: typing.Union[pd.DataFrame, SharedTimeseries],
+    exceedances: float,
+    percentile: float,
+    window: float,
 ) -> pd.DataFrame:
+    dataframe = as_frame(dataframe)
     outdf = pd.DataFrame(
         {
             "Max of Sensor": dataframe.max(),
@@ -47,6 +61,283 @@ def _compute_statistics(
     return outdf
 
 
+def read_background(
+    background_name: str,
+    background_column_name: str,
+    ozone_column_name: str,
+    by_hour: bool = False,
+) -> pd.DataFrame:
+    """ Read and validate the background NO2 and ozone columns of a background data set, read once and shared between scenarios
+
+    Args:
+        background_name (str): File path to background NO2 data set
+        background_column_name (str): Column name of background data in background data set (eg, Background NO2)
+        ozone_column_name (str): Column name of ozone data in background data set
+        by_hour (bool, optional): Label rows by the hour keys of the background's timestamp columns, to match scenarios put on a complete hourly grid (see Time_Integrity). Defaults to False.
+
+    Raises:
+        ValueError: If either column is missing from the background data set
+
+    Returns:
+        pd.DataFrame: Background NO2 and ozone as floats (original row labels, or hour keys, kept for alignment with scenario data)
+    """
+    background = _read_large_dataset(background_name)
+    background.dropna(how="all", inplace=True)
+
+    missing_columns = [
+        column
+        for column in [background_column_name, ozone_column_name]
+        if column not in background.columns
+    ]
+    if missing_columns:
+        raise ValueError(
+            f"Columns {missing_columns} not found in background data set {background_name}"
+        )
+
+    if by_hour:
+        from .Time_Integrity import align_by_hour
+
+        background = align_by_hour(background, name=str(background_name))
+
+    return background[[background_column_name, ozone_column_name]].apply(
+        pd.to_numeric, errors="coerce"
+    )
+
+
+def _align_background(
+    background: pd.DataFrame, index: pd.Index, fill_invalid_value: float
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Background NO2 and ozone for each row of a scenario (matched on row labels as with assigning a column)
+
+    Args:
+        background (pd.DataFrame): Background NO2 and ozone from read_background
+        index (pd.Index): Row labels of scenario data
+        fill_invalid_value (float): Value to fill any missing values
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray]: Background NO2 and ozone arrays
+    """
+    if len(background.index.intersection(index)) < len(index):
+        error_printing(
+            f"Background data set has {len(background)} rows but data has {len(index)} rows, missing background hours are filled with {fill_invalid_value}"
+        )
+    aligned = background.reindex(index).fillna(fill_invalid_value).to_numpy(dtype=float)
+    return aligned[:, 0], aligned[:, 1]
+
+
+def _read_scenario(
+    input_data: str,
+    header_length: int,
+    top_header_length: int,
+    receptors: typing.Optional[typing.List[str]] = None,
+    receptor_pattern: typing.Optional[str] = None,
+) -> Timeseries:
+    """ Read a scenario (source data set) separating the header columns from the receptor data
+
+    Args:
+        input_data (str): Source data file path
+        header_length (int): Number of columns before data starts (eg 3 for year/month/day)
+        top_header_length (int): Number of rows to ignore before data begins
+        receptors (typing.Optional[typing.List[str]], optional): Receptor IDs to limit processing to. Defaults to None (all receptors).
+        receptor_pattern (typing.Optional[str], optional): Regular expression receptor IDs must match to be read. Defaults to None.
+
+    Returns:
+        Timeseries: Header columns and receptor values (text that can't be converted is NaN)
+    """
+    read_kwargs = {}
+    if receptors is not None or receptor_pattern:
+        read_kwargs["usecols"] = _receptor_usecols(
+            input_data, header_length, receptors, receptor_pattern
+        )
+
+    data = _read_large_dataset(input_data, **read_kwargs)
+
+    # Header rows are dropped with the receptor rows so both keep the same row labels
+    return Timeseries.from_frame(data[top_header_length - 1:], header_length)
+
+
+def _complete_scenario(
+    scenario: Timeseries, gap_fill: str, fill_invalid_value: float, input_data: str
+) -> Timeseries:
+    """ Put a scenario onto a complete hourly grid labelled by hour key (see Time_Integrity.complete_hours), unchanged if gap_fill is none
+    """
+    if gap_fill == "none":
+        return scenario
+    from .Time_Integrity import complete_hours
+
+    return complete_hours(scenario, gap_fill, float(fill_invalid_value), name=str(input_data))
+
+
+def olm(
+    values: np.ndarray,
+    background_no2: np.ndarray,
+    ozone: np.ndarray,
+    initial: float,
+    ozone_scale: float,
+    **_,
+) -> np.ndarray:
+    """ Ozone Limiting Method, (initial * value) + minimum((1 - initial) * value, ozone * ozone scale) + background NO2 for every hour and receptor at once
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors (NOx)
+        background_no2 (np.ndarray): Background NO2 for each hour
+        ozone (np.ndarray): Background ozone for each hour
+        initial (float): Initial percentage to work with (eg 0.1 = 10%)
+        ozone_scale (float): Number to scale the ozone values by (default 46/48)
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors (NO2 including background)
+    """
+    return olm_kernel(values, background_no2, ozone * ozone_scale, initial)
+
+
+def arm2(
+    values: np.ndarray,
+    background_no2: np.ndarray,
+    ozone: np.ndarray,
+    min_ratio: float = 0.5,
+    max_ratio: float = 0.9,
+    **_,
+) -> np.ndarray:
+    """ Ambient Ratio Method 2, NO2/NOx ratio from the AERMOD polynomial of the modelled NOx (ug/m3) bounded between the minimum and maximum ratio, plus background NO2
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors (NOx in ug/m3)
+        background_no2 (np.ndarray): Background NO2 for each hour
+        ozone (np.ndarray): Background ozone for each hour (not used)
+        min_ratio (float, optional): Lower bound of NO2/NOx ratio. Defaults to 0.5.
+        max_ratio (float, optional): Upper bound of NO2/NOx ratio. Defaults to 0.9.
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors (NO2 including background)
+    """
+    # Coefficients from highest to lowest power (AERMOD ARM2)
+    coefficients = [
+        -1.1723e-17,
+        4.2795e-14,
+        -5.8345e-11,
+        3.4555e-8,
+        -5.6062e-6,
+        -2.7383e-3,
+        1.2441,
+    ]
+    ratio = np.clip(np.polyval(coefficients, values), min_ratio, max_ratio)
+    return add_rows(values * ratio, background_no2)
+
+
+def fixed_ratio(
+    values: np.ndarray,
+    background_no2: np.ndarray,
+    ozone: np.ndarray,
+    ratio: float = 0.8,
+    **_,
+) -> np.ndarray:
+    """ Fixed NO2/NOx ratio applied to every hour plus background NO2
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors (NOx)
+        background_no2 (np.ndarray): Background NO2 for each hour
+        ozone (np.ndarray): Background ozone for each hour (not used)
+        ratio (float, optional): NO2/NOx ratio. Defaults to 0.8.
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors (NO2 including background)
+    """
+    return add_rows(values * ratio, background_no2)
+
+
+def pvmrm(
+    values: np.ndarray,
+    background_no2: np.ndarray,
+    ozone: np.ndarray,
+    initial: float,
+    ozone_scale: float,
+    max_ratio: float = 0.9,
+    **_,
+) -> np.ndarray:
+    """ Simplified Plume Volume Molar Ratio Method. The ozone available each hour is shared by the whole plume, so the fraction converted is limited
+        by the peak NOx across all receptors that hour (rather than each receptor's own NOx as with OLM). The NO2/NOx ratio is capped at the equilibrium (maximum) ratio
+
+    Args:
+        values (np.ndarray): 2D array of hours by receptors (NOx)
+        background_no2 (np.ndarray): Background NO2 for each hour
+        ozone (np.ndarray): Background ozone for each hour
+        initial (float): Initial percentage to work with (eg 0.1 = 10%)
+        ozone_scale (float): Number to scale the ozone values by (default 46/48)
+        max_ratio (float, optional): Equilibrium NO2/NOx ratio. Defaults to 0.9.
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors (NO2 including background)
+    """
+    plume_nox = (1 - initial) * np.nanmax(values, axis=1, initial=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        converted = np.where(
+            plume_nox > 0, np.minimum(ozone * ozone_scale / plume_nox, 1), 1
+        )
+    ratio = np.minimum(initial + (1 - initial) * converted, max(max_ratio, initial))
+    return add_rows(scale_rows(values, ratio), background_no2)
+
+
+# NO2 conversion methods, each takes the NOx values, background NO2 and ozone and returns NO2 including background
+_no2_methods = {
+    "OLM": olm,
+    "ARM2": arm2,
+    "Fixed Ratio": fixed_ratio,
+    "PVMRM": pvmrm,
+}
+
+# Methods where the result depends on the initial ratio
+_initial_ratio_methods = ["OLM", "PVMRM"]
+
+
+def _available_no2_methods() -> typing.List[str]:
+    return list(_no2_methods.keys())
+
+
+def convert_no2(
+    method: str,
+    values: np.ndarray,
+    background_no2: np.ndarray,
+    ozone: np.ndarray,
+    **parameters: float,
+) -> np.ndarray:
+    """ Convert modelled NOx to NO2 (including background) with one of the available methods
+
+    Args:
+        method (str): Name of method (see _available_no2_methods)
+        values (np.ndarray): 2D array of hours by receptors (NOx)
+        background_no2 (np.ndarray): Background NO2 for each hour
+        ozone (np.ndarray): Background ozone for each hour
+        **parameters (float): Method parameters (initial, ozone_scale, min_ratio, max_ratio, ratio), parameters a method doesn't use are ignored
+
+    Raises:
+        ValueError: If the method is not supported
+
+    Returns:
+        np.ndarray: 2D array of hours by receptors (NO2 including background)
+    """
+    if method not in _no2_methods:
+        raise ValueError(f"NO2 method: {method} is not supported")
+    return _no2_methods[method](values, background_no2, ozone, **parameters)
+
+
+def _method_parameters(settings: typing.Dict[str, typing.Any]) -> typing.Dict[str, float]:
+    """ NO2 method parameters from user input in Gooey (the initial ratio is passed separately)
+
+    Args:
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+
+    Returns:
+        typing.Dict[str, float]: Method parameters (ozone_scale, min_ratio, max_ratio, ratio)
+    """
+    return {
+        "ozone_scale": float(settings.get("ozone_scale", 0.9583333)),
+        "min_ratio": float(settings.get("min_ratio", 0.5)),
+        "max_ratio": float(settings.get("max_ratio", 0.9)),
+        "ratio": float(settings.get("fixed_ratio", 0.8)),
+    }
+
+
 def process(
     header_length: int,
     initial: float,
@@ -60,7 +351,12 @@ def process(
     ozone_scale: float,
     percentile: float,
     window: int,
-    top_header_length: int
+    top_header_length: int,
+    receptors: typing.Optional[typing.List[str]] = None,
+    receptor_pattern: typing.Optional[str] = None,
+    method: str = "OLM",
+    method_parameters: typing.Optional[typing.Dict[str, float]] = None,
+    gap_fill: str = "none",
 ) -> typing.Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """ Apply EPA modelling functions for NO2 and generate statistics
 
@@ -76,103 +372,217 @@ def process(
         background_column_name (str): Column name of background data in background data set (eg, Background NO2)
         ozone_scale (float): Number to scale the ozone values by (default 46/48)
         top_header_length (int): Number of rows to ignore before data begins
+        receptors (typing.Optional[typing.List[str]], optional): Receptor IDs to limit processing to, only these columns are read. Defaults to None (all receptors).
+        receptor_pattern (typing.Optional[str], optional): Regular expression receptor IDs must match to be read. Defaults to None.
+        method (str, optional): NO2 conversion method (see _available_no2_methods). Defaults to "OLM".
+        method_parameters (typing.Optional[typing.Dict[str, float]], optional): Extra method parameters (min_ratio, max_ratio, ratio). Defaults to None.
+        gap_fill (str, optional): How to fill hours missing from the scenario, which is then matched to the background by hour (see Time_Integrity._available_gap_fills). Defaults to "none" (rows are matched in order).
 
     Returns:
         typing.Tuple[pd.DataFrame, pd.DataFrame,pd.DataFrame]: Temporary computed data set, output statistics on computed data, output background statistics
     """
 
-    print(f"Processing NO2 statistics for {input_data}")
+    print(f"Processing NO2 statistics for {input_data} using {method}")
 
-    # Read Data
-    background = _read_large_dataset(background_name)
-    background.dropna(how='all', inplace=True)
+    parameters = dict(method_parameters or {})
+    parameters.update(initial=initial, ozone_scale=ozone_scale)
 
-    data = _read_large_dataset(input_data)
+    # Read Data
+    background = read_background(
+        background_name, background_column_name, ozone_column_name, gap_fill != "none"
+    )
 
-    data_header = data.iloc[:, :header_length]
+    # Invalid values are filled before the grid so NaN filled gaps stay NaN
+    scenario = _complete_scenario(
+        _read_scenario(
+            input_data, header_length, top_header_length, receptors, receptor_pattern
+        ).fillna(fill_invalid_value),
+        gap_fill,
+        fill_invalid_value,
+        input_data,
+    )
 
-    data = data.iloc[:, header_length:]
+    print("25%")
 
-    data = data[top_header_length - 1:]
+    with phase("transform"):
+        background_no2, ozone = _align_background(
+            background, scenario.index, fill_invalid_value
+        )
+        values = scenario.values
 
-    # Multiply background data by provided scalar
+        olm_values = convert_no2(method, values, background_no2, ozone, **parameters)
+        olm_data_with_background = scenario.with_values(olm_values)
+        olm_data_without_background = scenario.with_values(
+            olm_values - background_no2[:, np.newaxis]
+        )
 
-    data["background_NO2"] = background[background_column_name]
+    print("50%")
+    # Compute statistics
+    outdf = _compute_statistics(
+        olm_data_with_background.receptor_frame(), exceedance, percentile, window
+    )
+    print("75%")
+    no_bg_outdf = pd.DataFrame
+    if calc_without_background:
+        # data["background"] = list(background[background_column_name])
+        # bg_data = data.apply(backfunction, axis=1)
+        no_bg_outdf = _compute_statistics(
+            olm_data_without_background.receptor_frame(), exceedance, percentile, window
+        )
 
-    data["background_O3"] = background[ozone_column_name]
+    # Header columns are only joined on for export
+    olm_data_with_background = olm_data_with_background.frame()
+    olm_data_without_background = olm_data_without_background.frame()
 
-    print("25%")
+    print("100%")
 
-    data = data.fillna(fill_invalid_value)
+    return olm_data_with_background, olm_data_without_background, outdf, no_bg_outdf
 
 
-    def olmfunction(row: pd.Series) -> pd.Series:
-        """ Compute OLM which is the recorded value multiplied by the initial amount, and add the minimum of (1-iniial)*value or the ozone)
+def _scenario_statistics(
+    input_data: str,
+    methods: typing.List[str],
+    initials: typing.List[float],
+    settings: typing.Dict[str, typing.Any],
+    background: typing.Union[pd.DataFrame, typing.Dict[str, typing.Any]],
+) -> pd.DataFrame:
+    """ Compute NO2 statistics for a single scenario with every method and initial ratio, the scenario is read once and the background is reused
 
-        Args:
-            row (pd.Series): Row to be computed where last column is the ozone data scaled
+    Args:
+        input_data (str): Source data file path
+        methods (typing.List[str]): NO2 conversion methods to compute
+        initials (typing.List[float]): Initial ratios to compute (eg 0.1 = 10%), only used by methods depending on the initial ratio
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey
+        background (typing.Union[pd.DataFrame, typing.Dict[str, typing.Any]]): Background NO2 and ozone, or the spec of the background published to shared memory
 
-        Returns:
-            pd.Series: Computed row
-        """
-        # Take the ozone value
-        ozone_value = float(row.iloc[-1]) * ozone_scale
-        background_value = float(row.iloc[-2])
-        new_row = []
+    Returns:
+        pd.DataFrame: Statistics for each receptor with Scenario, Method, Initial and Background columns
+    """
+    fill_invalid_value = float(settings["fill_invalid_value"])
+    exceedance = float(settings["exceedance"])
+    percentile = float(settings["percentile"])
+    window = int(settings["rolling_window"])
+    parameters = _method_parameters(settings)
+
+    scenario = _complete_scenario(
+        _read_scenario(
+            input_data,
+            int(settings["header_length"]),
+            int(settings["top_header_length"]),
+            settings.get("receptors"),
+            settings.get("receptor_regex"),
+        ).fillna(fill_invalid_value),
+        settings.get("gap_fill") or "none",
+        fill_invalid_value,
+        input_data,
+    )
+    if isinstance(background, pd.DataFrame):
+        background_no2, ozone = _align_background(background, scenario.index, fill_invalid_value)
+    else:
+        with SharedTimeseries.attach(background) as shared:
+            # Copied out as the aligned arrays can share memory with the view
+            background_no2, ozone = (
+                np.array(values)
+                for values in _align_background(
+                    shared.frame(), scenario.index, fill_invalid_value
+                )
+            )
+    values = scenario.values
 
-        # Skip header rows and ignore last 2 values
-        for value in row[:-2]:
-            value = (float(value) * initial) + min(((1 - initial) * float(value)), ozone_value) + background_value
-            new_row.append(value)
-        return pd.Series(new_row)
+    results = []
+    for method in methods:
+        # Methods independent of the initial ratio are only computed once
+        method_initials = initials if method in _initial_ratio_methods else [np.nan]
 
-    def backfunction(row: pd.Series) -> pd.Series:
-        """ Background function for computing sum of recorded value and background
+        for initial in method_initials:
+            no2_values = convert_no2(
+                method, values, background_no2, ozone, initial=initial, **parameters
+            )
 
-        Args:
-            row (pd.Series): Row to be computed where last column is the background data
+            outputs = [(True, no2_values)]
+            if settings.get("calc_without_background"):
+                outputs.append((False, no2_values - background_no2[:, np.newaxis]))
+
+            for includes_background, output_values in outputs:
+                outdf = _compute_statistics(
+                    pd.DataFrame(output_values, columns=scenario.receptors),
+                    exceedance,
+                    percentile,
+                    window,
+                )
+                outdf.insert(0, "Background Included", includes_background)
+                outdf.insert(0, "Initial", initial)
+                outdf.insert(0, "Method", method)
+                outdf.insert(0, "Scenario", str(input_data))
+                results.append(outdf)
+
+    return pd.concat(results, ignore_index=True)
+
+
+def batch_process(
+    scenario_files: typing.List[str],
+    initials: typing.List[float],
+    background_name: str,
+    settings: typing.Dict[str, typing.Any],
+    max_workers: typing.Optional[int] = None,
+    methods: typing.Optional[typing.List[str]] = None,
+) -> pd.DataFrame:
+    """ Apply the NO2 processor to many scenarios with several methods and initial ratios, the background is read and validated once and published to shared memory for the worker processes
 
-        Returns:
-            pd.Series: Computed row
-        """
-        # Take the background value
-        background_value = float(row.iloc[-1])
-        new_row = []
-        for value in row[:-1]:
-            value = value - background_value
-            new_row.append(value)
+    Args:
+        scenario_files (typing.List[str]): Source data file paths
+        initials (typing.List[float]): Initial ratios to compute for every scenario (eg 0.1 = 10%)
+        background_name (str): File path to background NO2 data set
+        settings (typing.Dict[str, typing.Any]): Dictionary of settings from user input in Gooey (column names, fill value, method parameters, statistics options and receptor selection)
+        max_workers (typing.Optional[int], optional): Number of processes to use, None will use all processors. Defaults to None.
+        methods (typing.Optional[typing.List[str]], optional): NO2 conversion methods to compare (see _available_no2_methods). Defaults to None (OLM only).
 
-        return pd.Series(new_row)
+    Raises:
+        ValueError: If a method is not supported
 
+    Returns:
+        pd.DataFrame: Consolidated statistics (Scenario, Method, Initial, Background Included, Sensor ID then statistics)
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
 
-    olm_data = data.apply(olmfunction, axis=1)
-    olm_data.columns = data.columns[:-2]
-    olm_data_with_background = olm_data.copy()
-    olm_data["background"] = list(background[background_column_name])
-    olm_data_without_background = olm_data.apply(backfunction, axis=1)
-    olm_data_without_background.columns = data.columns[:-2]
+    if methods is None:
+        methods = ["OLM"]
+    for method in methods:
+        if method not in _no2_methods:
+            raise ValueError(f"NO2 method: {method} is not supported")
 
-    print("50%")
-    # Compute statistics
-    outdf = _compute_statistics(
-        olm_data_with_background, exceedance, percentile, window
+    print(
+        f"Processing NO2 statistics for {len(scenario_files)} scenarios using {', '.join(methods)} at initial ratios {initials}"
     )
-    print("75%")
-    no_bg_outdf = pd.DataFrame
-    if calc_without_background:
-        # data["background"] = list(background[background_column_name])
-        # bg_data = data.apply(backfunction, axis=1)
-        no_bg_outdf = _compute_statistics(
-            olm_data_without_background, exceedance, percentile, window
-        )
 
-    olm_data_with_background = prepend_header_dataframe(
-        olm_data_with_background, data_header
-    )
-    olm_data_without_background = prepend_header_dataframe(
-        olm_data_without_background, data_header
+    background = read_background(
+        background_name,
+        settings["bg_col_name"],
+        settings["ozone_col_name"],
+        (settings.get("gap_fill") or "none") != "none",
     )
 
-    print("100%")
-
-    return olm_data_with_background, olm_data_without_background, outdf, no_bg_outdf
+    results = {}
+
+    with SharedTimeseries.publish(background, dtype=float) as shared_background:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    _scenario_statistics,
+                    input_data,
+                    methods,
+                    initials,
+                    settings,
+                    shared_background.spec,
+                ): input_data
+                for input_data in scenario_files
+            }
+            for future in gooey_tqdm(as_completed(futures), total=len(futures)):
+                input_data = futures[future]
+                print(f"Computed NO2 statistics for {input_data}")
+                results[input_data] = future.result()
+
+    # Keep the order of the scenarios regardless of the order they finished
+    return pd.concat(
+        [results[input_data] for input_data in scenario_files], ignore_index=True
+    )
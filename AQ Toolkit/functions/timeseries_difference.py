@@ -1,45 +1,53 @@
-import pandas as pd
-import numpy as np
-from src.functions.File_Utilties import split_df
-
-
-def timeseries_difference(input_ts: str,
-                          subtract_ts: str,
-                          output_file: str,
-                          cols_to_skip: int,
-                          GRAL_header_rows: int,
-                          num_receptors: int
-                          ):
-
-    type = 'GRAL'
-    keep_cols_data = range(0, cols_to_skip + num_receptors)
-    keep_cols_header = range(0, cols_to_skip + num_receptors - 1)
-
-    if type == 'GRAL':
-        input_type = input_ts.split(".")[-1]
-        if input_type == "txt":
-            input_df = pd.read_csv(input_ts, delimiter=r"\t", header=None, skiprows=GRAL_header_rows,
-                               engine="python", encoding="utf_16", usecols=keep_cols_data)
-            inp_header = pd.read_csv(input_ts, delimiter=r"\t", header=None, nrows=GRAL_header_rows,
-                               engine="python", encoding="utf_16", usecols=keep_cols_header)
-            sub_df = pd.read_csv(subtract_ts, delimiter=r"\t", header=None, skiprows=GRAL_header_rows,
-                               engine="python", encoding="utf_16", usecols=keep_cols_data)
-        else:
-            input_df = pd.read_csv(input_ts, header=None, skiprows=GRAL_header_rows, usecols=keep_cols_data)
-            inp_header = pd.read_csv(input_ts, header=None, nrows=GRAL_header_rows, usecols=keep_cols_data)
-            sub_df = pd.read_csv(subtract_ts, header=None, skiprows=GRAL_header_rows, usecols=keep_cols_data)
-
-        cols_header_input, input_data = split_df(input_df, cols_to_skip)
-        cols_header_sub, sub_data = split_df(sub_df, cols_to_skip)
-
-        diff_data = input_data - sub_data
-
-        # put df back together and export
-        output_df = pd.concat([cols_header_input, diff_data], axis=1)
-        new_index = np.arange(GRAL_header_rows - 1, output_df.shape[0] + GRAL_header_rows - 1)
-        output_df.index = new_index
-
-        output_df = pd.concat([inp_header, output_df])
-
-        output_df.to_csv(output_file, header=False, index=False)
-        print(f"\nSaved difference timeseries to {output_file}\n")
+import typing
+
+from src.functions.Linear_Combination import TimeseriesInput, linear_combination
+
+
+def timeseries_difference(input_ts: str,
+                          subtract_ts: str,
+                          output_file: str,
+                          cols_to_skip: int,
+                          GRAL_header_rows: int,
+                          num_receptors: int,
+                          additional_ts: typing.Optional[typing.List[str]] = None,
+                          weights: typing.Optional[typing.List[float]] = None,
+                          chunksize: int = 2000,
+                          ):
+    """ Difference between GRAL timeseries (input - subtract - any additional timeseries), streamed a chunk of hours at a time with the hours of every file checked against the input
+
+    Args:
+        input_ts (str): Path to the timeseries to subtract from
+        subtract_ts (str): Path to the timeseries to subtract
+        output_file (str): Path to write the difference to (csv)
+        cols_to_skip (int): Number of date/hour columns before the receptors
+        GRAL_header_rows (int): Number of header rows
+        num_receptors (int): Number of receptor columns to read
+        additional_ts (typing.Optional[typing.List[str]], optional): Further timeseries to subtract in the same pass. Defaults to None.
+        weights (typing.Optional[typing.List[float]], optional): Weight of every timeseries in order for a weighted combination instead. Defaults to None (1 for the input and -1 for the rest).
+        chunksize (int, optional): Number of hours to read at a time. Defaults to 2000.
+
+    Raises:
+        ValueError: If the number of weights doesn't match the number of timeseries
+    """
+    input_files = [input_ts, subtract_ts] + list(additional_ts or [])
+    if not weights:
+        weights = [1.0] + [-1.0] * (len(input_files) - 1)
+    if len(weights) != len(input_files):
+        raise ValueError(
+            f"{len(weights)} weights provided for {len(input_files)} timeseries, provide a weight for each timeseries"
+        )
+
+    inputs = [
+        TimeseriesInput(
+            file,
+            weight,
+            "gral",
+            cols_to_skip,
+            GRAL_header_rows,
+            num_receptors,
+        )
+        for file, weight in zip(input_files, weights)
+    ]
+    # Receptors outside a source group's reach are zero so are skipped rather than subtracted
+    linear_combination(inputs, output_file, "gral", chunksize, sparse=True)
+    print(f"\nSaved difference timeseries to {output_file}\n")
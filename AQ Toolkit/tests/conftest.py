@@ -0,0 +1,13 @@
+""" Test configuration, run from the AQ Toolkit folder (imported as src)
+
+    python -m pytest tests
+
+Inputs are written with the benchmark dataset generators
+"""
+
+import sys
+from pathlib import Path
+
+# Tests import the toolkit the same way as the GUI (src.functions)
+sys.path.insert(0, str(Path(__file__).parents[2]))
+sys.path.insert(0, str(Path(__file__).parents[1] / "benchmarks"))
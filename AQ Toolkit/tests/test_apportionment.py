@@ -0,0 +1,27 @@
+""" Apportionment options are checked before any inputs are read
+"""
+
+import pytest
+
+import synthetic_data
+from src.functions import Linear_Combination
+from src.functions.Linear_Combination import TimeseriesInput, linear_combination
+
+
+def test_unsupported_apportionment_format_is_refused_before_reading(tmp_path, monkeypatch):
+    inputs = [
+        TimeseriesInput(synthetic_data.write_calpuff_csv(tmp_path / f"input_{number}.csv", 24, 5, seed=number))
+        for number in range(2)
+    ]
+
+    def read(*args, **kwargs):
+        raise AssertionError("Inputs were read before the apportionment path was checked")
+
+    monkeypatch.setattr(Linear_Combination, "_streamed_combination", read)
+    with pytest.raises(ValueError, match="apportionment"):
+        linear_combination(
+            inputs,
+            output_path=str(tmp_path / "sum.csv"),
+            apportion_hours=5,
+            apportion_path=str(tmp_path / "apportionment.txt"),
+        )
@@ -0,0 +1,75 @@
+""" Resuming a checkpointed batch run after a failure part way through a row gives the same total as a clean run
+"""
+
+import pandas as pd
+import pytest
+
+import synthetic_data
+from src.functions import Linear_Combination
+from src.functions.Linear_Combination import TimeseriesInput, linear_combination
+
+
+def _inputs(tmp_path, count=6):
+    return [
+        TimeseriesInput(
+            synthetic_data.write_calpuff_csv(tmp_path / f"input_{number}.csv", 48, 10, seed=number),
+            float(number + 1),
+        )
+        for number in range(count)
+    ]
+
+
+def _checkpointed_sum(inputs, output_path, resume=False):
+    linear_combination(
+        inputs,
+        output_path=str(output_path),
+        checkpoint_path=str(output_path.with_name("checkpoint")),
+        checkpoint_interval=2,
+        resume=resume,
+        preflight=False,
+    )
+    return pd.read_csv(output_path)
+
+
+def test_resume_after_failed_intermediate_write(tmp_path):
+    inputs = _inputs(tmp_path)
+    linear_combination(inputs, output_path=str(tmp_path / "clean.csv"), preflight=False)
+    expected = pd.read_csv(tmp_path / "clean.csv")
+
+    # The intermediate of the fourth input is written to a folder that doesn't exist yet, after the input has been added to the total
+    intermediate_folder = tmp_path / "intermediates"
+    inputs = [
+        entry._replace(intermediate_path=str(intermediate_folder / f"weighted_{number}.csv"))
+        if number == 3
+        else entry
+        for number, entry in enumerate(inputs)
+    ]
+    with pytest.raises(OSError):
+        _checkpointed_sum(inputs, tmp_path / "resumed.csv")
+
+    intermediate_folder.mkdir()
+    pd.testing.assert_frame_equal(_checkpointed_sum(inputs, tmp_path / "resumed.csv", resume=True), expected)
+
+
+def test_resume_after_failure_while_adding(tmp_path, monkeypatch):
+    inputs = _inputs(tmp_path)
+    linear_combination(inputs, output_path=str(tmp_path / "clean.csv"), preflight=False)
+    expected = pd.read_csv(tmp_path / "clean.csv")
+
+    # The fourth input fails with half of its hours added to the running total
+    add_into = Linear_Combination.add_into
+    calls = []
+
+    def failing_add_into(total, values):
+        calls.append(len(values))
+        if len(calls) == 3:
+            add_into(total[: len(values) // 2], values[: len(values) // 2])
+            raise RuntimeError("Failed part way through adding an input")
+        add_into(total, values)
+
+    monkeypatch.setattr(Linear_Combination, "add_into", failing_add_into)
+    with pytest.raises(RuntimeError):
+        _checkpointed_sum(inputs, tmp_path / "resumed.csv")
+    monkeypatch.setattr(Linear_Combination, "add_into", add_into)
+
+    pd.testing.assert_frame_equal(_checkpointed_sum(inputs, tmp_path / "resumed.csv", resume=True), expected)
@@ -0,0 +1,47 @@
+""" GRAL timeseries written by the toolkit can be read back in with their header rows still lined up with the receptors
+"""
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+import synthetic_data
+from src.functions.factorise_GRAL_timeseries import factorise_gral_timeseries
+from src.functions.timeseries_difference import timeseries_difference
+
+
+def _header_rows(path, rows=7):
+    with open(path, "r", newline="") as gral_file:
+        return [row for _, row in zip(range(rows), csv.reader(gral_file))]
+
+
+def _values(path, rows=7, header_length=2):
+    return pd.read_csv(path, skiprows=rows - 1).iloc[:, header_length:].to_numpy()
+
+
+def test_factoriser_outputs_difference(tmp_path):
+    receptors = 4
+    paths = [
+        synthetic_data.write_gral_txt(
+            tmp_path / f"ReceptorTimeSeries_SG{number}_NOx.txt", 48, receptors, seed=number, zero_columns=receptors
+        )
+        for number in range(2)
+    ]
+    config_df = pd.DataFrame({"Path": paths, "NOx": [1.0, 0.0], "PM10": [0.0, 2.0]})
+    factorise_gral_timeseries(config_df, str(tmp_path / "factored.xlsx"), 2, 7, receptors, pd.DataFrame())
+
+    nox_path = tmp_path / "factored_NOx.csv"
+    pm10_path = tmp_path / "factored_PM10.csv"
+    header_rows = _header_rows(nox_path)
+    # Receptor names are over the receptor columns, after the date and time columns
+    assert header_rows[0] == ["", "Receptor"] + [f"Receptor_{column + 1}" for column in range(receptors)]
+    assert header_rows[-1] == ["Date", "Time"] + [str(column + 1) for column in range(receptors)]
+
+    difference_path = tmp_path / "difference.csv"
+    timeseries_difference(str(nox_path), str(pm10_path), str(difference_path), 2, 7, receptors)
+
+    assert _header_rows(difference_path) == header_rows
+    np.testing.assert_allclose(
+        _values(difference_path), _values(nox_path) - _values(pm10_path), rtol=1e-12
+    )
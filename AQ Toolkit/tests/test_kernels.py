@@ -0,0 +1,85 @@
+""" The Numba kernels give the same results as the NumPy kernels, including missing values, ties and integer and float32 inputs
+"""
+
+import numpy as np
+import pytest
+
+from src.functions.Kernels import (
+    add_rows,
+    olm_kernel,
+    rolling_means,
+    scale_rows,
+    sort_columns,
+    top_positions,
+    use_backend,
+)
+
+pytest.importorskip("numba")
+
+ROWS = 500
+RECEPTORS = 32
+
+
+def _values(dtype, seed=0):
+    generator = np.random.default_rng(seed)
+    if np.issubdtype(dtype, np.integer):
+        # A small range so most values are tied
+        return generator.integers(0, 20, (ROWS, RECEPTORS)).astype(dtype)
+    values = generator.gamma(2.0, 50.0, (ROWS, RECEPTORS)).astype(dtype)
+    values[generator.random(values.shape) < 0.01] = np.nan
+    # Repeated values check ties are ranked the same way
+    values[generator.random(values.shape) < 0.05] = 10.0
+    return values
+
+
+def _hourly(seed=1):
+    generator = np.random.default_rng(seed)
+    hourly = generator.gamma(2.0, 20.0, ROWS)
+    hourly[generator.random(ROWS) < 0.01] = np.nan
+    return hourly
+
+
+def _running_sums(values):
+    missing = np.isnan(values) if np.issubdtype(values.dtype, np.floating) else np.zeros(values.shape, dtype=bool)
+    prefix = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(missing, 0, values), axis=0, out=prefix[1:])
+    missing_prefix = np.zeros(prefix.shape, dtype=np.int64)
+    np.cumsum(missing, axis=0, out=missing_prefix[1:])
+    return prefix, missing_prefix if missing.any() else None
+
+
+def _cases(values, hourly):
+    prefix, missing_prefix = _running_sums(values)
+    return {
+        "olm": lambda: olm_kernel(values, hourly, hourly * 46 / 48, 0.1),
+        "scale_rows": lambda: scale_rows(values, hourly),
+        "add_rows": lambda: add_rows(values, hourly),
+        "rolling_means": lambda: rolling_means(prefix, missing_prefix, 8),
+        "sort_columns": lambda: sort_columns(values),
+        "top_positions": lambda: top_positions(-values, 10),
+    }
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int64, np.int32])
+@pytest.mark.parametrize(
+    "kernel", ["olm", "scale_rows", "add_rows", "rolling_means", "sort_columns", "top_positions"]
+)
+def test_backends_match(kernel, dtype):
+    values = _values(dtype)
+    case = _cases(values, _hourly())[kernel]
+    with use_backend("numpy"):
+        expected = case()
+    with use_backend("numba"):
+        result = case()
+
+    assert result.dtype == expected.dtype
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "numba"])
+def test_fortran_order_is_kept(backend):
+    # Outputs keep the memory layout of the input so later sums add in the same order
+    values = np.asfortranarray(_values(np.float64))
+    with use_backend(backend):
+        assert scale_rows(values, _hourly()).flags.f_contiguous
+        assert olm_kernel(values, _hourly(), _hourly(), 0.1).flags.f_contiguous
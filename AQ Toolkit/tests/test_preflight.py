@@ -0,0 +1,27 @@
+""" Pre-flight counts hours the same way as the inputs are read
+"""
+
+import pytest
+
+import synthetic_data
+from src.functions.Linear_Combination import TimeseriesInput
+from src.functions.Preflight import scan_input, validate_inputs
+
+
+def test_blank_lines_are_not_counted(tmp_path):
+    paths = [synthetic_data.write_calpuff_csv(tmp_path / f"input_{number}.csv", 24, 5, seed=number) for number in range(2)]
+    # Blank and whitespace only lines are skipped when reading
+    with open(paths[1], "a", newline="") as input_file:
+        input_file.write("\n  \r\n")
+
+    assert [scan_input(TimeseriesInput(path)).rows for path in paths] == [24, 24]
+    validate_inputs([TimeseriesInput(path) for path in paths])
+
+
+def test_missing_hours_are_reported(tmp_path):
+    paths = [
+        synthetic_data.write_calpuff_csv(tmp_path / f"input_{hours}.csv", hours, 5)
+        for hours in [24, 23]
+    ]
+    with pytest.raises(ValueError):
+        validate_inputs([TimeseriesInput(path) for path in paths])
@@ -0,0 +1,33 @@
+""" Run reports are written for failed runs and only report memory that was measured
+"""
+
+import json
+
+from src.functions import Profiling
+from src.functions.Profiling import RunProfiler
+
+
+def test_failed_run_is_reported(tmp_path):
+    report_path = tmp_path / "report.json"
+    profiler = RunProfiler("batch_sum", report_path=str(report_path)).start()
+    with profiler.phase("read"):
+        pass
+    profiler.finish(ValueError("Timeseries format: x is not supported"))
+
+    report = json.loads(report_path.read_text())
+    assert report["error"] == "ValueError: Timeseries format: x is not supported"
+    assert report["phases"]["read"]["calls"] == 1
+
+
+def test_phase_peaks_need_a_sampler(monkeypatch):
+    # Without psutil only the peak of the whole process is known
+    monkeypatch.setattr(Profiling, "_current_rss", lambda: None)
+    profiler = RunProfiler("batch_sum").start()
+    with profiler.phase("read"):
+        pass
+    with profiler.phase("compute"):
+        pass
+    report = profiler.finish()
+
+    assert all(phase["peak_rss_bytes"] is None for phase in report["phases"].values())
+    assert report["peak_rss_bytes"] is not None
@@ -0,0 +1,25 @@
+""" Averaging blocks line up with the same hours as pandas resample
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.functions.Time_Index import AveragingPeriods, TimeIndex
+
+
+def _block_counts(timestamps, hours):
+    keys = timestamps.to_numpy().astype("datetime64[h]").astype(np.int64)
+    return list(AveragingPeriods.block(TimeIndex(keys, True), hours).counts)
+
+
+def test_blocks_start_at_midnight_of_the_first_day():
+    assert _block_counts(pd.date_range("2021-03-02 00:00", periods=24, freq="h"), 5) == [5, 5, 5, 5, 4]
+
+
+@pytest.mark.parametrize("hours", [5, 7, 24])
+@pytest.mark.parametrize("first_hour", ["00:00", "03:00"])
+def test_blocks_match_resample(hours, first_hour):
+    timestamps = pd.date_range(f"2021-03-02 {first_hour}", periods=24 * 3, freq="h")
+    expected = pd.Series(1.0, index=timestamps).resample(f"{hours}h").count()
+    assert _block_counts(timestamps, hours) == list(expected[expected > 0])